@@ -1,3 +1,4 @@
+import array
 import machine
 
 import timestamp
@@ -21,9 +22,10 @@ class Event:
         RepeatClicked: 'Repeat Clicked'
     }    
 
-    def __init__(self, state=None, evt_type=0):
+    def __init__(self, state=None, evt_type=0, channel=0):
         self.state = state
         self.evt_type = evt_type
+        self.channel = channel
 
     def __str__(self):
         type_list = []
@@ -39,9 +41,10 @@ class Event:
         return 'Event( state = {}, type = {} )'.format(self.state, type_list_text)
     
     @micropython.native
-    def reset(self, state=None, evt_type=0):
+    def reset(self, state=None, evt_type=0, channel=0):
         self.state = state
         self.evt_type = evt_type
+        self.channel = channel
 
     @property
     def active(self):
@@ -72,6 +75,117 @@ class Event:
         return not (self.evt_type & Event.RepeatClicked) == 0
 
 
+# Queued events are packed into a single small int:
+#   bits 8-15: channel, bits 1-6: event type flags, bit 0: state
+@micropython.native
+def pack_event(channel, state, evt_type):
+    return (channel << 8) | (evt_type & 0xFE) | (1 if state else 0)
+
+
+@micropython.native
+def event_channel(packed):
+    return packed >> 8
+
+
+@micropython.native
+def event_type(packed):
+    return packed & 0xFE
+
+
+@micropython.native
+def event_state(packed):
+    return not (packed & 1) == 0
+
+
+class EventQueue:
+    def __init__(self, capacity=16):
+        self.__capacity = capacity
+        size = capacity + 1
+        self.__events = array.array('H', [0] * size)
+        self.__times = array.array('I', [0] * size)
+        self.__size = size
+        self.__head = 0
+        self.__tail = 0
+        self.t_last = 0
+        self.dropped = 0
+
+    def __len__(self):
+        count = self.__head - self.__tail
+        return count if count >= 0 else count + self.__size
+
+    @property
+    def capacity(self):
+        return self.__capacity
+
+    def clear(self):
+        self.__tail = self.__head
+
+    @micropython.native
+    def push(self, channel, state, evt_type, t):
+        head = self.__head
+        next_head = head + 1
+        if next_head == self.__size:
+            next_head = 0
+        if next_head == self.__tail:
+            self.dropped += 1
+            return False
+        self.__events[head] = pack_event(channel, state, evt_type)
+        self.__times[head] = t
+        self.__head = next_head
+        return True
+
+    @micropython.native
+    def pop(self):
+        tail = self.__tail
+        if tail == self.__head:
+            return -1
+        packed = self.__events[tail]
+        self.t_last = self.__times[tail]
+        tail += 1
+        self.__tail = 0 if tail == self.__size else tail
+        return packed
+
+    @micropython.native
+    def pop_into(self, event):
+        packed = self.pop()
+        if packed < 0:
+            return False
+        event.reset(event_state(packed), event_type(packed), event_channel(packed))
+        return True
+
+    # Pops the oldest event of one channel and leaves the other channels' events
+    # queued in order, so buttons sharing a queue can wait independently. Only
+    # the entries behind the tail are moved, which an ISR push never touches.
+    @micropython.native
+    def pop_channel_into(self, channel, event):
+        events = self.__events
+        times = self.__times
+        size = self.__size
+        head = self.__head
+        tail = self.__tail
+        idx = tail
+        while not idx == head:
+            if event_channel(events[idx]) == channel:
+                break
+            idx += 1
+            if idx == size:
+                idx = 0
+        if idx == head:
+            return False
+        packed = events[idx]
+        t = times[idx]
+        while not idx == tail:
+            prev = size - 1 if idx == 0 else idx - 1
+            events[idx] = events[prev]
+            times[idx] = times[prev]
+            idx = prev
+        tail += 1
+        self.__tail = 0 if tail == size else tail
+        self.t_last = t
+        event.reset(event_state(packed), event_type(packed), event_channel(packed))
+        return True
+
+
 class ButtonCore:
     samples = const(6)
     buffer_mask = const(0x3F)  # Calculated as (1<<ButtonCore.samples) - 1)
@@ -89,6 +203,13 @@ class ButtonCore:
         self.__event_mask = 0xFFFF
         self.event = Event()
 
+        self.__timer = None
+        self.__queue = None
+        self.__channel = 0
+        self.__t_sample_poll = self.__t_sample
+        self.__drain_event = Event()
+        self.__isr_ref = self.__isr  # Bound once so the timer callback never allocates
+
     @property
     def latency_us(self):
         return self.__num_samples * self.__t_sample
@@ -106,13 +227,62 @@ class ButtonCore:
         
     def filter_events(self, events):
         self.__event_mask = 0xFFFF ^ events
+
+    @property
+    def queue(self):
+        return self.__queue
+
+    @property
+    def pending(self):
+        return 0 if self.__queue is None else len(self.__queue)
+
+    def attach_queue(self, queue, channel=0):
+        self.__queue = queue
+        self.__channel = channel
+        return queue
+
+    def start_irq(self, queue_size=16, timer_id=-1):
+        if self.__queue is None:
+            self.attach_queue(EventQueue(queue_size))
+        self.stop_irq()
+        freq = 1e6 / self.__t_sample_poll
+        # The timer paces sampling, so every callback takes a sample
+        self.__t_sample = 0
+        self.__timer = machine.Timer(timer_id)
+        self.__timer.init(mode=machine.Timer.PERIODIC, freq=freq, callback=self.__isr_ref)
+
+    def stop_irq(self):
+        if self.__timer is not None:
+            self.__timer.deinit()
+            self.__timer = None
+        self.__t_sample = self.__t_sample_poll
+        self.__t_last = timestamp.now()
+
+    @micropython.native
+    def drain(self, func=None, max_events=None):
+        queue = self.__queue
+        if queue is None:
+            return 0
+        event = self.__drain_event
+        count = 0
+        while (max_events is None) or (count < max_events):
+            if not queue.pop_into(event):
+                break
+            count += 1
+            if func is not None:
+                func(event)
+        return count
+
+    @micropython.native
+    def __isr(self, timer):
+        self.update()
        
     @micropython.native
     def until_event(self, evt_mask, func=None):
         while True:
             evt = self.update()
-            if not (evt.evt_type & evt_flag) == 0:
-                return
+            if not (evt.evt_type & evt_mask) == 0:
+                return evt
             else:
                 if func is not None:
                     func()
@@ -124,6 +294,28 @@ class ButtonCore:
     @micropython.native       
     def wait_for_released(self, func=None):
         return self.until_event(Event.Released, func)
+
+    # With a queue attached (IRQ mode, or polling into a shared queue) the wait
+    # consumes only this button's channel from it
+    async def until_event_async(self, evt_mask):
+        while True:
+            queue = self.__queue
+            if self.__timer is None:
+                evt = self.update()
+                if (queue is None) and not (evt.evt_type & evt_mask) == 0:
+                    return evt
+            if queue is not None:
+                evt = self.__drain_event
+                while queue.pop_channel_into(self.__channel, evt):
+                    if not (evt.evt_type & evt_mask) == 0:
+                        return evt
+            await timestamp.sleep_us(self.__t_sample_poll)
+
+    async def pressed(self):
+        return await self.until_event_async(Event.Pressed)
+
+    async def released(self):
+        return await self.until_event_async(Event.Released)
           
     @micropython.native
     def process_state(self, t, val, init_state):
@@ -178,6 +370,15 @@ class Button(ButtonCore):
     @micropython.native
     def wait_for_long_pressed(self, func=None):
         return self.until_event(Event.LongPressed, func)
+
+    async def clicked(self):
+        return await self.until_event_async(Event.Clicked)
+
+    async def repeat_clicked(self):
+        return await self.until_event_async(Event.RepeatClicked)
+
+    async def long_pressed(self):
+        return await self.until_event_async(Event.LongPressed)
                         
     @micropython.native            
     def update(self):
@@ -212,9 +413,9 @@ class Button(ButtonCore):
                 event.state = state            
                 self.__t_changed = t
                 if state:
-                    event.evt_type = Event.Pressed
+                    event.evt_type |= Event.Pressed
                 else:
-                    event.evt_type = Event.Released
+                    event.evt_type |= Event.Released
                     if not self.__long_pressed:
                         repeat_click = not timestamp.expired_at(self.__t_last_click, self.__t_repeat_click, t)
                         if repeat_click:
@@ -225,6 +426,8 @@ class Button(ButtonCore):
                         self.__t_last_click = t                
                 self.state = state
                 event.evt_type &= self.__event_mask
+        if not (event.evt_type == 0 or self.__queue is None):
+            self.__queue.push(self.__channel, event.state, event.evt_type, t)
         return event
 
 
@@ -242,9 +445,13 @@ class Toggle(ButtonCore):
     @micropython.native            
     def wait_for_toggled(self, func=None):
         return self.until_event(Event.Toggled, func)
+
+    async def toggled(self):
+        return await self.until_event_async(Event.Toggled)
             
     @micropython.native            
     def update(self):
+        t = timestamp.now()
         event = self.event
         button_val = self.__inverted ^ self.__pin.value()
         t_last = self.__t_last
@@ -253,7 +460,7 @@ class Toggle(ButtonCore):
 
         event.evt_type = 0
         
-        if timestamp.expired_at(t_last, t_sample, timestamp.now()):
+        if timestamp.expired_at(t_last, t_sample, t):
             self.__t_last = timestamp.advance(t_last, t_sample)
             state = init_state
             buffer = self.__buffer
@@ -278,6 +485,8 @@ class Toggle(ButtonCore):
                         self.state = not self.state        
                 event.state = self.state
                 event.evt_type &= self.__event_mask                
+        if not (event.evt_type == 0 or self.__queue is None):
+            self.__queue.push(self.__channel, event.state, event.evt_type, t)
         return event
 
 
@@ -301,7 +510,175 @@ class Unbuffered(ButtonCore):
                 event.evt_type = Event.Released
             event.evt_type &= self.__event_mask
             self.state = state
+            if not (event.evt_type == 0 or self.__queue is None):
+                self.__queue.push(self.__channel, state, event.evt_type, timestamp.now())
         else:
             event.evt_type = 0
         return event
-    
\ No newline at end of file
+    
+
+
+class ButtonBank:
+    sio_gpio_in = const(0xD0000004)  # RP2040 SIO GPIO_IN register
+
+    def __init__(self, pin_nums, pin_mode=machine.Pin.PULL_UP, inverted=None, f_sample=200, t_long_press=None, t_repeat_click=None, read_port=None):
+        self.__pins = [machine.Pin(pin_num, machine.Pin.IN, pin_mode) for pin_num in pin_nums]
+        self.__bits = [(1 << pin_num) for pin_num in pin_nums]
+        self.__channels = len(pin_nums)
+        port_mask = 0
+        for bit in self.__bits:
+            port_mask |= bit
+        self.__port_mask = port_mask
+        inverted = inverted if inverted is not None else (pin_mode == machine.Pin.PULL_UP)
+        self.__invert_mask = port_mask if inverted else 0
+        self.__read_port = self.__read_sio if read_port is None else read_port
+
+        t = timestamp.now()
+        self.__t_last = t
+        self.__t_sample = int(1e6 / f_sample)
+        self.__t_long_press = int(0.55 * 1e6) if t_long_press is None else t_long_press
+        self.__t_repeat_click = int(0.4 * 1e6) if t_repeat_click is None else t_repeat_click
+        self.__t_changed = array.array('I', [t] * self.__channels)
+        self.__t_last_click = array.array('I', [t] * self.__channels)
+        self.__history = array.array('I', [0] * ButtonCore.samples)
+        self.__history_idx = 0
+        self.__state = 0
+        self.__long_pressed = 0
+        self.__active = 0
+        self.__event_mask = 0xFFFF
+        self.__queue = None
+        self.__channel_base = 0
+        self.events = [Event(channel=channel) for channel in range(self.__channels)]
+
+    def __len__(self):
+        return self.__channels
+
+    @property
+    def state(self):
+        state = 0
+        for channel, bit in enumerate(self.__bits):
+            if not (self.__state & bit) == 0:
+                state |= (1 << channel)
+        return state
+
+    def value(self, channel):
+        return not (self.__state & self.__bits[channel]) == 0
+
+    def filter_events(self, events):
+        self.__event_mask = 0xFFFF ^ events
+
+    def attach_queue(self, queue, channel_base=0):
+        self.__queue = queue
+        self.__channel_base = channel_base
+        return queue
+
+    def reset(self):
+        t = timestamp.now()
+        self.__t_last = t
+        for channel in range(self.__channels):
+            self.__t_changed[channel] = t
+            self.__t_last_click[channel] = t
+        for idx in range(ButtonCore.samples):
+            self.__history[idx] = 0
+        self.__history_idx = 0
+        self.__state = 0
+        self.__long_pressed = 0
+        self.__active = 0
+        for channel, event in enumerate(self.events):
+            event.reset(False, 0, channel)
+
+    @micropython.native
+    def update(self):
+        t = timestamp.now()
+        events = self.events
+        bits = self.__bits
+        channels = self.__channels
+
+        active = self.__active
+        if not active == 0:
+            for channel in range(channels):
+                if not (active & (1 << channel)) == 0:
+                    events[channel].evt_type = 0
+            active = 0
+
+        init_state = self.__state
+        long_pressed = self.__long_pressed
+        pending = init_state & ~long_pressed
+        if not pending == 0:
+            t_changed = self.__t_changed
+            t_long_press = self.__t_long_press
+            for channel in range(channels):
+                bit = bits[channel]
+                if not (pending & bit) == 0:
+                    if timestamp.expired_at(t_changed[channel], t_long_press, t):
+                        long_pressed |= bit
+                        event = events[channel]
+                        event.state = True
+                        event.evt_type = Event.LongPressed & self.__event_mask
+                        if not event.evt_type == 0:
+                            active |= (1 << channel)
+
+        t_last = self.__t_last
+        t_sample = self.__t_sample
+        if timestamp.expired_at(t_last, t_sample, t):
+            self.__t_last = timestamp.advance(t_last, t_sample)
+            sample = (self.__read_port() ^ self.__invert_mask) & self.__port_mask
+            history = self.__history
+            idx = self.__history_idx
+            history[idx] = sample
+            idx += 1
+            self.__history_idx = 0 if idx == ButtonCore.samples else idx
+
+            # Vertical form of the 6-sample integrator: a channel goes high once
+            # every stored sample is high and low once every stored sample is low.
+            all_set = sample
+            any_set = sample
+            for value in history:
+                all_set &= value
+                any_set |= value
+            state = (init_state | all_set) & any_set
+            changed = state ^ init_state
+
+            if not changed == 0:
+                t_changed = self.__t_changed
+                t_last_click = self.__t_last_click
+                t_repeat_click = self.__t_repeat_click
+                for channel in range(channels):
+                    bit = bits[channel]
+                    if not (changed & bit) == 0:
+                        event = events[channel]
+                        t_changed[channel] = t
+                        if not (state & bit) == 0:
+                            event.state = True
+                            evt_type = Event.Pressed
+                        else:
+                            event.state = False
+                            evt_type = Event.Released
+                            if (long_pressed & bit) == 0:
+                                if timestamp.expired_at(t_last_click[channel], t_repeat_click, t):
+                                    evt_type |= Event.Clicked
+                                else:
+                                    evt_type |= Event.RepeatClicked
+                                t_last_click[channel] = t
+                            long_pressed &= ~bit
+                        if (active & (1 << channel)) == 0:
+                            event.evt_type = 0
+                        event.evt_type |= (evt_type & self.__event_mask)
+                        if not event.evt_type == 0:
+                            active |= (1 << channel)
+                self.__state = state
+
+        self.__long_pressed = long_pressed
+        self.__active = active
+        queue = self.__queue
+        if not (active == 0 or queue is None):
+            channel_base = self.__channel_base
+            for channel in range(channels):
+                if not (active & (1 << channel)) == 0:
+                    event = events[channel]
+                    queue.push(channel_base + channel, event.state, event.evt_type, t)
+        return active
+
+    @micropython.native
+    def __read_sio(self):
+        return machine.mem32[ButtonBank.sio_gpio_in]
@@ -1,4 +1,6 @@
+import array
 import math
+import struct
 
 class ExponentialStatistics:
     def __init__(self, fs=100, tau=1):
@@ -84,6 +86,30 @@ class ExponentialStatistics:
         self.__s2 = s2
         self.__samples += 1
         return x
+
+    @micropython.native
+    def update_many(self, buf, n=None):
+        n = len(buf) if n is None else n
+        if n == 0:
+            return self.__x
+        e = self.__e
+        x = self.__x
+        s2 = self.__s2
+        start = 0
+        if x is None:
+            x = buf[0]
+            s2 = 0
+            start = 1
+        for idx in range(start, n):
+            x_new = buf[idx]
+            diff = (x - x_new)
+            x = (e * diff) + x_new
+            s2_new = diff * diff
+            s2 = (e * (s2 - s2_new)) + s2_new
+        self.__x = x
+        self.__s2 = s2
+        self.__samples += n
+        return x
         
     @micropython.native        
     def __calc_weight(self, fs, tau):
@@ -92,6 +118,9 @@ class ExponentialStatistics:
 
 
 class RunningStatistics:
+    block = const(32)
+    packed_format = '<Idd'
+
     def __init__(self):
         self.__x = None
         self.__s2_sum = None
@@ -145,3 +174,618 @@ class RunningStatistics:
         self.__s2_sum = s2_sum
         self.__samples = samples
         return x
+
+    def merge(self, other):
+        if other.__samples > 0:
+            self.__merge(other.__samples, other.__x, other.__s2_sum)
+        return self
+
+    def __iadd__(self, other):
+        return self.merge(other)
+
+    def __add__(self, other):
+        result = RunningStatistics()
+        result.merge(self)
+        return result.merge(other)
+
+    def to_bytes(self):
+        if self.__samples == 0:
+            return struct.pack(RunningStatistics.packed_format, 0, 0, 0)
+        return struct.pack(RunningStatistics.packed_format, self.__samples, self.__x, self.__s2_sum)
+
+    @classmethod
+    def from_bytes(cls, data):
+        samples, x, s2_sum = struct.unpack(RunningStatistics.packed_format, data)
+        result = cls()
+        if samples > 0:
+            result.__merge(samples, x, s2_sum)
+        return result
+
+    # Folds a whole buffer in block by block: each block's mean and sum of
+    # squared deviations are found with two local passes and then merged into the
+    # running totals, which stays stable where a naive sum of squares would not.
+    @micropython.native
+    def update_many(self, buf, n=None):
+        n = len(buf) if n is None else n
+        block = RunningStatistics.block
+        start = 0
+        while start < n:
+            end = start + block
+            if end > n:
+                end = n
+            samples = end - start
+            total = 0
+            for idx in range(start, end):
+                total += buf[idx]
+            x = total / samples
+            s2_sum = 0
+            for idx in range(start, end):
+                diff = buf[idx] - x
+                s2_sum += diff * diff
+            self.__merge(samples, x, s2_sum)
+            start = end
+        return self.__x
+
+    @micropython.native
+    def __merge(self, samples_b, x_b, s2_sum_b):
+        samples_a = self.__samples
+        if samples_a == 0:
+            self.__x = x_b
+            self.__s2_sum = s2_sum_b
+            self.__samples = samples_b
+            return
+        samples = samples_a + samples_b
+        diff = x_b - self.__x
+        self.__x += diff * samples_b / samples
+        self.__s2_sum += s2_sum_b + (diff * diff * samples_a * samples_b / samples)
+        self.__samples = samples
+
+
+class WindowedStatistics:
+    def __init__(self, window):
+        assert window > 1, 'Error: Window must hold at least two samples'
+        self.__window = window
+        self.__buffer = array.array('f', [0] * window)
+        # Monotonic deques of buffer positions (front holds the extreme value)
+        self.__min_queue = array.array('H' if window < 0x10000 else 'I', [0] * window)
+        self.__max_queue = array.array('H' if window < 0x10000 else 'I', [0] * window)
+        self.reset()
+
+    def reset(self):
+        self.__x = None
+        self.__s2_sum = 0
+        self.__samples = 0
+        self.__pos = 0
+        self.__min_head = 0
+        self.__min_size = 0
+        self.__max_head = 0
+        self.__max_size = 0
+
+    @property
+    def window(self):
+        return self.__window
+
+    @property
+    def full(self):
+        return self.__samples == self.__window
+
+    @property
+    def x(self):
+        return self.__x
+
+    @property
+    def s2(self):
+        samples = self.__samples
+        if samples < 2:
+            return None if self.__x is None else 0
+        return max(0, self.__s2_sum / (samples - 1))
+
+    @property
+    def s(self):
+        return math.sqrt(self.s2)
+
+    @property
+    def SE(self):
+        return self.s / math.sqrt(self.__samples)
+
+    @property
+    def minimum(self):
+        if self.__min_size == 0:
+            return None
+        return self.__buffer[self.__min_queue[self.__min_head]]
+
+    @property
+    def maximum(self):
+        if self.__max_size == 0:
+            return None
+        return self.__buffer[self.__max_queue[self.__max_head]]
+
+    @property
+    def samples(self):
+        return self.__samples
+
+    @property
+    def valid(self):
+        return self.__x is not None
+
+    @micropython.native
+    def update(self, x_new):
+        buf = self.__buffer
+        window = self.__window
+        pos = self.__pos
+        samples = self.__samples
+
+        # Retire the sample being overwritten from the extreme value queues
+        if samples == window:
+            if (self.__min_size > 0) and (self.__min_queue[self.__min_head] == pos):
+                self.__min_head = 0 if (self.__min_head + 1) == window else self.__min_head + 1
+                self.__min_size -= 1
+            if (self.__max_size > 0) and (self.__max_queue[self.__max_head] == pos):
+                self.__max_head = 0 if (self.__max_head + 1) == window else self.__max_head + 1
+                self.__max_size -= 1
+            x_old = buf[pos]
+        buf[pos] = x_new
+        x_new = buf[pos]  # Track the stored value so removals cancel exactly
+
+        x = self.__x
+        if samples == 0:
+            x = x_new
+            self.__s2_sum = 0
+            samples = 1
+        elif samples < window:
+            samples += 1
+            diff = x_new - x
+            x += diff / samples
+            self.__s2_sum += diff * (x_new - x)
+        else:
+            x_prev = x
+            x += (x_new - x_old) / window
+            self.__s2_sum += (x_new - x_old) * ((x_new - x) + (x_old - x_prev))
+        self.__x = x
+        self.__samples = samples
+
+        self.__min_size = self.__push(self.__min_queue, self.__min_head, self.__min_size, pos, x_new, False)
+        self.__max_size = self.__push(self.__max_queue, self.__max_head, self.__max_size, pos, x_new, True)
+
+        pos += 1
+        if pos == window:
+            pos = 0
+            if samples == window:
+                x = self.__resync()
+        self.__pos = pos
+        return x
+
+    # The incremental add/remove updates drift with rounding (quickly so in
+    # float32), so once per pass through the ring the mean and the sum of
+    # squared deviations are recomputed from the buffer: amortized O(1)
+    @micropython.native
+    def __resync(self):
+        buf = self.__buffer
+        window = self.__window
+        total = 0
+        for idx in range(window):
+            total += buf[idx]
+        x = total / window
+        s2_sum = 0
+        for idx in range(window):
+            diff = buf[idx] - x
+            s2_sum += diff * diff
+        self.__x = x
+        self.__s2_sum = s2_sum
+        return x
+
+    @micropython.native
+    def __push(self, queue, head, size, pos, x_new, keep_greater):
+        buf = self.__buffer
+        window = self.__window
+        while size > 0:
+            tail = head + size - 1
+            if tail >= window:
+                tail -= window
+            x_tail = buf[queue[tail]]
+            if (x_tail <= x_new) if keep_greater else (x_tail >= x_new):
+                size -= 1
+            else:
+                break
+        tail = head + size
+        if tail >= window:
+            tail -= window
+        queue[tail] = pos
+        return size + 1
+
+
+# Jain & Chlamtac's P-squared estimator of a single quantile: five markers whose
+# heights are nudged with a piecewise-parabolic fit, so memory is constant.
+# Marker positions are exact integers in an array('I'), and each desired position
+# is kept as its offset from the marker in Q17 integers (p is rounded to 1/65536),
+# so neither drifts however many samples arrive. update() allocates no containers;
+# the marker heights are floats, which ports without inline floats still box.
+class P2Quantile:
+    One = const(1 << 17)
+
+    def __init__(self, p=0.5):
+        assert 0 < p < 1, 'Error: Quantile (p) must be between 0 and 1'
+        self.__p = p
+        p_q = 2 * int(p * (self.One >> 1) + 0.5)
+        self.__p_q = p_q
+        self.__q = array.array('f', [0] * 5)
+        self.__n = array.array('I', [0] * 5)
+        self.__d = array.array('i', [0] * 5)
+        self.__dn = array.array('i', [0, p_q >> 1, p_q, (self.One + p_q) >> 1, self.One])
+        self.reset()
+
+    def reset(self):
+        p_q = self.__p_q
+        self.__samples = 0
+        for idx in range(5):
+            self.__n[idx] = idx
+        for idx, value in enumerate((0, 2 * p_q - self.One, 4 * p_q - 2 * self.One, 2 * p_q - self.One, 0)):
+            self.__d[idx] = value
+
+    @property
+    def p(self):
+        return self.__p
+
+    @property
+    def samples(self):
+        return self.__samples
+
+    @property
+    def valid(self):
+        return self.__samples > 0
+
+    @property
+    def value(self):
+        samples = self.__samples
+        if samples == 0:
+            return None
+        if samples < 5:
+            return self.__q[int(self.__p * (samples - 1) + 0.5)]
+        return self.__q[2]
+
+    @micropython.native
+    def update(self, x_new):
+        q = self.__q
+        samples = self.__samples
+        if samples < 5:
+            pos = samples
+            while (pos > 0) and (q[pos - 1] > x_new):
+                q[pos] = q[pos - 1]
+                pos -= 1
+            q[pos] = x_new
+            self.__samples = samples + 1
+            return
+
+        n = self.__n
+        d = self.__d
+        dn = self.__dn
+        one = self.One
+        if x_new < q[0]:
+            q[0] = x_new
+            k = 0
+        elif x_new >= q[4]:
+            q[4] = x_new
+            k = 3
+        else:
+            k = 0
+            while x_new >= q[k + 1]:
+                k += 1
+        for idx in range(k + 1, 5):
+            n[idx] += 1
+            d[idx] -= one
+        for idx in range(5):
+            d[idx] += dn[idx]
+
+        for idx in range(1, 4):
+            d_i = d[idx]
+            n_i = n[idx]
+            if ((d_i >= one) and ((n[idx + 1] - n_i) > 1)) or ((d_i <= -one) and ((n[idx - 1] - n_i) < -1)):
+                step = 1 if d_i >= 0 else -1
+                q_i = q[idx]
+                n_prev = n[idx - 1]
+                n_next = n[idx + 1]
+                q_prev = q[idx - 1]
+                q_next = q[idx + 1]
+                q_new = q_i + step / (n_next - n_prev) * (
+                    (n_i - n_prev + step) * (q_next - q_i) / (n_next - n_i) +
+                    (n_next - n_i - step) * (q_i - q_prev) / (n_i - n_prev))
+                if not (q_prev < q_new < q_next):
+                    q_new = q_i + step * (q[idx + step] - q_i) / (n[idx + step] - n_i)
+                q[idx] = q_new
+                n[idx] = n_i + step
+                d[idx] = d_i - step * one
+        self.__samples = samples + 1
+
+
+# Fixed-memory quantile sketch with relative accuracy alpha (as in DDSketch):
+# positive values land in logarithmic buckets of ratio gamma, stored in a fixed
+# array that slides upwards as needed, folding its lowest buckets together.
+# Sketches with the same alpha and size merge by adding bucket counts. The window
+# is centred on the first positive sample, so if that sample sits at one end of
+# the data the half of the bins on the other side go unused until the window
+# slides; size bins for twice the expected dynamic range (or feed a typical
+# value first). update() takes one log per sample, and like P2Quantile it boxes
+# floats on ports without inline floats.
+class QuantileSketch:
+    def __init__(self, alpha=0.02, bins=256):
+        assert 0 < alpha < 1, 'Error: Relative accuracy (alpha) must be between 0 and 1'
+        self.__alpha = alpha
+        self.__gamma = (1 + alpha) / (1 - alpha)
+        self.__log_gamma = math.log(self.__gamma)
+        self.__num_bins = bins
+        self.__bins = array.array('I', [0] * bins)
+        self.reset()
+
+    def reset(self):
+        bins = self.__bins
+        for idx in range(self.__num_bins):
+            bins[idx] = 0
+        self.__offset = None
+        self.__zeros = 0
+        self.__samples = 0
+        self.__minimum = None
+        self.__maximum = None
+
+    @property
+    def alpha(self):
+        return self.__alpha
+
+    @property
+    def samples(self):
+        return self.__samples
+
+    @property
+    def valid(self):
+        return self.__samples > 0
+
+    @property
+    def minimum(self):
+        return self.__minimum
+
+    @property
+    def maximum(self):
+        return self.__maximum
+
+    @micropython.native
+    def update(self, x_new):
+        self.__samples += 1
+        if (self.__minimum is None) or (x_new < self.__minimum):
+            self.__minimum = x_new
+        if (self.__maximum is None) or (x_new > self.__maximum):
+            self.__maximum = x_new
+        if x_new <= 0:
+            self.__zeros += 1
+        else:
+            self.__add_key(int(math.ceil(math.log(x_new) / self.__log_gamma)), 1)
+
+    def quantile(self, q):
+        samples = self.__samples
+        if samples == 0:
+            return None
+        if q <= 0:
+            return self.__minimum
+        if q >= 1:
+            return self.__maximum
+        rank = q * (samples - 1)
+        count = self.__zeros
+        if rank < count:
+            return min(0, self.__maximum)
+        bins = self.__bins
+        for idx in range(self.__num_bins):
+            count += bins[idx]
+            if rank < count:
+                value = 2 * math.pow(self.__gamma, self.__offset + idx) / (self.__gamma + 1)
+                return max(self.__minimum, min(value, self.__maximum))
+        return self.__maximum
+
+    def merge(self, other):
+        assert (self.__alpha == other.__alpha) and (self.__num_bins == other.__num_bins), 'Error: Only sketches with the same accuracy and size can be merged'
+        if other.__samples == 0:
+            return self
+        self.__samples += other.__samples
+        self.__zeros += other.__zeros
+        if (self.__minimum is None) or (other.__minimum < self.__minimum):
+            self.__minimum = other.__minimum
+        if (self.__maximum is None) or (other.__maximum > self.__maximum):
+            self.__maximum = other.__maximum
+        if other.__offset is not None:
+            bins = other.__bins
+            # Adding from the top down means any slide happens before low keys land
+            for idx in range(other.__num_bins - 1, -1, -1):
+                if bins[idx] > 0:
+                    self.__add_key(other.__offset + idx, bins[idx])
+        return self
+
+    @micropython.native
+    def __add_key(self, key, count):
+        bins = self.__bins
+        num_bins = self.__num_bins
+        offset = self.__offset
+        if offset is None:
+            offset = key - (num_bins // 2)
+            self.__offset = offset
+        idx = key - offset
+        if idx < 0:
+            idx = 0
+        elif idx >= num_bins:
+            shift = idx - num_bins + 1
+            folded = 0
+            for src in range(min(shift, num_bins)):
+                folded += bins[src]
+            for dst in range(num_bins - shift):
+                bins[dst] = bins[dst + shift]
+            for dst in range(max(0, num_bins - shift), num_bins):
+                bins[dst] = 0
+            bins[0] += folded
+            self.__offset = offset + shift
+            idx = num_bins - 1
+        bins[idx] += count
+
+
+# Integer-only counterparts of ExponentialStatistics and RunningStatistics for
+# boards without an FPU. Inputs are integers (e.g. ADC counts or microseconds)
+# and the state is kept in Q format with q fractional bits in an array('i'), so
+# update() compiles with viper and never touches a float. Products are split so
+# they stay within 32 bits; this holds while |x| < 2**(31 - q) and deviations
+# from the mean stay below 2**((31 - q) / 2).
+class FixedExponentialStatistics:
+    def __init__(self, fs=100, tau=1, q=8):
+        assert tau > 0, 'Error: Negative time constant (tau) is invalid'
+        assert fs > 0, 'Error: Negative sample rate (fs) is invalid'
+        assert tau > (5 * (1/fs)), 'Error: Time constant (tau) too short for sample rate'
+        assert 0 < q <= 15, 'Error: Q format must have 1 to 15 fractional bits'
+        e = int(math.exp(-1/(fs * tau)) * (1 << q) + 0.5)  # The weight as a Q-format multiplier
+        self.__state = array.array('i', [0, 0, 0, e, q])  # x, s2, samples, e, q
+        self.__fs = fs
+        self.__tau = tau
+
+    def reset(self):
+        state = self.__state
+        state[0] = 0
+        state[1] = 0
+        state[2] = 0
+
+    @property
+    def q(self):
+        return self.__state[4]
+
+    @property
+    def x_raw(self):
+        return self.__state[0]
+
+    @property
+    def x(self):
+        state = self.__state
+        return None if state[2] == 0 else state[0] / (1 << state[4])
+
+    @property
+    def s2(self):
+        state = self.__state
+        return None if state[2] == 0 else state[1] / (1 << state[4])
+
+    @property
+    def s(self):
+        return math.sqrt(self.s2)
+
+    @property
+    def e(self):
+        return self.__state[3] / (1 << self.__state[4])
+
+    @property
+    def samples(self):
+        return self.__state[2]
+
+    @property
+    def valid(self):
+        return self.__state[2] > 0
+
+    @property
+    def fs(self):
+        return self.__fs
+
+    @property
+    def tau(self):
+        return self.__tau
+
+    @micropython.viper
+    def update(self, x_new: int) -> int:
+        state = ptr32(self.__state)
+        q = state[4]
+        e = state[3]
+        mask = (1 << q) - 1
+        x_in = x_new << q
+        if state[2] == 0:
+            x = x_in
+            s2 = 0
+        else:
+            x = state[0]
+            diff = x - x_in
+            x = x_in + ((diff >> q) * e) + (((diff & mask) * e) >> q)
+            s2_new = ((diff >> q) * diff) + (((diff & mask) * diff) >> q)
+            s2_diff = state[1] - s2_new
+            s2 = s2_new + ((s2_diff >> q) * e) + (((s2_diff & mask) * e) >> q)
+        state[0] = x
+        state[1] = s2
+        state[2] = state[2] + 1
+        return x
+
+
+# The running mean carries the remainder of its division by the sample count,
+# so it keeps tracking however many samples arrive, and the sum of squared
+# deviations (in Q format) is kept in two 30-bit limbs so it cannot overflow.
+class FixedRunningStatistics:
+    def __init__(self, q=8):
+        assert 0 < q <= 15, 'Error: Q format must have 1 to 15 fractional bits'
+        self.__state = array.array('i', [0, 0, 0, 0, 0, q])  # x, x remainder, s2_sum (low limb), s2_sum (high limb), samples, q
+
+    def reset(self):
+        state = self.__state
+        for idx in range(5):
+            state[idx] = 0
+
+    @property
+    def q(self):
+        return self.__state[5]
+
+    @property
+    def x_raw(self):
+        return self.__state[0]
+
+    @property
+    def x(self):
+        state = self.__state
+        return None if state[4] == 0 else state[0] / (1 << state[5])
+
+    @property
+    def s2(self):
+        state = self.__state
+        samples = state[4]
+        if samples <= 2:
+            return None if samples == 0 else 0
+        return ((state[3] * 1073741824.0 + state[2]) / (1 << state[5])) / (samples - 1)
+
+    @property
+    def s(self):
+        return math.sqrt(self.s2)
+
+    @property
+    def SE(self):
+        return self.s / math.sqrt(self.__state[4])
+
+    @property
+    def samples(self):
+        return self.__state[4]
+
+    @property
+    def valid(self):
+        return self.__state[4] > 0
+
+    @micropython.viper
+    def update(self, x_new: int) -> int:
+        state = ptr32(self.__state)
+        q = state[5]
+        mask = (1 << q) - 1
+        samples = state[4] + 1
+        x_in = x_new << q
+        x = state[0]
+        if samples == 1:
+            x = x_in
+            state[1] = 0
+        else:
+            diff = x_in - x
+            # The exact mean is x + remainder / samples, with 0 <= remainder < samples
+            t = state[1] + diff
+            if t >= 0:
+                step = t // samples
+            else:
+                step = 0 - ((samples - 1 - t) // samples)
+            x += step
+            state[1] = t - step * samples
+            spread = x_in - x
+            s2_step = ((diff >> q) * spread) + (((diff & mask) * spread) >> q)
+            lo = state[2] + (s2_step & 0x3FFFFFFF)
+            state[3] = state[3] + (s2_step >> 30) + (lo >> 30)
+            state[2] = lo & 0x3FFFFFFF
+        state[0] = x
+        state[4] = samples
+        return x
@@ -0,0 +1,238 @@
+import array
+import math
+
+
+class OutlierReject:
+    def __init__(self, threshold, max_rejects=3, hold=False):
+        assert threshold > 0, 'Error: Non-positive outlier threshold is invalid'
+        self.__threshold = threshold
+        self.__max_rejects = max_rejects
+        self.__hold = hold
+        self.reset()
+
+    def reset(self):
+        self.__x = None
+        self.__rejects = 0
+        self.rejected = 0
+
+    @micropython.native
+    def update(self, x_new):
+        x = self.__x
+        if (x is None) or (abs(x_new - x) <= self.__threshold) or (self.__rejects >= self.__max_rejects):
+            # A run of rejections is treated as a genuine step and re-seeds the reference
+            self.__x = x_new
+            self.__rejects = 0
+            return x_new
+        self.__rejects += 1
+        self.rejected += 1
+        return x if self.__hold else None
+
+    @micropython.native
+    def process(self, src, dst, n):
+        x = self.__x
+        rejects = self.__rejects
+        rejected = self.rejected
+        threshold = self.__threshold
+        max_rejects = self.__max_rejects
+        hold = self.__hold
+        count = 0
+        for idx in range(n):
+            x_new = src[idx]
+            if (x is None) or (abs(x_new - x) <= threshold) or (rejects >= max_rejects):
+                x = x_new
+                rejects = 0
+            else:
+                rejects += 1
+                rejected += 1
+                if not hold:
+                    continue
+            dst[count] = x
+            count += 1
+        self.__x = x
+        self.__rejects = rejects
+        self.rejected = rejected
+        return count
+
+
+class Median:
+    def __init__(self, n=5):
+        assert n > 0, 'Error: Median window must hold at least one sample'
+        self.__n = n
+        self.__window = array.array('f', [0] * n)
+        self.__sorted = array.array('f', [0] * n)
+        self.reset()
+
+    def reset(self):
+        self.__count = 0
+        self.__idx = 0
+
+    @micropython.native
+    def update(self, x_new):
+        window = self.__window
+        ordered = self.__sorted
+        n = self.__n
+        count = self.__count
+        idx = self.__idx
+        if count == n:
+            x_old = window[idx]
+            pos = 0
+            while not ordered[pos] == x_old:
+                pos += 1
+            while pos < (count - 1):
+                ordered[pos] = ordered[pos + 1]
+                pos += 1
+            count -= 1
+        window[idx] = x_new
+        x_new = window[idx]  # Use the stored (rounded) value so later removal matches exactly
+        idx += 1
+        self.__idx = 0 if idx == n else idx
+        pos = count
+        while (pos > 0) and (ordered[pos - 1] > x_new):
+            ordered[pos] = ordered[pos - 1]
+            pos -= 1
+        ordered[pos] = x_new
+        count += 1
+        self.__count = count
+        mid = count // 2
+        if (count & 1) == 1:
+            return ordered[mid]
+        return (ordered[mid - 1] + ordered[mid]) / 2
+
+    @micropython.native
+    def process(self, src, dst, n):
+        window = self.__window
+        ordered = self.__sorted
+        size = self.__n
+        count = self.__count
+        idx = self.__idx
+        for sample in range(n):
+            if count == size:
+                x_old = window[idx]
+                pos = 0
+                while not ordered[pos] == x_old:
+                    pos += 1
+                while pos < (count - 1):
+                    ordered[pos] = ordered[pos + 1]
+                    pos += 1
+                count -= 1
+            window[idx] = src[sample]
+            x_new = window[idx]
+            idx += 1
+            if idx == size:
+                idx = 0
+            pos = count
+            while (pos > 0) and (ordered[pos - 1] > x_new):
+                ordered[pos] = ordered[pos - 1]
+                pos -= 1
+            ordered[pos] = x_new
+            count += 1
+            mid = count // 2
+            if (count & 1) == 1:
+                dst[sample] = ordered[mid]
+            else:
+                dst[sample] = (ordered[mid - 1] + ordered[mid]) / 2
+        self.__count = count
+        self.__idx = idx
+        return n
+
+
+class EMA:
+    def __init__(self, fs=80, tau=1):
+        assert tau > 0, 'Error: Negative time constant (tau) is invalid'
+        assert fs > 0, 'Error: Negative sample rate (fs) is invalid'
+        self.__e = math.exp(-1 / (fs * tau))
+        self.reset()
+
+    def reset(self):
+        self.__x = None
+
+    @property
+    def x(self):
+        return self.__x
+
+    @micropython.native
+    def update(self, x_new):
+        x = self.__x
+        x = x_new if x is None else (self.__e * (x - x_new)) + x_new
+        self.__x = x
+        return x
+
+    @micropython.native
+    def process(self, src, dst, n):
+        e = self.__e
+        x = self.__x
+        for idx in range(n):
+            x_new = src[idx]
+            x = x_new if x is None else (e * (x - x_new)) + x_new
+            dst[idx] = x
+        self.__x = x
+        return n
+
+
+class Calibration:
+    def __init__(self, offset=0, scale=1):
+        self.offset = offset
+        self.scale = scale
+
+    def reset(self):
+        return
+
+    def tare(self, x):
+        self.offset = x
+
+    @micropython.native
+    def update(self, x_new):
+        return (x_new - self.offset) * self.scale
+
+    @micropython.native
+    def process(self, src, dst, n):
+        offset = self.offset
+        scale = self.scale
+        for idx in range(n):
+            dst[idx] = (src[idx] - offset) * scale
+        return n
+
+
+class Pipeline:
+    def __init__(self, *stages, block=32):
+        self.__stages = stages
+        self.__block = block
+        self.__buffer = array.array('f', [0] * block)
+        self.__output = memoryview(self.__buffer)
+
+    def __len__(self):
+        return len(self.__stages)
+
+    @property
+    def block(self):
+        return self.__block
+
+    @property
+    def output(self):
+        return self.__output
+
+    def reset(self):
+        for stage in self.__stages:
+            stage.reset()
+
+    @micropython.native
+    def update(self, x):
+        for stage in self.__stages:
+            x = stage.update(x)
+            if x is None:
+                return None
+        return x
+
+    # Runs up to block samples from src (e.g. the values filled in by
+    # hx711.convert()) through every stage in place; the results are the first
+    # n_out entries of output.
+    @micropython.native
+    def process(self, src, n=None):
+        n = len(src) if n is None else n
+        assert n <= self.__block, 'Error: Batch of {} samples exceeds the pipeline block ({})'.format(n, self.__block)
+        buf = self.__buffer
+        for idx in range(n):
+            buf[idx] = src[idx]
+        for stage in self.__stages:
+            n = stage.process(buf, buf, n)
+        return n
@@ -1,49 +1,208 @@
+import array
 import machine
 import rp2
 import time
 
-@rp2.asm_pio(set_init=rp2.PIO.OUT_LOW, in_shiftdir=0, fifo_join=rp2.PIO.JOIN_RX)
-def __hx711_pio_read(): #CHA Gain = 128
-    wrap_target()
-    label('init')
-    mov(y, invert(null))
-    label('delay')
-    jmp(pin, 'dec')
-    jmp('init_read')
-    label('dec')
-    jmp(y_dec, 'delay')
-    jmp('ovf')
-    label('init_read')
-    set(x, 23)[3]
-    label('read')
-    set(pins, 1)[3]
-    in_(pins, 1)[2]
-    set(pins, 0)[4]
-    jmp(x_dec, 'read')
-    set(pins, 1)[5]
-    set(pins, 0)[2]
-    push(noblock)
-    mov(isr, y)
-    push(noblock)
-    wrap()
-    label('ovf')
-    mov(isr, invert(null))
-    push(noblock)
-    push(noblock)
-    jmp('init')
+import timestamp
 
+# The gain and input channel of the next conversion are selected by the number
+# of SCK pulses after the 24 data bits (1: A/128, 2: B/32, 3: A/64). With
+# extra_pulses of None the count is pulled from the TX FIFO for every
+# conversion, which lets the driver switch channels round-robin.
+def __hx711_pio_program(extra_pulses):
+    fifo_join = rp2.PIO.JOIN_NONE if extra_pulses is None else rp2.PIO.JOIN_RX
 
+    @rp2.asm_pio(set_init=rp2.PIO.OUT_LOW, in_shiftdir=0, fifo_join=fifo_join)
+    def hx711_pio_read():
+        wrap_target()
+        label('init')
+        mov(y, invert(null))
+        label('delay')
+        jmp(pin, 'dec')
+        jmp('init_read')
+        label('dec')
+        jmp(y_dec, 'delay')
+        jmp('ovf')
+        label('init_read')
+        set(x, 23)[3]
+        label('read')
+        set(pins, 1)[3]
+        in_(pins, 1)[2]
+        set(pins, 0)[4]
+        jmp(x_dec, 'read')
+        if extra_pulses is None:
+            pull(block)
+            out(x, 32)
+        else:
+            set(x, extra_pulses - 1)
+        label('gain')
+        set(pins, 1)[5]
+        set(pins, 0)[2]
+        jmp(x_dec, 'gain')
+        push(noblock)
+        mov(isr, y)
+        push(noblock)
+        wrap()
+        label('ovf')
+        mov(isr, invert(null))
+        push(noblock)
+        push(noblock)
+        jmp('init')
+    return hx711_pio_read
+
+
+# Reads N HX711s that share SCK and have their DOUT lines on consecutive pins.
+# Every clock shifts one bit from each channel, and autopush emits a word per
+# 8 clocks, so a conversion arrives as three words of 8 * N bits.
+def __hx711_array_program(channels, extra_pulses):
+    @rp2.asm_pio(set_init=rp2.PIO.OUT_LOW, in_shiftdir=rp2.PIO.SHIFT_LEFT, autopush=True, push_thresh=8 * channels, fifo_join=rp2.PIO.JOIN_RX)
+    def hx711_array_read():
+        wrap_target()
+        label('wait')
+        mov(isr, null)
+        in_(pins, channels)
+        mov(x, isr)
+        jmp(x_dec, 'wait')
+        mov(isr, null)
+        set(x, 23)[3]
+        label('read')
+        set(pins, 1)[3]
+        in_(pins, channels)[2]
+        set(pins, 0)[4]
+        jmp(x_dec, 'read')
+        set(x, extra_pulses - 1)
+        label('gain')
+        set(pins, 1)[5]
+        set(pins, 0)[2]
+        jmp(x_dec, 'gain')
+        wrap()
+    return hx711_array_read
+
+
+# Converts a block of raw (data, dt) word pairs, as pushed by the PIO program,
+# into signed samples and wait counts; overflow markers are dropped. Returns the
+# number of valid samples written to values/dt_counts.
+@micropython.viper
+def convert(raw, samples: int, values, dt_counts) -> int:
+    src = ptr32(raw)
+    dst = ptr32(values)
+    dst_dt = ptr32(dt_counts)
+    valid = 0
+    idx = 0
+    for sample in range(samples):
+        data = src[idx]
+        dt = src[idx + 1]
+        idx += 2
+        if ((data >> 24) & 0xFF) == 0:
+            if not (data & 0x800000) == 0:
+                data -= 0x1000000
+            dst[valid] = data
+            dst_dt[valid] = 255 - dt  # (0xFFFFFFFF - dt + dt_counts_read) mod 2**32
+            valid += 1
+    return valid
+
+
+# Unpacks conversions from the parallel PIO program into channel-major signed
+# samples: values[channel * samples + sample].
+@micropython.viper
+def unpack_parallel(raw, samples: int, channels: int, values) -> int:
+    src = ptr32(raw)
+    dst = ptr32(values)
+    mask = (1 << channels) - 1
+    idx = 0
+    for sample in range(samples):
+        out = sample
+        for channel in range(channels):
+            dst[out] = 0
+            out += samples
+        for word in range(3):
+            bits = src[idx]
+            idx += 1
+            shift = 7 * channels
+            for clk in range(8):
+                group = (bits >> shift) & mask
+                out = sample
+                for channel in range(channels):
+                    dst[out] = (dst[out] << 1) | ((group >> channel) & 1)
+                    out += samples
+                shift -= channels
+        out = sample
+        for channel in range(channels):
+            data = dst[out]
+            if not (data & 0x800000) == 0:
+                dst[out] = data - 0x1000000
+            out += samples
+    return samples
+
+
+# A sequence of gains (e.g. (128, 32) for channel A then B) is sampled round-
+# robin. The datasheet gives the output 4 conversions to settle after a gain or
+# channel switch, so each switch is followed by settle conversions that get()
+# returns as None (with gain None) before the tagged one; settle=3 meets the
+# datasheet figure, the default of 1 drops the worst of the step.
 class HX711:
     f_clk = const(20000000)
+    f_clk_min = const(120000)  # Keeps the longest SCK high time under the 50 us power down limit
     dt_count_ratio = const(2)
     dt_counts_read = const(256)
     dt_counts_ovf = const(5)
+    t_poll_us = const(5000)
+    f_drain = const(100)
+    pio_base = (0x50200000, 0x50300000)
+    gain_pulses = {128: 1, 32: 2, 64: 3}
     
-    def __init__(self, clk, dt, pio_idx=0):
-        self.__sm = rp2.StateMachine(pio_idx, __hx711_pio_read, freq=HX711.f_clk, set_base=machine.Pin(clk), in_base=machine.Pin(dt), jmp_pin=machine.Pin(dt))
+    def __init__(self, clk, dt, pio_idx=0, gain=128, sequence=None, rate=10, f_clk=None, settle=1):
+        f_clk = HX711.f_clk if f_clk is None else f_clk
+        assert HX711.f_clk_min <= f_clk <= HX711.f_clk, 'Error: PIO clock ({}) outside of the HX711 SCK timing limits'.format(f_clk)
+        assert rate in (10, 80), 'Error: HX711 output rate must be 10 or 80 SPS'
+        sequence = (gain,) if sequence is None else tuple(sequence)
+        for seq_gain in sequence:
+            assert seq_gain in HX711.gain_pulses, 'Error: Invalid HX711 gain ({})'.format(seq_gain)
+        assert settle >= 0, 'Error: Negative settling count is invalid'
+        self.__sequence = sequence
+        self.__settle = settle if len(sequence) > 1 else 0
+        self.__slots = len(sequence) * (self.__settle + 1)  # Every gain is held for settle + 1 conversions
+        self.__rate = rate
+        self.__f_clk = f_clk
+        self.gain = sequence[0] if len(sequence) == 1 else None
+        if len(sequence) == 1:
+            program = __hx711_pio_program(HX711.gain_pulses[sequence[0]])
+        else:
+            program = __hx711_pio_program(None)
+        self.__sm_id = pio_idx
+        self.__sm = rp2.StateMachine(pio_idx, program, freq=f_clk, set_base=machine.Pin(clk), in_base=machine.Pin(dt), jmp_pin=machine.Pin(dt))
+        if len(sequence) > 1:
+            # Pulses after conversion n select the gain of conversion n + 1, so two
+            # selections are kept queued ahead and the first reading is untagged.
+            self.__read_idx = -1
+            self.__put_idx = 0
+            self.__schedule()
+            self.__schedule()
         self.__sm.active(1)
-        self.__dt_res = HX711.dt_count_ratio / HX711.f_clk
+        self.__dt_res = HX711.dt_count_ratio / f_clk
         print('dt_res = {} us'.format(1e6 * self.__dt_res))
+        self.__dma = None
+        self.__timer = None
+        self.__block = 0
+        self.__ready = -1
+        self.overruns = 0
+
+    @property
+    def dt_res(self):
+        return self.__dt_res
+
+    @property
+    def sequence(self):
+        return self.__sequence
+
+    @property
+    def settle(self):
+        return self.__settle
+
+    # Tagged samples per second for each gain in the sequence
+    @property
+    def f_sample(self):
+        return self.__rate / self.__slots
         
     def __len__(self):
         return 1 if self.__data is not None else 0
@@ -62,8 +221,181 @@ class HX711:
         dt_data = self.__sm.get()
         valid_data = not (data == 0xFFFFFFFF)
         if valid_data:
+            sequence = self.__sequence
             dt = (0xFFFFFFFF - dt_data + HX711.dt_counts_read) * self.__dt_res
+            if len(sequence) > 1:
+                read_idx = self.__read_idx
+                self.__read_idx = 0 if (read_idx + 1) == self.__slots else read_idx + 1
+                self.__schedule()
+                if read_idx < 0:
+                    self.gain = None
+                else:
+                    hold = self.__settle + 1
+                    if read_idx % hold < self.__settle:
+                        self.gain = None
+                        return None, dt  # Still settling after a switch
+                    self.gain = sequence[read_idx // hold]
             if data >= 0x800000:
-                data = data - 0xFFFFFF
+                data = data - 0x1000000
             return data, dt
         return None, (0xFFFFFFFF + HX711.dt_counts_ovf) * self.__dt_res
+
+    async def read(self):
+        while self.available() < 2:
+            await timestamp.sleep_us(HX711.t_poll_us)
+        return self.get()
+
+    @property
+    def streaming(self):
+        return (self.__dma is not None) or (self.__timer is not None)
+
+    @property
+    def block(self):
+        return self.__block
+
+    def start_stream(self, block=16, use_dma=True, timer_id=-1):
+        assert len(self.__sequence) == 1, 'Error: Streaming capture requires a fixed gain'
+        self.stop_stream()
+        words = 2 * block
+        buf = array.array('I', [0] * (2 * words))
+        raw = memoryview(buf)
+        self.__block = block
+        self.__buf = buf
+        self.__halves = (raw[:words], raw[words:])
+        self.__ready = -1
+        self.overruns = 0
+        while self.__sm.rx_fifo() > 0:
+            self.__sm.get()
+        if use_dma and hasattr(rp2, 'DMA'):
+            self.__start_dma(buf, words)
+        else:
+            self.__start_timer(raw, words, timer_id)
+
+    def stop_stream(self):
+        if self.__dma is not None:
+            for dma in self.__dma:
+                dma.active(0)
+                dma.close()
+            self.__dma = None
+        if self.__timer is not None:
+            self.__timer.deinit()
+            self.__timer = None
+
+    @micropython.native
+    def batch(self):
+        idx = self.__ready
+        if idx < 0:
+            return None
+        self.__ready = -1
+        return self.__halves[idx]
+
+    @micropython.native
+    def read_batch(self, values, dt_counts):
+        raw = self.batch()
+        if raw is None:
+            return 0
+        return convert(raw, self.__block, values, dt_counts)
+
+    @micropython.native
+    def __schedule(self):
+        put_idx = self.__put_idx
+        self.__sm.put(HX711.gain_pulses[self.__sequence[put_idx // (self.__settle + 1)]] - 1)
+        put_idx += 1
+        self.__put_idx = 0 if put_idx == self.__slots else put_idx
+
+    def __start_dma(self, buf, words):
+        import uctypes
+        pio_idx, sm_idx = self.__sm_id // 4, self.__sm_id % 4
+        rx_fifo = HX711.pio_base[pio_idx] + 0x20 + (4 * sm_idx)  # RXFn register
+        treq_sel = (8 * pio_idx) + 4 + sm_idx  # DREQ_PIOn_RXm
+        base = uctypes.addressof(buf)
+        self.__dma_write = (base, base + (4 * words))
+        self.__dma = (rp2.DMA(), rp2.DMA())
+        self.__dma_channel = self.__dma[0].channel
+        handler = self.__dma_irq
+        # Each channel fills one half then chains to the other, so the FIFO is
+        # drained without gaps while the completed half is handed to the caller.
+        for idx, dma in enumerate(self.__dma):
+            ctrl = dma.pack_ctrl(size=2, inc_read=False, inc_write=True, treq_sel=treq_sel, chain_to=self.__dma[1 - idx].channel, irq_quiet=False)
+            dma.config(read=rx_fifo, write=self.__dma_write[idx], count=words, ctrl=ctrl)
+            dma.irq(handler=handler)
+        self.__dma[0].active(1)
+
+    def __dma_irq(self, dma):
+        idx = 0 if dma.channel == self.__dma_channel else 1
+        dma.write = self.__dma_write[idx]
+        if self.__ready >= 0:
+            self.overruns += 1
+        self.__ready = idx
+
+    def __start_timer(self, raw, words, timer_id):
+        self.__raw = raw
+        self.__words = words
+        self.__pos = 0
+        self.__timer = machine.Timer(timer_id)
+        self.__timer.init(mode=machine.Timer.PERIODIC, freq=HX711.f_drain, callback=self.__drain)
+
+    @micropython.native
+    def __drain(self, timer):
+        sm = self.__sm
+        raw = self.__raw
+        words = self.__words
+        pos = self.__pos
+        count = sm.rx_fifo()
+        while count > 0:
+            raw[pos] = sm.get()
+            pos += 1
+            count -= 1
+            if pos == words:
+                if self.__ready >= 0:
+                    self.overruns += 1
+                self.__ready = 0
+            elif pos == 2 * words:
+                if self.__ready >= 0:
+                    self.overruns += 1
+                self.__ready = 1
+                pos = 0
+        self.__pos = pos
+
+
+class HX711Array:
+    f_clk = const(20000000)
+    words = const(3)
+    max_channels = const(4)
+
+    def __init__(self, clk, dt_base, channels, pio_idx=0, gain=128):
+        assert 0 < channels <= HX711Array.max_channels, 'Error: HX711Array supports 1 to 4 channels'
+        assert gain in HX711.gain_pulses, 'Error: Invalid HX711 gain ({})'.format(gain)
+        self.__channels = channels
+        self.gain = gain
+        dt_pins = [machine.Pin(dt_base + idx, machine.Pin.IN) for idx in range(channels)]
+        program = __hx711_array_program(channels, HX711.gain_pulses[gain])
+        self.__sm = rp2.StateMachine(pio_idx, program, freq=HX711Array.f_clk, set_base=machine.Pin(clk), in_base=dt_pins[0])
+        self.__sm.active(1)
+        self.__raw = array.array('I', [0] * HX711Array.words)
+        self.values = array.array('i', [0] * channels)
+
+    def __len__(self):
+        return self.__channels
+
+    @micropython.native
+    def available(self):
+        return self.__sm.rx_fifo() // HX711Array.words
+
+    @micropython.native
+    def get(self, values=None):
+        values = self.values if values is None else values
+        self.__sm.get(self.__raw)
+        unpack_parallel(self.__raw, 1, self.__channels, values)
+        return values
+
+    @micropython.native
+    def get_many(self, raw, values):
+        samples = len(raw) // HX711Array.words
+        self.__sm.get(raw)
+        return unpack_parallel(raw, samples, self.__channels, values)
+
+    async def read(self, values=None):
+        while self.available() < 1:
+            await timestamp.sleep_us(HX711.t_poll_us)
+        return self.get(values)
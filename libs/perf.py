@@ -1,3 +1,4 @@
+import array
 import math
 import utime
 
@@ -6,116 +7,189 @@ import timestamp
 @micropython.native
 class HistogramSampler:
     class HistogramData:
-        def __init__(self, t_min_us, t_max_us, t_start, t_sample_us, num_bins):
-            self.__t_min_us = t_min_us
-            self.__t_max_us = t_max_us
+        # Layout of the integer state used by the viper recording path
+        idx_t_min = const(0)
+        idx_span = const(1)
+        idx_shift = const(2)  # Scales offset and span down so offset * num_bins fits 31 bits
+        idx_num_bins = const(3)
+        idx_samples = const(4)
+        idx_total_lo = const(5)  # The total time is kept in two 30-bit limbs as well
+        idx_minimum = const(6)
+        idx_maximum = const(7)
+        idx_sq_lo = const(8)  # The sum of squares is kept in two 30-bit limbs
+        idx_sq_hi = const(9)
+        idx_sub_bits = const(10)  # Non-zero selects the log-linear layout
+        idx_total_hi = const(11)
+        state_size = const(12)
+
+        # With sub_bits set the bins are log-linear (HDR style): values below
+        # 2**sub_bits get a bin each and every further power of two is split into
+        # 2**sub_bits bins, so the relative error is at most 2**-sub_bits from
+        # 0 us up to t_max_us and num_bins is derived from the range.
+        def __init__(self, t_min_us, t_max_us, t_start, t_sample_us, num_bins, sub_bits=0):
             self.__t_start = t_start
-            self.__t_sample_us = t_sample_us
+            self.__t_sample_us = int(t_sample_us)
+            self.__sub_bits = sub_bits
+            if sub_bits > 0:
+                t_min_us = 0
+                num_bins = self.log_bin(int(t_max_us), sub_bits) + 1
             self.__num_bins = num_bins
-            self.__bins = [0] * self.__num_bins            
-            self.__done = False
-            self.__t_total_us = 0
-            self.__samples = 0
-            self.__t_step = (t_max_us - t_min_us) / num_bins
-            self.__t_minimum = None
-            self.__t_maximum = None
-            
+            self.__bins = array.array('I', [0] * num_bins)
+            self.__state = array.array('i', [0] * self.state_size)
+            self.reset(t_min_us, t_max_us, t_start)
+
         def reset(self, t_min_us, t_max_us, t_start):
-            self.__t_min_us = t_min_us
-            self.__t_max_us = t_max_us
-            self.__t_start = t_start            
+            t_min_us = 0 if self.__sub_bits > 0 else int(t_min_us)
+            span = max(1, int(t_max_us) - t_min_us)
+            self.__t_start = t_start
             self.__done = False
-            self.__t_total_us = 0
-            self.__samples = 0
-            self.__t_step = (t_max_us - t_min_us) / self.__num_bins
-            self.__t_minimum = None
-            self.__t_maximum = None
+            state = self.__state
+            for idx in range(self.state_size):
+                state[idx] = 0
+            state[self.idx_t_min] = t_min_us
+            state[self.idx_span] = span
+            shift = 0
+            while ((span >> shift) * self.__num_bins) >= (1 << 31):
+                shift += 1
+            state[self.idx_shift] = shift
+            state[self.idx_num_bins] = self.__num_bins
+            state[self.idx_sub_bits] = self.__sub_bits
+            bins = self.__bins
             for idx in range(self.__num_bins):
-                self.__bins[idx] = 0
+                bins[idx] = 0
 
         @property
         def num_bins(self):
             return self.__num_bins
-        
+
         @property
         def dt_min(self):
-            return self.__t_min_us
-        
+            return self.__state[self.idx_t_min]
+
         @property
         def dt_max(self):
-            return self.__t_max_us
-        
+            return self.__state[self.idx_t_min] + self.__state[self.idx_span]
+
         @property
         def t_start(self):
             return self.__t_start
-        
+
+        @property
+        def bins(self):
+            return self.__bins
+
+        @property
+        def sub_bits(self):
+            return self.__sub_bits
+
         @property
         def histogram(self):
-            hist = []
-            t_min = self.__t_min_us
-            for idx, count in enumerate(self.__bins):
-                t_max = t_min + self.__t_step
-                hist.append( ((t_min, t_max), count) )
-                t_min = t_max
-            return hist
-        
+            return [(self.bin_range(idx), count) for idx, count in enumerate(self.__bins)]
+
+        @staticmethod
+        def log_bin(dt, sub_bits):
+            if dt < (1 << sub_bits):
+                return dt
+            shift = 0
+            while (dt >> shift) >= (2 << sub_bits):
+                shift += 1
+            return (shift << sub_bits) + (dt >> shift)
+
+        def bin_range(self, idx):
+            sub_bits = self.__sub_bits
+            if sub_bits > 0:
+                if idx < (1 << sub_bits):
+                    return (idx, idx + 1)
+                shift = (idx >> sub_bits) - 1
+                sub = (idx & ((1 << sub_bits) - 1)) | (1 << sub_bits)
+                return (sub << shift, (sub + 1) << shift)
+            t_step = self.__state[self.idx_span] / self.__num_bins
+            t_min = self.dt_min + idx * t_step
+            return (t_min, t_min + t_step)
+
+        def percentile(self, p):
+            samples = self.samples
+            if samples == 0: return None
+            target = max(1, math.ceil(samples * p / 100))
+            count = 0
+            for idx, bin_count in enumerate(self.__bins):
+                count += bin_count
+                if count >= target:
+                    return min(max(self.bin_range(idx)[1], self.minimum), self.maximum)
+            return self.maximum
+
+        def merge(self, other):
+            state = self.__state
+            other_state = other.__state
+            for idx in (self.idx_t_min, self.idx_span, self.idx_num_bins, self.idx_sub_bits):
+                assert state[idx] == other_state[idx], 'Error: Only histograms with the same bin layout can be merged'
+            if other_state[self.idx_samples] == 0:
+                return self
+            bins = self.__bins
+            for idx, count in enumerate(other.__bins):
+                bins[idx] += count
+            if (state[self.idx_samples] == 0) or (other_state[self.idx_minimum] < state[self.idx_minimum]):
+                state[self.idx_minimum] = other_state[self.idx_minimum]
+            if (state[self.idx_samples] == 0) or (other_state[self.idx_maximum] > state[self.idx_maximum]):
+                state[self.idx_maximum] = other_state[self.idx_maximum]
+            state[self.idx_samples] += other_state[self.idx_samples]
+            total_lo = state[self.idx_total_lo] + other_state[self.idx_total_lo]
+            state[self.idx_total_hi] += other_state[self.idx_total_hi] + (total_lo >> 30)
+            state[self.idx_total_lo] = total_lo & 0x3FFFFFFF
+            sq_lo = state[self.idx_sq_lo] + other_state[self.idx_sq_lo]
+            state[self.idx_sq_hi] += other_state[self.idx_sq_hi] + (sq_lo >> 30)
+            state[self.idx_sq_lo] = sq_lo & 0x3FFFFFFF
+            return self
+
         @property
         def percentage(self):
-            return 100 * (self.__t_total_us / self.__t_sample_us)
-        
-        
+            return 100 * (self.total / self.__t_sample_us)
+
         @property
         def minimum(self):
-            return self.__t_minimum
-        
+            return None if self.samples == 0 else self.__state[self.idx_minimum]
+
         @property
         def maximum(self):
-            return self.__t_maximum
-        
+            return None if self.samples == 0 else self.__state[self.idx_maximum]
+
+        @property
+        def total(self):
+            state = self.__state
+            return (state[self.idx_total_hi] << 30) + state[self.idx_total_lo]
+
         @property
         def mean(self):
-            if self.__samples == 0: return None
-            hist = self.histogram
-            total = 0
-            for (minimum, maximum), count in hist:
-                total += (maximum + minimum) * count / 2
-            return total / self.__samples
-        
+            if self.samples == 0: return None
+            return self.total / self.samples
+
         @property
         def variance(self):
-            mean = self.mean
-            hist = self.histogram
-            total = 0
-            for (minimum, maximum), count in hist:
-                mid = (maximum + minimum) / 2
-                total += (mid - mean)**2 * count
-            return total / self.__samples
-    
+            samples = self.samples
+            if samples == 0: return None
+            state = self.__state
+            sq_sum = (state[self.idx_sq_hi] << 30) + state[self.idx_sq_lo]
+            total = self.total
+            return max(0, (sq_sum - (total * total) / samples) / samples)
+
         @property
         def sd(self):
             return math.sqrt(self.variance)
-        
+
         @property
         def samples(self):
-            return self.__samples
-        
+            return self.__state[self.idx_samples]
+
         @property
         def valid(self):
             return self.__done
-    
+
         @micropython.native
-        def add(self, t0, t1, use=False):
-            dt = timestamp.diff(t1, t0)
+        def add(self, t0, t1, use=False, t_offset=0):
             if use and not self.__done:
-                self.__t_total_us += dt
-                idx = self.__bin_idx(dt)
-                self.__bins[idx] += 1
-                self.__samples += 1
-                if (self.__t_minimum is None) or (self.__t_minimum > dt):
-                    self.__t_minimum = dt
-                if (self.__t_maximum is None) or (self.__t_maximum < dt):
-                    self.__t_maximum = dt                    
-            self.__done = (t1 - self.__t_start) >= self.__t_sample_us
+                dt = timestamp.diff(t1, t0) - t_offset
+                self.__record(dt if dt > 0 else 0)
+            self.__done = timestamp.diff(t1, self.__t_start) >= self.__t_sample_us
             return self.__done
 
         def print_histogram(self, width=80):
@@ -123,10 +197,12 @@ class HistogramSampler:
             fill = ' '
             hist = self.histogram
             max_count = 0
-            field_width = int(math.ceil(math.log10(self.__t_max_us)))
+            field_width = int(math.ceil(math.log10(max(10, self.dt_max))))
             line_fmt = r'{{:{}d}} us - {{:{}d}} us: {{}}{{}}|'.format(field_width, field_width)
             scale_fmt = r'{{:{}d}} |'.format(width - 3)
             label_width = 12 + 2 * field_width
+            if self.__sub_bits > 0:
+                hist = [entry for entry in hist if entry[1] > 0]  # Most log-linear bins are empty
             for (_, _), count in hist:
                 if count > max_count:
                     max_count = count
@@ -141,33 +217,139 @@ class HistogramSampler:
                     print(line_fmt.format(int(minimum), int(maximum), counter * num_counters, fill * num_fill))
                 print(scale_fmt.format(int(max_count)))
             return
-        
-        def __bin_idx(self, dt):
-            return int(max(0, min((dt - self.__t_min_us) / self.__t_step, self.__num_bins - 1)))
 
-    def __init__(self, t_min_us=None, t_max_us=None, t_sample_us=None, bins=None, auto_rescale=True): 
-        self.__t_min_us = 0 if t_min_us is None else t_min_us
-        self.__t_max_us = 1500 if t_max_us is None else t_max_us
-        self.__t_sample_us = max(1e6, 10 * self.__t_max_us) if t_sample_us is None else t_sample_us
+        @micropython.viper
+        def __record(self, dt: int):
+            state = ptr32(self.__state)
+            bins = ptr32(self.__bins)
+            num_bins = state[3]
+            sub_bits = state[10]
+            offset = dt - state[0]
+            if sub_bits > 0:
+                if dt >= state[1]:
+                    idx = num_bins - 1
+                elif dt < (1 << sub_bits):
+                    idx = dt
+                else:
+                    # Constant time most significant bit search
+                    msb = 0
+                    v = dt
+                    if v >= 0x10000:
+                        v = v >> 16
+                        msb += 16
+                    if v >= 0x100:
+                        v = v >> 8
+                        msb += 8
+                    if v >= 0x10:
+                        v = v >> 4
+                        msb += 4
+                    if v >= 0x4:
+                        v = v >> 2
+                        msb += 2
+                    if v >= 0x2:
+                        msb += 1
+                    shift = msb - sub_bits
+                    idx = (shift << sub_bits) + (dt >> shift)
+            elif offset <= 0:
+                idx = 0
+            elif offset >= state[1]:
+                idx = num_bins - 1
+            else:
+                # Exact floor(offset * num_bins / span), to 2**shift us on very wide spans
+                shift = state[2]
+                idx = ((offset >> shift) * num_bins) // (state[1] >> shift)
+                if idx >= num_bins:  # Only when scaling rounds offset up to the span
+                    idx = num_bins - 1
+            bins[idx] = bins[idx] + 1
+            samples = state[4]
+            if (samples == 0) or (dt < state[6]):
+                state[6] = dt
+            if (samples == 0) or (dt > state[7]):
+                state[7] = dt
+            state[4] = samples + 1
+            total_lo = state[5] + (dt & 0x3FFFFFFF)
+            state[11] = state[11] + (dt >> 30) + (total_lo >> 30)
+            state[5] = total_lo & 0x3FFFFFFF
+            # dt**2 = (a * 2**15 + b)**2 accumulated into 30-bit limbs without overflowing
+            a = dt >> 15
+            b = dt & 0x7FFF
+            ab = a * b
+            lo = state[8] + (b * b)
+            hi = state[9] + (a * a) + (ab >> 14) + (lo >> 30)
+            lo = (lo & 0x3FFFFFFF) + ((ab & 0x3FFF) << 16)
+            state[8] = lo & 0x3FFFFFFF
+            state[9] = hi + (lo >> 30)
+
+    # With digits set the histogram is log-linear with that many significant
+    # decimal digits over 0 us to t_max_us (default ~16 s). The layout never
+    # rescales, so every finished window is also merged into total.
+    def __init__(self, t_min_us=None, t_max_us=None, t_sample_us=None, bins=None, auto_rescale=True, digits=None, calibrate=True): 
+        sub_bits = 0 if digits is None else math.ceil(digits * math.log(10) / math.log(2))
+        self.__t_min_us = 0 if t_min_us is None else int(t_min_us)
+        self.__t_max_us = (1500 if digits is None else (1 << 24)) if t_max_us is None else int(t_max_us)
+        self.__t_sample_us = max(1000000, 10 * self.__t_max_us) if t_sample_us is None else int(t_sample_us)
         self.__num_bins = 10 if bins is None else bins
-        self.__auto_rescale = auto_rescale
+        self.__auto_rescale = auto_rescale and (digits is None)
         self.__data_buffer = [
-            self.HistogramData(self.__t_min_us, self.__t_max_us, 0, self.__t_sample_us, self.__num_bins),
-            self.HistogramData(self.__t_min_us, self.__t_max_us, 0, self.__t_sample_us, self.__num_bins)
+            self.HistogramData(self.__t_min_us, self.__t_max_us, 0, self.__t_sample_us, self.__num_bins, sub_bits),
+            self.HistogramData(self.__t_min_us, self.__t_max_us, 0, self.__t_sample_us, self.__num_bins, sub_bits)
         ]
+        self.__total = None
+        if digits is not None:
+            self.__total = self.HistogramData(self.__t_min_us, self.__t_max_us, 0, self.__t_sample_us, self.__num_bins, sub_bits)
         self.__active_idx = 0
+        self.__t_offset = 0
+        self.__t0 = 0
         self.reset()
+        if calibrate:
+            self.calibrate()
     
     @property
     def data(self):
         return self.__data_buffer[1-self.__active_idx]
+
+    @property
+    def total(self):
+        return self.__total
+
+    @property
+    def current(self):
+        return self.__data_buffer[self.__active_idx]
+
+    @property
+    def t_offset(self):
+        return self.__t_offset
+
+    @property
+    def t_sample_us(self):
+        return self.__t_sample_us
+
+    # Measures the cost of an empty begin()/end() pair as the minimum over a
+    # number of runs; it is subtracted from every sample before binning.
+    def calibrate(self, samples=64):
+        t_offset = None
+        for _ in range(samples):
+            self.begin()
+            dt = self.__probe()
+            if (t_offset is None) or (dt < t_offset):
+                t_offset = dt
+        self.__sampling = False
+        self.__t_offset = t_offset
+        return t_offset
+
+    @micropython.native
+    def __probe(self):
+        t1 = timestamp.now()  # Mirrors the path through end() up to its timestamp
+        return timestamp.diff(t1, self.__t0)
     
-    def reset(self):
-        t_start = timestamp.now()
+    def reset(self, t_start=None):
+        t_start = timestamp.now() if t_start is None else t_start
         self.__sampling = False
         self.__active_idx = 0        
         for data in self.__data_buffer:
             data.reset(self.__t_min_us, self.__t_max_us, t_start)
+        if self.__total is not None:
+            self.__total.reset(self.__t_min_us, self.__t_max_us, t_start)
         
     @micropython.native
     def begin(self):
@@ -177,49 +359,230 @@ class HistogramSampler:
     @micropython.native
     def end(self, keep=True):
         t1 = timestamp.now()
-        use = keep and self.__sampling
-        active_data = self.__data_buffer[self.__active_idx]
-        done = active_data.add(self.__t0, t1, use=use)
+        done = self.__add(self.__t0, t1, keep and self.__sampling, self.__t_offset)
         self.__sampling = False
-        if done:
-            t_min_us = active_data.minimum if self.__auto_rescale else self.__t_min_us
-            t_max_us = active_data.maximum if self.__auto_rescale else self.__t_max_us            
-            self.__active_idx = 0 if self.__active_idx == 1 else 1
-            self.__data_buffer[self.__active_idx].reset(t_min_us, t_max_us, t1)
         return done
     
     @micropython.native    
     def end_callback(self, callback, keep=True):
         t1 = timestamp.now()
         use = keep and self.__sampling
-        active_data = self.__data_buffer[self.__active_idx]
-        done = active_data.add(self.__t0, t1, use=(keep and self.__sampling))
+        done = self.__add(self.__t0, t1, use, self.__t_offset)
         self.__sampling = False
         if use and (callback is not None):
             callback(self.__t0, t1)
+        return done
+
+    # Records an interval measured elsewhere (e.g. deadline lateness) without
+    # the begin()/end() overhead correction
+    @micropython.native
+    def add(self, t0, t1):
+        return self.__add(t0, t1, True, 0)
+
+    @micropython.native
+    def __add(self, t0, t1, use, t_offset):
+        active_data = self.__data_buffer[self.__active_idx]
+        done = active_data.add(t0, t1, use, t_offset)
         if done:
-            t_min_us = active_data.minimum if self.__auto_rescale else self.__t_min_us
-            t_max_us = active_data.maximum if self.__auto_rescale else self.__t_max_us            
+            rescale = self.__auto_rescale and (active_data.samples > 0)
+            t_min_us = active_data.minimum if rescale else self.__t_min_us
+            t_max_us = active_data.maximum if rescale else self.__t_max_us
+            if self.__total is not None:
+                self.__total.merge(active_data)
             self.__active_idx = 0 if self.__active_idx == 1 else 1
             self.__data_buffer[self.__active_idx].reset(t_min_us, t_max_us, t1)
         return done
-    
 
 
+# Wraps timestamp.expired_and_advance() for periodic loops and records how late
+# each tick fired (relative to its deadline) into a histogram. A tick that fires
+# a whole period or more late is an overrun; with skip_missed the missed
+# periods are dropped instead of running back to back to catch up.
+class PeriodicMonitor:
+    def __init__(self, period_us, t_base=None, skip_missed=True, stats=None):
+        assert period_us > 0, 'Error: Non-positive period is invalid'
+        self.__period_us = int(period_us)
+        self.__skip_missed = skip_missed
+        # Lateness is reported every second by default rather than after the digits-mode window of minutes
+        self.__stats = HistogramSampler(t_sample_us=1000000, digits=1, calibrate=False) if stats is None else stats
+        self.reset(t_base)
+
+    def reset(self, t_base=None):
+        self.__t_base = timestamp.now() if t_base is None else t_base
+        self.__stats.reset(self.__t_base)  # Windows are timed on the same clock as the ticks
+        self.__t_late = 0
+        self.__ticks = 0
+        self.__overruns = 0
+        self.__skipped = 0
+
+    @property
+    def period_us(self):
+        return self.__period_us
+
+    @property
+    def t_base(self):
+        return self.__t_base
+
+    @property
+    def stats(self):
+        return self.__stats
+
+    @property
+    def late(self):
+        return self.__t_late
+
+    @property
+    def ticks(self):
+        return self.__ticks
+
+    @property
+    def overruns(self):
+        return self.__overruns
+
+    @property
+    def skipped(self):
+        return self.__skipped
+
+    @micropython.native
+    def poll(self, t=None):
+        t = timestamp.now() if t is None else t
+        expired, t_deadline = timestamp.expired_and_advance(self.__t_base, self.__period_us, t)
+        if not expired:
+            return False
+        self.__ticks += 1
+        self.__stats.add(t_deadline, t)
+        t_late = timestamp.diff(t, t_deadline)
+        self.__t_late = t_late
+        if t_late >= self.__period_us:
+            missed = t_late // self.__period_us
+            self.__overruns += 1
+            if self.__skip_missed:
+                self.__skipped += missed
+                t_deadline = timestamp.advance(t_deadline, missed * self.__period_us)
+        self.__t_base = t_deadline
+        return True
+
 
+# Process-wide registry of named samplers. While enabled is False a section is
+# a shared no-op and a measured function only pays one branch (plus forwarding
+# its arguments); functions decorated while perf is disabled are returned
+# unwrapped and cost nothing at all.
 class perf:
-    __history = []
-    
+    enabled = True
+    __registry = {}
+
+    class Section:
+        def __init__(self, stats):
+            self.__stats = stats
+            self.__active = False
+
+        def __enter__(self):
+            if perf.enabled:
+                self.__active = True
+                self.__stats.begin()
+            return self
+
+        def __exit__(self, exc_type, exc_value, traceback):
+            if self.__active:
+                self.__active = False
+                self.__stats.end(keep=exc_type is None)
+            return False
+
+    class Disabled:
+        def __enter__(self):
+            return self
+
+        def __exit__(self, exc_type, exc_value, traceback):
+            return False
+
+    __disabled = Disabled()
+
     def __init__(self, func, name=None, stats=None):
         self.__func = func
-        self.__stats = HistogramSampler() if stats is None else stats
-        # TODO: STORE A LINK TO THIS IN THE PERF HISTORY LIST AND MAKE IT ACCESSIBLE FROM THE PERF CLASS
+        self.__stats = perf.sampler(func.__name__ if name is None else name, stats)
+
     def __call__(self, *args, **kwargs):
+        if not perf.enabled:
+            return self.__func(*args, **kwargs)
         self.__stats.begin()
-        result = self.__func(*args, **kwargs)
-        self.__stats.end()
+        keep = False
+        try:
+            result = self.__func(*args, **kwargs)
+            keep = True
+        finally:
+            self.__stats.end(keep=keep)
         return result
 
+    @property
+    def stats(self):
+        return self.__stats
+
+    @staticmethod
+    def sampler(name, stats=None):
+        entry = perf.__registry.get(name)
+        if entry is None:
+            entry = [HistogramSampler() if stats is None else stats, None]
+            perf.__registry[name] = entry
+        elif stats is not None:
+            entry[0] = stats
+            entry[1] = None
+        return entry[0]
+
+    @staticmethod
+    def measure(name=None, stats=None):
+        return lambda func: perf(func, name, stats) if perf.enabled else func
+
+    # The section object is created once per name, so entering it in a hot
+    # loop only costs a dictionary lookup when it is not hoisted
+    @staticmethod
+    def section(name):
+        if not perf.enabled:
+            return perf.__disabled
+        perf.sampler(name)
+        entry = perf.__registry[name]
+        if entry[1] is None:
+            entry[1] = perf.Section(entry[0])
+        return entry[1]
+
+    @staticmethod
+    def names():
+        return sorted(perf.__registry.keys())
+
+    @staticmethod
+    def clear():
+        perf.__registry.clear()
+
+    @staticmethod
+    def summary(name):
+        stats = perf.__registry[name][0]
+        data = stats.data if stats.data.valid else stats.current
+        result = {
+            'samples': data.samples,
+            'mean': data.mean,
+            'sd': None if data.samples == 0 else data.sd,
+            'minimum': data.minimum,
+            'maximum': data.maximum
+        }
+        if data.sub_bits > 0:
+            for p in (50, 90, 99):
+                result['p{}'.format(p)] = data.percentile(p)
+        return result
+
+    @staticmethod
+    def report():
+        for name in perf.names():
+            summary = perf.summary(name)
+            if summary['samples'] == 0:
+                print('{}: no samples'.format(name))
+                continue
+            fields = ['{}: {} samples, mean = {:.1f} us (+/- {:.1f} us), min = {} us, max = {} us'.format(
+                name, summary['samples'], summary['mean'], summary['sd'], summary['minimum'], summary['maximum']
+            )]
+            for key in ('p50', 'p90', 'p99'):
+                if key in summary:
+                    fields.append('{} = {} us'.format(key, summary[key]))
+            print(', '.join(fields))
+
 
 if __name__ == '__main__':
     import random
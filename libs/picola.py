@@ -1,13 +1,30 @@
+import array
+import math
+
 
 class Vector:
-    def __init__(self, data=None):
-        self.__data = data
+    def __init__(self, data=None, typecode=None):
+        self.__typecode = typecode
+        self.__data = data if (typecode is None) else array.array(typecode, [] if data is None else data)
         
     def __len__(self):
         return len(self.__data)
         
     def __str__(self):
-        return '{}'.format(self.__data)
+        return '{}'.format(list(self.__data) if self.__typecode is not None else self.__data)
+
+    @property
+    def typecode(self):
+        return self.__typecode
+
+    @property
+    def data(self):
+        return self.__data
+
+    def memoryview(self):
+        if self.__typecode is None:
+            raise Exception('List backed vectors do not support memoryview (construct with a typecode)')
+        return memoryview(self.__data)
 
     def append(self, value):
         return self.__data.append(value)
@@ -29,7 +46,7 @@ class Vector:
 
     @micropython.native        
     def __neg__(self):
-        v = self.__class__([-d for d in self.__data])
+        v = self.__class__([-d for d in self.__data], typecode=self.__typecode)
         return v
 
     @micropython.native
@@ -38,19 +55,24 @@ class Vector:
             len_self, len_other = len(self), len(other)
             if not (len_self == len_other):
                 raise Exception('Invalid vector sizes for addition {} and {}'.format(len_self, len_other))                
-            v = self.__class__([(s+o) for s, o in zip(self.__data, other.__data)])
+            v = self.__class__([(s+o) for s, o in zip(self.__data, other.__data)], typecode=self.__typecode)
             return v
     
     @micropython.native
     def __mul__(self, other):
         v = None
+        typecode = self.__typecode
         if isinstance(other, Vector):
-            v = Matrix()
+            if (typecode == 'i') and (other.__typecode in ('f', 'd')):
+                typecode = 'f'  # Integer storage cannot hold the products, as in Matrix.scale
+            v = Matrix(typecode=typecode)
             for scalar in self.__data:
                 row_data = [(scalar * d) for d in other.__data]
                 v.append_row(*row_data)
         else:
-            v = self.__class__(data=[other*d for d in self.__data])
+            if (typecode == 'i') and isinstance(other, float):
+                typecode = 'f'
+            v = self.__class__(data=[other*d for d in self.__data], typecode=typecode)
         return v
 
     @micropython.native
@@ -67,74 +89,109 @@ class Matrix:
         def __init__(self, obj):           
             self.__obj = obj
             self.__row = 0
+            self.__rows = obj.shape[0]
             
         def __next__(self):
             row = self.__row
-            if row < self.__obj.__shape[0]:
+            if row < self.__rows:
                 self.__row += 1
                 return self.__obj[row]
             raise StopIteration
 
+    # Element access for one row; the proxy resolves the row through the matrix
+    # offset and strides once, so it works the same on views
     class AccessProxy:
         def __init__(self, obj, row):
             self.__obj = obj
-            self.__row = row
+            self.__data = obj.data
+            self.__base = obj.offset + row * obj.row_stride
+            self.__stride = obj.column_stride
+            self.__columns = obj.shape[1]
         
         @property
         def dims(self):
-            return self.__obj.__dims
+            return self.__obj.dims
         
         @property
         def shape(self):
-            return self.__obj.__shape
+            return self.__obj.shape
         
         def __str__(self):
-            row = self.__row
-            rows, columns = self.__obj.__shape
-            values = ['{}'.format(v) for v in self.__obj.__data[row*columns:(row+1)*columns]]
+            values = ['{}'.format(v) for v in self]
             return '[{}]\n'.format(',\t'.join(values))
         
         @micropython.native
         def __iter__(self):
-            return Matrix.ColumnIterator(self.__obj, self.__row)
+            return Matrix.ColumnIterator(self.__data, self.__base, self.__stride, self.__columns)
     
         @micropython.native        
         def __getitem__(self, column):
-            rows, columns = self.__obj.shape
-            idx = self.__row * columns + column    
-            return self.__obj.__data[idx]
+            if not ((0 <= column) and (column < self.__columns)):
+                raise IndexError('Matrix column index out of range')
+            return self.__data[self.__base + column * self.__stride]
         
         @micropython.native        
         def __setitem__(self, column, value):
-            rows, columns = self.__obj.shape
-            idx = self.__row * columns + column    
-            self.__obj.__data[idx] = value      
+            if not ((0 <= column) and (column < self.__columns)):
+                raise IndexError('Matrix column index out of range')
+            self.__data[self.__base + column * self.__stride] = value      
 
     class ColumnIterator:
-        def __init__(self, obj, row):
-            self.__obj = obj
+        def __init__(self, data, base, stride, columns):
+            self.__data = data
+            self.__base = base
+            self.__stride = stride
             self.__column = 0
-            columns = self.__obj.__shape[1]
             self.__columns = columns
-            self.__base = row * columns
-            self.__data = self.__obj.__data
 
         @micropython.native
         def __next__(self):
             column = self.__column
-            rows, columns = self.__obj.__shape
-            if column < columns:
-                self.__column += 1
-                idx = self.__base + column
-                return self.__data[idx] #Matrix.ValueDescriptor(self.__data, idx)
+            if column < self.__columns:
+                self.__column = column + 1
+                return self.__data[self.__base + column * self.__stride]
             raise StopIteration
         
-    def __init__(self, data=None, dims=2):
+    # Storage is a plain list by default; with a typecode ('f', 'd' or 'i') the
+    # data is a flat row-major array instead, which costs one machine word (or
+    # less) per element, supports the buffer protocol and can be handed to
+    # native/viper code as is.
+    @staticmethod
+    def __storage(values, typecode):
+        if typecode is None:
+            return list(values)
+        return array.array(typecode, values)
+
+    # Element (row, column) lives at data[offset + row * row_stride + column *
+    # column_stride]. A matrix built from values owns a dense buffer (offset 0,
+    # row_stride equal to the column count, column_stride 1); the views returned
+    # by row(), column(), block() and T share the buffer of the matrix they were
+    # taken from and only carry their own offset and strides, so taking one
+    # copies no data and writes through a view land in its parent. A buffer
+    # (a list, or an array of the given typecode) with a shape is wrapped as a
+    # dense matrix without copying or allocating storage.
+    def __init__(self, data=None, dims=2, typecode=None, buffer=None, shape=None):
         self.__dims = dims
-        self.__shape = None
-        self.__data = []
+        self.__shape = shape
+        self.__typecode = typecode
+        self.__data = Matrix.__storage((), typecode) if buffer is None else buffer
+        self.__offset = 0
+        self.__row_stride = 0 if shape is None else shape[1]
+        self.__column_stride = 1
+        self.__view = False
         if data is not None:
             self.__from_data(data)
+
+    @classmethod
+    def zeros(cls, rows, columns, typecode=None):
+        return cls(typecode=typecode, buffer=Matrix.__storage([0] * (rows * columns), typecode), shape=(rows, columns))
+
+    @classmethod
+    def identity(cls, size, typecode=None):
+        m = cls.zeros(size, size, typecode)
+        for idx in range(size):
+            m.__data[idx * (size + 1)] = 1
+        return m
             
     @property
     def dims(self):
@@ -143,18 +200,99 @@ class Matrix:
     @property
     def shape(self):
         return self.__shape
+
+    @property
+    def typecode(self):
+        return self.__typecode
     
+    # The whole underlying buffer, which for a view is shared with its parent
     @property
     def data(self):
         return self.__data
+
+    @property
+    def offset(self):
+        return self.__offset
+
+    @property
+    def row_stride(self):
+        return self.__row_stride
+
+    @property
+    def column_stride(self):
+        return self.__column_stride
+
+    @property
+    def is_view(self):
+        return self.__view
+
+    # True when the elements are packed row after row from offset on, so a
+    # single flat loop (or a memoryview slice) covers them
+    @property
+    def contiguous(self):
+        rows, columns = self.__shape
+        return ((columns == 1) or (self.__column_stride == 1)) and ((rows == 1) or (self.__row_stride == columns))
+
+    def memoryview(self):
+        if self.__typecode is None:
+            raise Exception('List backed matrices do not support memoryview (construct with a typecode)')
+        if not self.__view:
+            return memoryview(self.__data)
+        if not self.contiguous:
+            raise Exception('Only contiguous views support memoryview (copy() the view first)')
+        rows, columns = self.__shape
+        return memoryview(self.__data)[self.__offset:self.__offset + rows * columns]
+
+    # Copies into a new dense matrix, or into out (any typecode)
+    def copy(self, out=None):
+        if (out is None) and not self.__view:
+            return self.__class__(dims=self.__dims, typecode=self.__typecode, buffer=Matrix.__storage(self.__data, self.__typecode), shape=self.__shape)
+        rows, columns = self.__shape
+        m = self.__output(out, rows, columns)
+        Matrix.__copy_into(self.__data, self.__offset, self.__row_stride, self.__column_stride, m.__data, m.__offset, m.__row_stride, m.__column_stride, rows, columns)
+        return m
+
+    @micropython.native
+    def row(self, idx):
+        rows, columns = self.__shape
+        if not ((0 <= idx) and (idx < rows)):
+            raise IndexError('Matrix row index out of range')
+        return self.__view_of(self.__offset + idx * self.__row_stride, 1, columns, self.__row_stride, self.__column_stride)
+
+    @micropython.native
+    def column(self, idx):
+        rows, columns = self.__shape
+        if not ((0 <= idx) and (idx < columns)):
+            raise IndexError('Matrix column index out of range')
+        return self.__view_of(self.__offset + idx * self.__column_stride, rows, 1, self.__row_stride, self.__column_stride)
+
+    @micropython.native
+    def block(self, row, column, rows, columns):
+        shape_rows, shape_columns = self.__shape
+        if not ((0 <= row) and (0 <= column) and (0 < rows) and (0 < columns) and (row + rows <= shape_rows) and (column + columns <= shape_columns)):
+            raise Exception('Block at ({}, {}) of size ({}, {}) does not fit a {} matrix'.format(row, column, rows, columns, self.__shape))
+        offset = self.__offset + row * self.__row_stride + column * self.__column_stride
+        return self.__view_of(offset, rows, columns, self.__row_stride, self.__column_stride)
+
+    # Lazy transpose: a view with the strides swapped (transpose() makes a copy)
+    @property
+    def T(self):
+        rows, columns = self.__shape
+        return self.__view_of(self.__offset, columns, rows, self.__column_stride, self.__row_stride)
+
+    def __view_of(self, offset, rows, columns, row_stride, column_stride):
+        m = self.__class__(dims=self.__dims, typecode=self.__typecode, buffer=self.__data, shape=(rows, columns))
+        m.__offset = offset
+        m.__row_stride = row_stride
+        m.__column_stride = column_stride
+        m.__view = True
+        return m
     
     @micropython.native
     def __str__(self):
         text = ''
-        rows, columns = self.shape
-        for row in range(rows):
-            values = ['{}'.format(v) for v in self.__data[row*columns:(row+1)*columns]]
-            text += '[{}]\n'.format(',\t'.join(values))
+        for row in self:
+            text += str(row)
         return text
 
     @micropython.native
@@ -163,10 +301,14 @@ class Matrix:
 
     @micropython.native        
     def __getitem__(self, row):
+        if not ((0 <= row) and (row < self.__shape[0])):
+            raise IndexError('Matrix row index out of range')
         return Matrix.AccessProxy(self, row)
 
     @micropython.native        
     def append_row(self, *row_data):
+        if self.__view:
+            raise Exception('Rows cannot be appended to a matrix view')
         shape = self.__shape
         if shape is None:
             shape = (1, len(row_data))
@@ -177,69 +319,319 @@ class Matrix:
             shape = (rows + 1, columns)
         self.__data.extend(row_data)            
         self.__shape = shape
+        self.__row_stride = shape[1]
 
+    # Operations take an optional out matrix of the result shape (any typecode
+    # that can hold the values) and write into it instead of allocating; this
+    # is what the in-place operators use, so steady-state loops can run without
+    # touching the heap. Operands and out may be views; when all of them are
+    # contiguous the kernels run as one flat loop, otherwise they follow the
+    # strides. An element-wise out may be an operand, but not a view that
+    # partially overlaps one.
     @micropython.native
-    def transpose(self):
-        m = self.__class__()
+    def transpose(self, out=None):
         rows, columns = self.__shape
-        for row in range(columns):
-            row_data = [self.__data[(c*columns) + row] for c in range(rows)]
-            m.append_row(*row_data)
+        m = self.__output(out, columns, rows)
+        if m.__data is self.__data:
+            raise Exception('Matrix cannot be transposed into its own storage')
+        Matrix.__copy_into(self.__data, self.__offset, self.__column_stride, self.__row_stride, m.__data, m.__offset, m.__row_stride, m.__column_stride, columns, rows)
         return m
 
     @micropython.native
-    def __neg__(self):
-        m = self.__class__()
-        m.__data = [-d for d in self.__data]
-        m.__shape = self.__shape
-        m.__dims = self.__dims
+    def add(self, other, out=None):
+        self.__check_shape(other, 'addition')
+        rows, columns = self.__shape
+        m = self.__output(out, rows, columns)
+        if self.__flat(other, m):
+            Matrix.__add_into(self.__data, self.__offset, 0, 1, other.__data, other.__offset, 0, 1, m.__data, m.__offset, 0, 1, 1, rows * columns)
+        else:
+            Matrix.__add_into(self.__data, self.__offset, self.__row_stride, self.__column_stride, other.__data, other.__offset, other.__row_stride, other.__column_stride, m.__data, m.__offset, m.__row_stride, m.__column_stride, rows, columns)
         return m
 
     @micropython.native
-    def __neg__(self):
-        m = self.__class__()
-        m.__data = [-d for d in self.__data]
-        m.__shape = self.__shape
-        m.__dims = self.__dims
+    def sub(self, other, out=None):
+        self.__check_shape(other, 'subtraction')
+        rows, columns = self.__shape
+        m = self.__output(out, rows, columns)
+        if self.__flat(other, m):
+            Matrix.__sub_into(self.__data, self.__offset, 0, 1, other.__data, other.__offset, 0, 1, m.__data, m.__offset, 0, 1, 1, rows * columns)
+        else:
+            Matrix.__sub_into(self.__data, self.__offset, self.__row_stride, self.__column_stride, other.__data, other.__offset, other.__row_stride, other.__column_stride, m.__data, m.__offset, m.__row_stride, m.__column_stride, rows, columns)
+        return m
+
+    # A float factor on integer storage promotes a new result to array('f');
+    # an integer out cannot hold it
+    @micropython.native
+    def scale(self, k, out=None):
+        rows, columns = self.__shape
+        if isinstance(k, float):
+            if out is None:
+                if self.__typecode == 'i':
+                    out = self.__class__.zeros(rows, columns, 'f')
+            elif out.__typecode == 'i':
+                raise Exception('Integer output matrix cannot hold a matrix scaled by a float')
+        m = self.__output(out, rows, columns)
+        if self.__flat(self, m):
+            Matrix.__scale_into(self.__data, self.__offset, 0, 1, k, m.__data, m.__offset, 0, 1, 1, rows * columns)
+        else:
+            Matrix.__scale_into(self.__data, self.__offset, self.__row_stride, self.__column_stride, k, m.__data, m.__offset, m.__row_stride, m.__column_stride, rows, columns)
         return m
 
+    @micropython.native
+    def matmul(self, other, out=None):
+        rows, src_columns = self.__shape
+        other_rows, columns = other.__shape
+        if not (src_columns == other_rows):
+            raise Exception('Invalid matrix sizes for multiplication {} and {}'.format(self.__shape, other.__shape))
+        m = self.__output(out, rows, columns)
+        if (m.__data is self.__data) or (m.__data is other.__data):
+            raise Exception('Matrix product cannot be written into the storage of one of its operands')
+        if self.__packed() and other.__packed() and m.__packed():
+            Matrix.__matmul(self.__data, other.__data, m.__data, rows, src_columns, columns)
+        else:
+            Matrix.__matmul_strided(self.__data, self.__offset, self.__row_stride, self.__column_stride, other.__data, other.__offset, other.__row_stride, other.__column_stride, m.__data, m.__offset, m.__row_stride, m.__column_stride, rows, src_columns, columns)
+        return m
+
+    @micropython.native
+    def __neg__(self):
+        return self.scale(-1)
+
     @micropython.native
     def __add__(self, other):
         if isinstance(other, Matrix):
-            if not (self.__shape == other.__shape):
-                raise Exception('Invalid matrix sizes for addition {} and {}'.format(self.__shape, other.__shape))
-
-            m = self.__class__()
-            m.__data = [(s+o) for s, o in zip(self.__data, other.__data)]
-            m.__shape = self.__shape
-            m.__dims = self.__dims
-            return m
+            return self.add(other)
 
     @micropython.native
     def __sub__(self, other):
         if isinstance(other, Matrix):
-            if not (self.__shape == other.__shape):
-                raise Exception('Invalid matrix sizes for other {} and {}'.format(self.__shape, other.__shape))
-
-            return self.__add__(-other)
+            return self.sub(other)
 
     @micropython.native
     def __mul__(self, other):
         if isinstance(other, Matrix):
-            if not (self.__shape[1] == other.__shape[0]):
-                raise Exception('Invalid matrix sizes for multiplication {} and {}'.format(self.__shape, other.__shape))
-            m = self.__class__()
-            (rows, src_columns), columns = self.__shape, other.__shape[1]
-            for row in range(rows):
-                row_data = []
-                for column in range(columns):
-                    dot = 0
-                    for src_column in range(src_columns):
-                        dot += (self[row][src_column] * other[src_column][column])
-                    row_data.append(dot)
-                m.append_row(*row_data)
-            return m
+            return self.matmul(other)
+        if isinstance(other, (int, float)):
+            return self.scale(other)
         return None
+
+    @micropython.native
+    def __rmul__(self, other):
+        if isinstance(other, (int, float)):
+            return self.scale(other)
+        return None
+
+    @micropython.native
+    def __iadd__(self, other):
+        return self.add(other, self)
+
+    @micropython.native
+    def __isub__(self, other):
+        return self.sub(other, self)
+
+    @micropython.native
+    def __imul__(self, other):
+        if isinstance(other, Matrix):
+            return self.matmul(other)  # A product cannot be formed in place
+        if isinstance(other, float) and (self.__typecode == 'i'):
+            return self.scale(other)  # Nor can integer storage hold a float result
+        return self.scale(other, self)
+
+    @micropython.native
+    def __check_shape(self, other, operation):
+        if not (self.__shape == other.__shape):
+            raise Exception('Invalid matrix sizes for {} {} and {}'.format(operation, self.__shape, other.__shape))
+
+    @micropython.native
+    def __output(self, out, rows, columns):
+        if out is None:
+            return self.__class__.zeros(rows, columns, self.__typecode)
+        out_rows, out_columns = out.__shape
+        if not ((out_rows == rows) and (out_columns == columns)):
+            raise Exception('Invalid output matrix size {} for a ({}, {}) result'.format(out.__shape, rows, columns))
+        return out
+
+    @micropython.native
+    def __flat(self, other, out):
+        return self.contiguous and other.contiguous and out.contiguous
+
+    # Dense row-major layout starting at the beginning of the buffer, which is
+    # what the unrolled product kernels index
+    @micropython.native
+    def __packed(self):
+        return (self.__offset == 0) and self.contiguous
+
+    @staticmethod
+    @micropython.native
+    def __copy_into(a, a_base, a_row_stride, a_column_stride, c, c_base, c_row_stride, c_column_stride, rows, columns):
+        for row in range(rows):
+            a_idx = a_base
+            c_idx = c_base
+            for column in range(columns):
+                c[c_idx] = a[a_idx]
+                a_idx += a_column_stride
+                c_idx += c_column_stride
+            a_base += a_row_stride
+            c_base += c_row_stride
+
+    @staticmethod
+    @micropython.native
+    def __add_into(a, a_base, a_row_stride, a_column_stride, b, b_base, b_row_stride, b_column_stride, c, c_base, c_row_stride, c_column_stride, rows, columns):
+        for row in range(rows):
+            a_idx = a_base
+            b_idx = b_base
+            c_idx = c_base
+            for column in range(columns):
+                c[c_idx] = a[a_idx] + b[b_idx]
+                a_idx += a_column_stride
+                b_idx += b_column_stride
+                c_idx += c_column_stride
+            a_base += a_row_stride
+            b_base += b_row_stride
+            c_base += c_row_stride
+
+    @staticmethod
+    @micropython.native
+    def __sub_into(a, a_base, a_row_stride, a_column_stride, b, b_base, b_row_stride, b_column_stride, c, c_base, c_row_stride, c_column_stride, rows, columns):
+        for row in range(rows):
+            a_idx = a_base
+            b_idx = b_base
+            c_idx = c_base
+            for column in range(columns):
+                c[c_idx] = a[a_idx] - b[b_idx]
+                a_idx += a_column_stride
+                b_idx += b_column_stride
+                c_idx += c_column_stride
+            a_base += a_row_stride
+            b_base += b_row_stride
+            c_base += c_row_stride
+
+    @staticmethod
+    @micropython.native
+    def __scale_into(a, a_base, a_row_stride, a_column_stride, k, c, c_base, c_row_stride, c_column_stride, rows, columns):
+        for row in range(rows):
+            a_idx = a_base
+            c_idx = c_base
+            for column in range(columns):
+                c[c_idx] = k * a[a_idx]
+                a_idx += a_column_stride
+                c_idx += c_column_stride
+            a_base += a_row_stride
+            c_base += c_row_stride
+
+    # Row-major product c = a * b over flat buffers; small square products use
+    # unrolled kernels, everything else walks the buffers with precomputed strides
+    @staticmethod
+    @micropython.native
+    def __matmul(a, b, c, rows, src_columns, columns):
+        if (rows == src_columns) and (src_columns == columns):
+            if rows == 2:
+                Matrix.__matmul2(a, b, c)
+                return
+            if rows == 3:
+                Matrix.__matmul3(a, b, c)
+                return
+            if rows == 4:
+                Matrix.__matmul4(a, b, c)
+                return
+        Matrix.__matmul_strided(a, 0, src_columns, 1, b, 0, columns, 1, c, 0, columns, 1, rows, src_columns, columns)
+
+    @staticmethod
+    @micropython.native
+    def __matmul_strided(a, a_base, a_row_stride, a_column_stride, b, b_base, b_row_stride, b_column_stride, c, c_base, c_row_stride, c_column_stride, rows, src_columns, columns):
+        a_row = a_base
+        c_row = c_base
+        for row in range(rows):
+            b_column = b_base
+            c_idx = c_row
+            for column in range(columns):
+                a_idx = a_row
+                b_idx = b_column
+                dot = 0
+                for src_column in range(src_columns):
+                    dot += a[a_idx] * b[b_idx]
+                    a_idx += a_column_stride
+                    b_idx += b_row_stride
+                c[c_idx] = dot
+                b_column += b_column_stride
+                c_idx += c_column_stride
+            a_row += a_row_stride
+            c_row += c_row_stride
+
+    @staticmethod
+    @micropython.native
+    def __matmul2(a, b, c):
+        a0 = a[0]
+        a1 = a[1]
+        a2 = a[2]
+        a3 = a[3]
+        b0 = b[0]
+        b1 = b[1]
+        b2 = b[2]
+        b3 = b[3]
+        c[0] = a0 * b0 + a1 * b2
+        c[1] = a0 * b1 + a1 * b3
+        c[2] = a2 * b0 + a3 * b2
+        c[3] = a2 * b1 + a3 * b3
+
+    @staticmethod
+    @micropython.native
+    def __matmul3(a, b, c):
+        b0 = b[0]
+        b1 = b[1]
+        b2 = b[2]
+        b3 = b[3]
+        b4 = b[4]
+        b5 = b[5]
+        b6 = b[6]
+        b7 = b[7]
+        b8 = b[8]
+        a0 = a[0]
+        a1 = a[1]
+        a2 = a[2]
+        c[0] = a0 * b0 + a1 * b3 + a2 * b6
+        c[1] = a0 * b1 + a1 * b4 + a2 * b7
+        c[2] = a0 * b2 + a1 * b5 + a2 * b8
+        a0 = a[3]
+        a1 = a[4]
+        a2 = a[5]
+        c[3] = a0 * b0 + a1 * b3 + a2 * b6
+        c[4] = a0 * b1 + a1 * b4 + a2 * b7
+        c[5] = a0 * b2 + a1 * b5 + a2 * b8
+        a0 = a[6]
+        a1 = a[7]
+        a2 = a[8]
+        c[6] = a0 * b0 + a1 * b3 + a2 * b6
+        c[7] = a0 * b1 + a1 * b4 + a2 * b7
+        c[8] = a0 * b2 + a1 * b5 + a2 * b8
+
+    @staticmethod
+    @micropython.native
+    def __matmul4(a, b, c):
+        b0 = b[0]
+        b1 = b[1]
+        b2 = b[2]
+        b3 = b[3]
+        b4 = b[4]
+        b5 = b[5]
+        b6 = b[6]
+        b7 = b[7]
+        b8 = b[8]
+        b9 = b[9]
+        b10 = b[10]
+        b11 = b[11]
+        b12 = b[12]
+        b13 = b[13]
+        b14 = b[14]
+        b15 = b[15]
+        for base in range(0, 16, 4):
+            a0 = a[base]
+            a1 = a[base + 1]
+            a2 = a[base + 2]
+            a3 = a[base + 3]
+            c[base] = a0 * b0 + a1 * b4 + a2 * b8 + a3 * b12
+            c[base + 1] = a0 * b1 + a1 * b5 + a2 * b9 + a3 * b13
+            c[base + 2] = a0 * b2 + a1 * b6 + a2 * b10 + a3 * b14
+            c[base + 3] = a0 * b3 + a1 * b7 + a2 * b11 + a3 * b15
     
     @micropython.native
     def __from_data(self, data):
@@ -256,7 +648,270 @@ class Matrix:
                 shape[0] += 1
             self.__data.extend(d)
         self.__shape = tuple(shape)
+        self.__row_stride = shape[1]
         
+
+
+# Raised when a factorization meets a pivot at or below its tolerance
+class SingularMatrixError(Exception):
+    pass
+
+
+# Factorizations work on a dense copy of the matrix (or on the matrix itself
+# with overwrite=True) in its flat row-major storage, so factoring costs O(n**3)
+# once and every later solve() costs O(n**2) per right-hand side. Integer
+# matrices are factored in array('f') storage. A pivot at or below tol (by default a few
+# ulps of the largest element) is treated as singular.
+class Factorization:
+    def __init__(self, a, overwrite=False, tol=None):
+        rows, columns = a.shape
+        if not rows == columns:
+            raise Exception('Factorization requires a square matrix, not {}'.format(a.shape))
+        if overwrite and not (a.offset == 0 and a.contiguous):
+            raise Exception('Only a dense matrix can be factored in place, not a strided view')
+        if a.typecode == 'i':
+            if overwrite:
+                raise Exception('Integer matrices cannot be factored in place')
+            m = a.copy(Matrix.zeros(rows, columns, 'f'))
+        else:
+            m = a if overwrite else a.copy()
+        self.__matrix = m
+        self.__size = rows
+        self.__pivots = array.array('H', range(rows))
+        self.tol = Factorization.__default_tol(m, rows) if tol is None else tol
+
+    @property
+    def size(self):
+        return self.__size
+
+    @property
+    def matrix(self):
+        return self.__matrix
+
+    @property
+    def pivots(self):
+        return self.__pivots
+
+    # b is a Matrix with one column per right-hand side, or a Vector
+    def solve(self, b, out=None):
+        n = self.__size
+        pivots = self.__pivots
+        is_vector = isinstance(b, Vector)
+        columns = 1 if is_vector else b.shape[1]
+        if not (len(b) if is_vector else b.shape[0]) == n:
+            raise Exception('Invalid right-hand side size for a {0}x{0} system'.format(n))
+        if out is None:
+            typecode = self.__matrix.typecode
+            out = Vector([0] * n, typecode=typecode) if is_vector else Matrix.zeros(n, columns, typecode)
+        if out.data is b.data:
+            raise Exception('Solution cannot be written over the right-hand side')
+        src = b.data
+        x = out.data
+        b_offset, b_row_stride, b_column_stride = Factorization.__layout(b)
+        x_offset, x_row_stride, x_column_stride = Factorization.__layout(out)
+        for row in range(n):
+            src_idx = b_offset + pivots[row] * b_row_stride
+            idx = x_offset + row * x_row_stride
+            for column in range(columns):
+                x[idx] = src[src_idx]
+                src_idx += b_column_stride
+                idx += x_column_stride
+        for column in range(columns):
+            self._substitute(x, x_offset + column * x_column_stride, x_row_stride)
+        return out
+
+    def inv(self, out=None):
+        return self.solve(Matrix.identity(self.__size, self.__matrix.typecode), out)
+
+    # Offset, row stride and column stride of a right-hand side or solution;
+    # a Vector is laid out as a single column
+    @staticmethod
+    def __layout(m):
+        if isinstance(m, Vector):
+            return 0, 1, 1
+        return m.offset, m.row_stride, m.column_stride
+
+    # Only the n * n elements of the matrix count, not the rest of a buffer it
+    # shares (overwrite=True accepts a dense block at the start of a taller one)
+    @staticmethod
+    def __default_tol(m, n):
+        eps = 2.3e-16 if m.typecode == 'd' else 1.2e-7
+        data = m.data
+        offset = m.offset
+        largest = 0
+        for idx in range(offset, offset + n * n):
+            value = abs(data[idx])
+            if value > largest:
+                largest = value
+        return n * eps * largest
+
+
+# LU decomposition with partial pivoting, P * A = L * U, with the unit lower
+# triangle of L and all of U packed into the factored matrix
+class LU(Factorization):
+    def __init__(self, a, overwrite=False, tol=None):
+        Factorization.__init__(self, a, overwrite, tol)
+        self.__sign = 1
+        self.__factor()
+
+    def det(self):
+        d = self.matrix.data
+        n = self.size
+        result = self.__sign
+        for idx in range(n):
+            result *= d[idx * (n + 1)]
+        return result
+
+    @micropython.native
+    def __factor(self):
+        d = self.matrix.data
+        n = self.size
+        pivots = self.pivots
+        tol = self.tol
+        sign = 1
+        for k in range(n):
+            pivot_row = k
+            best = abs(d[k * n + k])
+            for row in range(k + 1, n):
+                value = abs(d[row * n + k])
+                if value > best:
+                    best = value
+                    pivot_row = row
+            if best <= tol:
+                raise SingularMatrixError('Matrix is singular')
+            k_base = k * n
+            if not pivot_row == k:
+                p_base = pivot_row * n
+                for column in range(n):
+                    value = d[k_base + column]
+                    d[k_base + column] = d[p_base + column]
+                    d[p_base + column] = value
+                value = pivots[k]
+                pivots[k] = pivots[pivot_row]
+                pivots[pivot_row] = value
+                sign = -sign
+            pivot = d[k_base + k]
+            for row in range(k + 1, n):
+                base = row * n
+                factor = d[base + k] / pivot
+                d[base + k] = factor
+                if not factor == 0:
+                    for column in range(k + 1, n):
+                        d[base + column] -= factor * d[k_base + column]
+        self.__sign = sign
+
+    # Forward and back substitution on one column of x (element row at
+    # x[start + row * stride]), which holds the permuted right-hand side on entry
+    @micropython.native
+    def _substitute(self, x, start, stride):
+        d = self.matrix.data
+        n = self.size
+        for row in range(n):
+            value = x[start + row * stride]
+            base = row * n
+            for k in range(row):
+                value -= d[base + k] * x[start + k * stride]
+            x[start + row * stride] = value
+        for row in range(n - 1, -1, -1):
+            value = x[start + row * stride]
+            base = row * n
+            for k in range(row + 1, n):
+                value -= d[base + k] * x[start + k * stride]
+            x[start + row * stride] = value / d[base + row]
+
+
+# Cholesky decomposition A = L * L.T of a symmetric positive definite matrix;
+# only the lower triangle of A is read and L replaces it (the strict upper
+# triangle is cleared). Roughly half the work of LU and no pivoting.
+class Cholesky(Factorization):
+    def __init__(self, a, overwrite=False, tol=None):
+        Factorization.__init__(self, a, overwrite, tol)
+        self.__factor()
+
+    def det(self):
+        d = self.matrix.data
+        n = self.size
+        result = 1
+        for idx in range(n):
+            result *= d[idx * (n + 1)]
+        return result * result
+
+    @micropython.native
+    def __factor(self):
+        d = self.matrix.data
+        n = self.size
+        tol = self.tol
+        for j in range(n):
+            j_base = j * n
+            value = d[j_base + j]
+            for k in range(j):
+                value -= d[j_base + k] * d[j_base + k]
+            if value <= tol:
+                raise Exception('Matrix is not positive definite')
+            l_jj = math.sqrt(value)
+            d[j_base + j] = l_jj
+            for row in range(j + 1, n):
+                base = row * n
+                value = d[base + j]
+                for k in range(j):
+                    value -= d[base + k] * d[j_base + k]
+                d[base + j] = value / l_jj
+                d[j_base + row] = 0
+
+    @micropython.native
+    def _substitute(self, x, start, stride):
+        d = self.matrix.data
+        n = self.size
+        for row in range(n):
+            value = x[start + row * stride]
+            base = row * n
+            for k in range(row):
+                value -= d[base + k] * x[start + k * stride]
+            x[start + row * stride] = value / d[base + row]
+        for row in range(n - 1, -1, -1):
+            value = x[start + row * stride]
+            for k in range(row + 1, n):
+                value -= d[k * n + row] * x[start + k * stride]
+            x[start + row * stride] = value / d[row * (n + 1)]
+
+
+def solve(a, b):
+    return LU(a).solve(b)
+
+
+def inv(a, out=None):
+    return LU(a).inv(out)
+
+
+def det(a):
+    rows, columns = a.shape
+    if not rows == columns:
+        raise Exception('Determinant requires a square matrix, not {}'.format(a.shape))
+    try:
+        return LU(a, tol=0).det()
+    except SingularMatrixError:
+        return 0  # An exactly zero pivot
+
+
+def add(a, b, out=None):
+    return a.add(b, out)
+
+
+def sub(a, b, out=None):
+    return a.sub(b, out)
+
+
+def scale(a, k, out=None):
+    return a.scale(k, out)
+
+
+def matmul(a, b, out=None):
+    return a.matmul(b, out)
+
+
+def transpose(a, out=None):
+    return a.transpose(out)
+
        
 if __name__ == '__main__':
     test_data = [ [1, 2, 3], [4, 5, 6], [7, 8, 9]]
@@ -0,0 +1,218 @@
+import array
+import time
+
+import timestamp
+
+
+# Cooperative deadline scheduler for periodic and one-shot callbacks. Deadlines
+# live in a preallocated binary min-heap ordered by wrap-aware tick differences,
+# so run_pending() only looks at the earliest deadline instead of polling every
+# component. Callbacks take no arguments (bound methods such as btn.update work
+# directly) and run from run_pending(), never from an interrupt.
+#
+# Cancelled tasks are removed lazily when they reach the top of the heap.
+class Scheduler:
+    Free = const(0)
+    Active = const(1)
+    Cancelled = const(2)
+
+    def __init__(self, capacity=32, skip_missed=True):
+        assert 0 < capacity < 65536, 'Error: Scheduler capacity must be between 1 and 65535 tasks'
+        self.__capacity = capacity
+        self.__skip_missed = skip_missed
+        self.__deadlines = array.array('I', [0] * capacity)
+        self.__periods = array.array('I', [0] * capacity)
+        self.__states = array.array('B', [0] * capacity)
+        self.__callbacks = [None] * capacity
+        self.__heap = array.array('H', [0] * capacity)
+        self.__free = array.array('H', range(capacity - 1, -1, -1))
+        self.__heap_size = 0
+        self.__free_size = capacity
+        self.__active = 0
+        self.__running = False
+        self.runs = 0
+
+    def __len__(self):
+        return self.__active
+
+    @property
+    def capacity(self):
+        return self.__capacity
+
+    def every(self, period_us, callback, t=None):
+        assert period_us > 0, 'Error: Non-positive period is invalid'
+        assert period_us < timestamp.ticks_mask // 2, 'Error: Period of {} us exceeds half the tick range'.format(period_us)
+        return self.__add(period_us, period_us, callback, t)
+
+    def after(self, delay_us, callback, t=None):
+        assert delay_us < timestamp.ticks_mask // 2, 'Error: Delay of {} us exceeds half the tick range'.format(delay_us)
+        return self.__add(delay_us, 0, callback, t)
+
+    def cancel(self, handle):
+        if self.__states[handle] == self.Active:
+            self.__states[handle] = self.Cancelled
+            self.__callbacks[handle] = None
+            self.__active -= 1
+            return True
+        return False
+
+    def clear(self):
+        for handle in range(self.__capacity):
+            self.cancel(handle)
+
+    def deadline(self, handle):
+        return self.__deadlines[handle] if self.__states[handle] == self.Active else None
+
+    # Microseconds until the earliest deadline (0 when one is due), or None
+    # when nothing is scheduled
+    @micropython.native
+    def next_deadline_us(self, t=None):
+        self.__discard_cancelled()
+        if self.__heap_size == 0:
+            return None
+        t = timestamp.now() if t is None else t
+        delta = timestamp.signed_diff(self.__deadlines[self.__heap[0]], t)
+        return delta if delta > 0 else 0
+
+    @micropython.native
+    def run_pending(self, t=None):
+        t = timestamp.now() if t is None else t
+        deadlines = self.__deadlines
+        periods = self.__periods
+        states = self.__states
+        heap = self.__heap
+        runs = 0
+        try:
+            while self.__heap_size > 0:
+                handle = heap[0]
+                if not states[handle] == self.Active:
+                    self.__pop()
+                    self.__release(handle)
+                    continue
+                deadline = deadlines[handle]
+                late = timestamp.signed_diff(t, deadline)
+                if late < 0:
+                    break
+                self.__pop()
+                try:
+                    self.__callbacks[handle]()
+                finally:
+                    # A raising callback must not leak its slot: it is still rescheduled or released
+                    runs += 1
+                    self.__reschedule(handle, deadline, late)
+        finally:
+            self.runs += runs
+        return runs
+
+    @micropython.native
+    def __reschedule(self, handle, deadline, late):
+        states = self.__states
+        period = self.__periods[handle]
+        if (period == 0) or not (states[handle] == self.Active):
+            if states[handle] == self.Active:
+                self.__active -= 1
+            self.__release(handle)
+            return
+        # Periodic tasks keep their phase; missed periods are skipped rather than run back to back
+        steps = (late // period + 1) if self.__skip_missed else 1
+        self.__deadlines[handle] = timestamp.advance(deadline, steps * period)
+        self.__push(handle)
+
+    def stop(self):
+        self.__running = False
+
+    # Runs callbacks as they fall due until stop() is called; between deadlines
+    # it calls idle(wait_us) if given, otherwise it sleeps
+    def run(self, idle=None):
+        self.__running = True
+        while self.__running:
+            self.run_pending()
+            wait_us = self.next_deadline_us()
+            if wait_us is None:
+                wait_us = 1000
+            if idle is not None:
+                idle(wait_us)
+            elif wait_us > 0:
+                time.sleep_us(wait_us)
+
+    def __add(self, delay_us, period_us, callback, t):
+        if self.__free_size == 0:
+            self.__compact()
+        assert self.__free_size > 0, 'Error: Scheduler is full ({} tasks)'.format(self.__capacity)
+        self.__free_size -= 1
+        handle = self.__free[self.__free_size]
+        t = timestamp.now() if t is None else t
+        self.__deadlines[handle] = timestamp.advance(t, int(delay_us))
+        self.__periods[handle] = int(period_us)
+        self.__states[handle] = self.Active
+        self.__callbacks[handle] = callback
+        self.__active += 1
+        self.__push(handle)
+        return handle
+
+    def __release(self, handle):
+        self.__states[handle] = self.Free
+        self.__callbacks[handle] = None
+        self.__free[self.__free_size] = handle
+        self.__free_size += 1
+
+    # Releases every cancelled task still in the heap and rebuilds it in place
+    def __compact(self):
+        heap = self.__heap
+        states = self.__states
+        size = 0
+        for idx in range(self.__heap_size):
+            handle = heap[idx]
+            if states[handle] == self.Active:
+                heap[size] = handle
+                size += 1
+            else:
+                self.__release(handle)
+        self.__heap_size = 0
+        for idx in range(size):
+            self.__push(heap[idx])
+
+    @micropython.native
+    def __discard_cancelled(self):
+        while (self.__heap_size > 0) and not (self.__states[self.__heap[0]] == self.Active):
+            handle = self.__heap[0]
+            self.__pop()
+            self.__release(handle)
+
+    @micropython.native
+    def __push(self, handle):
+        heap = self.__heap
+        deadlines = self.__deadlines
+        deadline = deadlines[handle]
+        idx = self.__heap_size
+        self.__heap_size = idx + 1
+        while idx > 0:
+            parent = (idx - 1) >> 1
+            if timestamp.signed_diff(deadline, deadlines[heap[parent]]) >= 0:
+                break
+            heap[idx] = heap[parent]
+            idx = parent
+        heap[idx] = handle
+
+    @micropython.native
+    def __pop(self):
+        heap = self.__heap
+        deadlines = self.__deadlines
+        size = self.__heap_size - 1
+        self.__heap_size = size
+        if size == 0:
+            return
+        handle = heap[size]
+        deadline = deadlines[handle]
+        idx = 0
+        while True:
+            child = 2 * idx + 1
+            if child >= size:
+                break
+            if ((child + 1) < size) and (timestamp.signed_diff(deadlines[heap[child + 1]], deadlines[heap[child]]) < 0):
+                child += 1
+            if timestamp.signed_diff(deadlines[heap[child]], deadline) >= 0:
+                break
+            heap[idx] = heap[child]
+            idx = child
+        heap[idx] = handle
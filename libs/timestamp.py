@@ -8,11 +8,23 @@ def __get_ticks_mask():
         bits += 1
     return (2**bits - 1)
 __ticks_mask = __get_ticks_mask()
+ticks_mask = __ticks_mask
 
 
 @micropython.viper
 def diff(t1: uint, t0: uint) -> uint:
-    return (t1 - t0) if (t1 > t0) else (uint(__ticks_mask) - t1 + t0)
+    return (t1 - t0) & uint(__ticks_mask)
+
+
+# Signed difference for ordering timestamps that may lie either side of each
+# other; valid while they are less than half the tick range apart
+@micropython.viper
+def signed_diff(t1: uint, t0: uint) -> int:
+    delta = int((t1 - t0) & uint(__ticks_mask))
+    if delta > (int(__ticks_mask) >> 1):
+        delta -= int(__ticks_mask) + 1
+    return delta
+
 
 @micropython.viper
 def advance(t: uint, delta: uint) -> uint:
@@ -26,7 +38,7 @@ def now() -> uint:
 
 @micropython.viper
 def expired_at(t_base: uint, us: uint, t: uint) -> bool:
-    return ((t - t_base) if (t > t_base) else (uint(__ticks_mask) - t + t_base)) >= us
+    return ((t - t_base) & uint(__ticks_mask)) >= us
 
 
 @micropython.viper
@@ -41,6 +53,35 @@ def expired_and_advance(t_base, us, t=None):
     return result, advance(t_base, us) if result else t_base
 
 
+__asyncio = None
+
+def __get_asyncio():
+    global __asyncio
+    if __asyncio is None:
+        try:
+            import asyncio
+        except ImportError:
+            import uasyncio as asyncio
+        __asyncio = asyncio
+    return __asyncio
+
+
+async def sleep_us(us):
+    asyncio = __get_asyncio()
+    if hasattr(asyncio, 'sleep_ms'):
+        await asyncio.sleep_ms(us // 1000)
+    else:
+        await asyncio.sleep(us / 1e6)
+
+
+async def sleep_until(t_base, us):
+    while True:
+        t = now()
+        if expired_at(t_base, us, t):
+            return t
+        await sleep_us(us - diff(t, t_base))
+
+
 if __name__ == '__main__':
     import machine
     
@@ -0,0 +1,136 @@
+import array
+import machine
+import struct
+
+import timestamp
+
+
+# Records (event, t_us, arg) triples into a preallocated ring so that the order
+# and spacing of events survives, which a histogram cannot show. record() is a
+# viper method that masks interrupts only around the slot update, so it can be
+# called from both IRQ handlers and the main loop without allocating.
+#
+# The event word holds the phase in bits 24-25 and the event id in bits 0-23.
+class TraceRecorder:
+    Instant = const(0)
+    Begin = const(1)
+    End = const(2)
+    phase_shift = const(24)
+    id_mask = const(0xFFFFFF)
+
+    magic = b'UTRC'
+    version = const(1)
+    header_format = '<4sBBHII'  # magic, version, reserved, name count, ticks mask, event count
+    name_format = '<IH'  # event id, name length
+
+    def __init__(self, capacity=1024):
+        assert capacity > 0, 'Error: Trace capacity must be at least one event'
+        self.__buffer = array.array('I', [0] * (3 * capacity))
+        self.__state = array.array('i', [0, 0, 0, 1, capacity])  # head, count, overwritten, enabled, capacity
+        self.__names = {}
+
+    def __len__(self):
+        return self.__state[1]
+
+    @property
+    def capacity(self):
+        return self.__state[4]
+
+    @property
+    def overwritten(self):
+        return self.__state[2]
+
+    @property
+    def enabled(self):
+        return self.__state[3] == 1
+
+    @enabled.setter
+    def enabled(self, value):
+        self.__state[3] = 1 if value else 0
+
+    @property
+    def names(self):
+        return self.__names
+
+    def register(self, name, event_id=None):
+        for existing_id, existing_name in self.__names.items():
+            if existing_name == name:
+                return existing_id
+        if event_id is None:
+            event_id = (max(self.__names) + 1) if self.__names else 0
+        assert 0 <= event_id <= self.id_mask, 'Error: Trace event id {} out of range'.format(event_id)
+        assert event_id not in self.__names, 'Error: Trace event id {} is already used by {}'.format(event_id, self.__names.get(event_id))
+        self.__names[event_id] = name
+        return event_id
+
+    def clear(self):
+        state = self.__state
+        state[0] = 0
+        state[1] = 0
+        state[2] = 0
+
+    @micropython.viper
+    def record(self, event: int, arg: int):
+        irq_state = machine.disable_irq()
+        state = ptr32(self.__state)
+        if state[3] != 0:
+            buf = ptr32(self.__buffer)
+            head = state[0]
+            idx = 3 * head
+            buf[idx] = event
+            buf[idx + 1] = int(timestamp.now())
+            buf[idx + 2] = arg
+            head += 1
+            if head == state[4]:
+                head = 0
+            state[0] = head
+            if state[1] == state[4]:
+                state[2] = state[2] + 1
+            else:
+                state[1] = state[1] + 1
+        machine.enable_irq(irq_state)
+
+    @micropython.native
+    def begin(self, event_id, arg=0):
+        self.record((1 << 24) | event_id, arg)
+
+    @micropython.native
+    def end(self, event_id, arg=0):
+        self.record((2 << 24) | event_id, arg)
+
+    @micropython.native
+    def instant(self, event_id, arg=0):
+        self.record(event_id, arg)
+
+    # Oldest first as (phase, event_id, t_us, arg); this allocates and is meant
+    # for inspection after recording has stopped.
+    def events(self):
+        buf = self.__buffer
+        head, count, _, _, capacity = self.__state
+        idx = (head - count) % capacity
+        for _ in range(count):
+            event = buf[3 * idx]
+            yield (event >> self.phase_shift, event & self.id_mask, buf[3 * idx + 1], buf[3 * idx + 2])
+            idx = 0 if idx == (capacity - 1) else idx + 1
+
+    def export(self, stream):
+        head, count, _, _, capacity = self.__state
+        stream.write(struct.pack(self.header_format, self.magic, self.version, 0, len(self.__names), timestamp.ticks_mask, count))
+        for event_id, name in self.__names.items():
+            encoded = name.encode()
+            stream.write(struct.pack(self.name_format, event_id, len(encoded)))
+            stream.write(encoded)
+        # The ring is written as stored (little endian words), oldest event first
+        words = memoryview(self.__buffer)
+        start = 3 * ((head - count) % capacity)
+        end = start + 3 * count
+        if end <= 3 * capacity:
+            stream.write(words[start:end])
+        else:
+            stream.write(words[start:])
+            stream.write(words[:end - 3 * capacity])
+
+    def save(self, path):
+        with open(path, 'wb') as stream:
+            self.export(stream)
+
@@ -0,0 +1,191 @@
+# Stand-ins for the hardware parts of the machine and rp2 modules so that the
+# libraries can be exercised without a board attached, on the MicroPython unix
+# port or (for modules that do not depend on MicroPython's attribute semantics)
+# under CPython.
+#
+#   import sim
+#   sim.install()
+#   import button
+#
+import sys
+
+levels = {}
+timers = []
+
+
+def set_pin(pin_num, value):
+    levels[pin_num] = 1 if value else 0
+
+
+def fire_timers(count=1):
+    for _ in range(count):
+        for timer in timers:
+            timer.fire()
+
+
+irq_disabled = 0
+
+
+def disable_irq():
+    global irq_disabled
+    irq_disabled += 1
+    return irq_disabled
+
+
+def enable_irq(state):
+    global irq_disabled
+    irq_disabled = state - 1
+
+
+class Pin:
+    IN = 0
+    OUT = 1
+    OPEN_DRAIN = 2
+    PULL_UP = 1
+    PULL_DOWN = 2
+
+    def __init__(self, pin_num, mode=-1, pull=-1, value=None):
+        self.__pin_num = pin_num
+        if value is not None:
+            set_pin(pin_num, value)
+        elif pin_num not in levels:
+            set_pin(pin_num, pull == Pin.PULL_UP)
+
+    def value(self, value=None):
+        if value is None:
+            return levels[self.__pin_num]
+        set_pin(self.__pin_num, value)
+
+    def __call__(self, value=None):
+        return self.value(value)
+
+
+class Timer:
+    ONE_SHOT = 0
+    PERIODIC = 1
+
+    def __init__(self, timer_id=-1, **kwargs):
+        self.__callback = None
+        self.__mode = Timer.PERIODIC
+        if len(kwargs) > 0:
+            self.init(**kwargs)
+
+    def init(self, mode=PERIODIC, freq=-1, period=-1, callback=None):
+        self.__mode = mode
+        self.__callback = callback
+        if self not in timers:
+            timers.append(self)
+
+    def deinit(self):
+        self.__callback = None
+        if self in timers:
+            timers.remove(self)
+
+    def fire(self):
+        callback = self.__callback
+        if callback is not None:
+            if self.__mode == Timer.ONE_SHOT:
+                self.deinit()
+            callback(self)
+
+
+class rp2:
+    class PIO:
+        IN_LOW = 0
+        IN_HIGH = 1
+        OUT_LOW = 2
+        OUT_HIGH = 3
+        SHIFT_LEFT = 0
+        SHIFT_RIGHT = 1
+        JOIN_NONE = 0
+        JOIN_TX = 1
+        JOIN_RX = 2
+
+    class StateMachine:
+        def __init__(self, sm_id, program=None, freq=-1, **kwargs):
+            self.sm_id = sm_id
+            self.program = program
+            self.freq = freq
+            self.rx = []
+            self.tx = []
+            self.__active = 0
+            state_machines[sm_id] = self
+
+        def active(self, value=None):
+            if value is None:
+                return self.__active
+            self.__active = value
+
+        def rx_fifo(self):
+            return len(self.rx)
+
+        def tx_fifo(self):
+            return len(self.tx)
+
+        def get(self, buf=None, shift=0):
+            if buf is None:
+                return self.rx.pop(0) >> shift
+            for idx in range(len(buf)):
+                buf[idx] = self.rx.pop(0) >> shift
+
+        def put(self, value, shift=0):
+            self.tx.append(value << shift)
+
+    @staticmethod
+    def asm_pio(**kwargs):
+        def assemble(program):
+            return program
+        return assemble
+
+
+state_machines = {}
+
+
+def push_rx(sm_id, *words):
+    state_machines[sm_id].rx.extend(words)
+
+
+def __install_host():
+    # CPython has none of the MicroPython builtins; provide plain Python
+    # equivalents (emitter decorators become no-ops, viper casts become views).
+    import builtins
+    import time
+
+    class micropython:
+        @staticmethod
+        def native(func):
+            return func
+
+        @staticmethod
+        def viper(func):
+            return func
+
+        @staticmethod
+        def const(value):
+            return value
+
+    ticks_mask = 0x3FFFFFFF
+    ticks_half = (ticks_mask + 1) // 2
+    builtins.micropython = micropython
+    builtins.const = micropython.const
+    builtins.uint = lambda value: value & 0xFFFFFFFF
+    builtins.ptr8 = lambda buf: memoryview(buf).cast('B')
+    builtins.ptr16 = lambda buf: memoryview(buf).cast('B').cast('H')
+    builtins.ptr32 = lambda buf: memoryview(buf).cast('B').cast('i')
+    time.ticks_us = lambda: int(1e6 * time.perf_counter()) & ticks_mask
+    time.ticks_ms = lambda: int(1e3 * time.perf_counter()) & ticks_mask
+    time.ticks_add = lambda t, delta: (t + delta) & ticks_mask
+    time.ticks_diff = lambda t1, t0: ((t1 - t0 + ticks_half) & ticks_mask) - ticks_half
+    time.sleep_us = lambda us: time.sleep(us / 1e6)
+    time.sleep_ms = lambda ms: time.sleep(ms / 1e3)
+    sys.modules['micropython'] = micropython
+    sys.modules['utime'] = time
+
+
+def install():
+    if '/' in __file__:
+        sys.path.append(__file__.rsplit('/', 1)[0] + '/../libs')
+    if not sys.implementation.name == 'micropython':
+        __install_host()
+    sys.modules['machine'] = sys.modules[__name__]
+    sys.modules['rp2'] = rp2
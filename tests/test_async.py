@@ -0,0 +1,118 @@
+import sys
+
+import sim
+sim.install()
+
+try:
+    import asyncio
+except ImportError:
+    import uasyncio as asyncio
+
+import timestamp
+
+# button.py and hx711.py rely on MicroPython's unmangled private attributes, so
+# their part of this test needs the unix port; timestamp runs on CPython too.
+full_test = sys.implementation.name == 'micropython'
+
+btn_pin = 19
+sm_id = 0
+
+
+async def press(pin_num, t_press_ms, t_hold_ms):
+    await asyncio.sleep(t_press_ms / 1000)
+    sim.set_pin(pin_num, 0)
+    await asyncio.sleep(t_hold_ms / 1000)
+    sim.set_pin(pin_num, 1)
+
+
+async def test_sleep_until():
+    t_base = timestamp.now()
+    t = await timestamp.sleep_until(t_base, 20000)
+    assert timestamp.expired_at(t_base, 20000, t), 'Error: sleep_until() returned early'
+
+
+async def test_clicked():
+    import button
+    sim.set_pin(btn_pin, 1)
+    btn = button.Button(btn_pin, t_repeat_click=1000)
+    asyncio.create_task(press(btn_pin, 20, 100))
+    evt = await btn.clicked()
+    assert evt.released and evt.clicked
+
+
+async def test_toggled():
+    import button
+    sim.set_pin(btn_pin, 1)
+    toggle = button.Toggle(btn_pin)
+    asyncio.create_task(press(btn_pin, 20, 100))
+    evt = await toggle.toggled()
+    assert evt.toggled and evt.state
+
+
+async def test_shared_queue():
+    import button
+    pins = (btn_pin, btn_pin + 1)
+    for pin in pins:
+        sim.set_pin(pin, 1)
+    queue = button.EventQueue()
+    buttons = [button.Button(pin) for pin in pins]
+    for channel, btn in enumerate(buttons):
+        btn.attach_queue(queue, channel + 1)
+        btn.start_irq()
+    running = [True]
+
+    async def tick():
+        while running[0]:
+            sim.fire_timers()
+            await asyncio.sleep(0.001)
+
+    asyncio.create_task(tick())
+    # The second button is pressed first; waiting on the first must leave its events queued
+    asyncio.create_task(press(pins[1], 10, 100))
+    asyncio.create_task(press(pins[0], 50, 100))
+    evt = await buttons[0].pressed()
+    assert evt.channel == 1, 'Error: Waiter got an event of channel {}'.format(evt.channel)
+    assert len(queue) > 0, 'Error: The other button\'s events were not left queued'
+    evt = await buttons[1].pressed()
+    assert evt.channel == 2, 'Error: Waiter got an event of channel {}'.format(evt.channel)
+    running[0] = False
+    for btn in buttons:
+        btn.stop_irq()
+
+    # Polling into a shared queue still drains this button's events from it
+    sim.set_pin(pins[0], 1)
+    polled = button.Button(pins[0])
+    polled.attach_queue(queue, 5)
+    queue.clear()
+    asyncio.create_task(press(pins[0], 20, 100))
+    evt = await polled.pressed()
+    assert evt.channel == 5
+    evt = await polled.released()
+    assert len(queue) == 0, 'Error: Polled events left in the queue'
+
+
+async def test_hx711_read():
+    import hx711
+    adc = hx711.HX711(22, 21, pio_idx=sm_id)
+
+    async def convert():
+        await asyncio.sleep(0.05)
+        sim.push_rx(sm_id, 0x000123, 0xFFFFF000)
+
+    asyncio.create_task(convert())
+    data, dt = await adc.read()
+    assert data == 0x123, 'Error: Unexpected HX711 sample {}'.format(data)
+
+
+async def main():
+    await test_sleep_until()
+    if full_test:
+        await test_clicked()
+        await test_toggled()
+        await test_shared_queue()
+        await test_hx711_read()
+    print('All async tests passed')
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
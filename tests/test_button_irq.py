@@ -0,0 +1,114 @@
+import sim
+sim.install()
+
+import button
+
+
+btn_pin = 19
+
+
+def collect(btn):
+    evt_types = []
+
+    def processor(evt):
+        evt_types.append(evt.evt_type)
+
+    btn.drain(processor)
+    return evt_types
+
+
+def test_button_irq():
+    sim.set_pin(btn_pin, 1)
+    btn = button.Button(btn_pin)
+    btn.start_irq(queue_size=8)
+    sim.set_pin(btn_pin, 0)
+    sim.fire_timers(button.ButtonCore.samples)
+    assert btn.state, 'Error: Button not pressed after a full debounce window'
+    sim.set_pin(btn_pin, 1)
+    sim.fire_timers(button.ButtonCore.samples)
+    assert not btn.state, 'Error: Button not released after a full debounce window'
+    evt_types = collect(btn)
+    assert len(evt_types) == 2, 'Error: Expected two queued events, got {}'.format(evt_types)
+    assert evt_types[0] == button.Event.Pressed
+    assert not (evt_types[1] & button.Event.Released) == 0
+    assert not (evt_types[1] & (button.Event.Clicked | button.Event.RepeatClicked)) == 0
+    btn.stop_irq()
+    sim.fire_timers(2 * button.ButtonCore.samples)
+    assert btn.pending == 0
+
+
+def test_toggle_irq():
+    sim.set_pin(btn_pin, 1)
+    toggle = button.Toggle(btn_pin)
+    toggle.start_irq(queue_size=8)
+    for _ in range(3):
+        sim.set_pin(btn_pin, 0)
+        sim.fire_timers(button.ButtonCore.samples)
+        sim.set_pin(btn_pin, 1)
+        sim.fire_timers(button.ButtonCore.samples)
+    evt_types = collect(toggle)
+    toggled = [evt_type for evt_type in evt_types if not (evt_type & button.Event.Toggled) == 0]
+    assert len(toggled) == 3, 'Error: Expected three toggles, got {}'.format(evt_types)
+    assert toggle.state
+    toggle.stop_irq()
+
+
+def test_unbuffered_irq():
+    sim.set_pin(btn_pin, 1)
+    switch = button.Unbuffered(btn_pin)
+    switch.start_irq(queue_size=4)
+    sim.set_pin(btn_pin, 0)
+    sim.fire_timers()
+    sim.set_pin(btn_pin, 1)
+    sim.fire_timers()
+    assert collect(switch) == [button.Event.Pressed, button.Event.Released]
+    switch.stop_irq()
+
+
+def test_queue_full():
+    sim.set_pin(btn_pin, 1)
+    switch = button.Unbuffered(btn_pin)
+    switch.start_irq(queue_size=2)
+    for _ in range(2):
+        sim.set_pin(btn_pin, 0)
+        sim.fire_timers()
+        sim.set_pin(btn_pin, 1)
+        sim.fire_timers()
+    assert switch.pending == 2, 'Error: Queue should hold exactly its capacity'
+    assert switch.queue.dropped == 2, 'Error: Overflowing events should be counted as dropped'
+    assert switch.drain(max_events=1) == 1
+    assert switch.pending == 1
+    switch.stop_irq()
+
+
+def test_shared_queue():
+    other_pin = btn_pin + 1
+    sim.set_pin(btn_pin, 1)
+    sim.set_pin(other_pin, 1)
+    queue = button.EventQueue(8)
+    first = button.Unbuffered(btn_pin)
+    second = button.Unbuffered(other_pin)
+    first.attach_queue(queue, channel=3)
+    second.attach_queue(queue, channel=7)
+    sim.set_pin(other_pin, 0)
+    second.update()
+    sim.set_pin(btn_pin, 0)
+    first.update()
+    packed = queue.pop()
+    assert button.event_channel(packed) == 7
+    assert button.event_type(packed) == button.Event.Pressed
+    assert button.event_state(packed)
+    evt = button.Event()
+    assert queue.pop_into(evt)
+    assert (evt.channel, evt.state, evt.evt_type) == (3, True, button.Event.Pressed)
+    assert queue.pop() == -1
+    assert not queue.pop_into(evt)
+
+
+if __name__ == '__main__':
+    test_button_irq()
+    test_toggle_irq()
+    test_unbuffered_irq()
+    test_queue_full()
+    test_shared_queue()
+    print('All IRQ tests passed')
@@ -8,37 +8,19 @@ import timestamp
     
 if __name__ == '__main__':
     test_type = 'perf_all'
-    correct_samples = 15
     perf_bins = 50
+    bank_pins = list(range(0, 16))
     
     board_led = machine.Pin(25, machine.Pin.OUT)
     state_led = machine.Pin(16, machine.Pin.OUT)
     perf_btn = button.Button(18) 
     perf_sampler = perf.HistogramSampler(bins=perf_bins, t_sample_us=int(1.5e6))
 
-    def perfCorrectTiming():
-        t_correct = 0
-        correct_sampler = perf.HistogramSampler(bins=perf_bins, t_sample_us=1000000)
-        print('Running perf correction measurement:')
-        for idx in range(correct_samples):
-            print('\tSample {}'.format(idx + 1))
-            updated = False
-            while not updated:
-                correct_sampler.begin()
-                updated = correct_sampler.end()
-                if updated:
-                    t_correct += correct_sampler.data.mean
-        t_correct = t_correct / correct_samples
-        del correct_sampler
-        return t_correct
-    
-    t_perf_offset = 0
-    
     def displayPerfInfo(btn):
         print('\n{}.update() Performance:'.format(btn.__class__.__name__))
         data = perf_sampler.data
         data.print_histogram()
-        print('\tmean = {} us'.format(data.mean - t_perf_offset))
+        print('\tmean = {} us'.format(data.mean))
         
     def testRunner(msg, btn, evt_processor, timeout_s=None):
         print(msg)
@@ -59,7 +41,7 @@ if __name__ == '__main__':
                 t_start = timestamp.now()
                 pulsing = True
                 board_led.value(True)
-                new_t_update = perf_sampler.data.mean - t_perf_offset
+                new_t_update = perf_sampler.data.mean
                 if (t_update is None) or (t_update > new_t_update):
                     t_update = new_t_update
             if pulsing and timestamp.expired(t_start, t_pulse):
@@ -86,6 +68,21 @@ if __name__ == '__main__':
     
     def perfProcessor(evt):
         return
+
+    def scanRunner(msg, scan, timeout_s):
+        print(msg)
+        t_scan = None
+        perf_sampler.reset()
+        t_begin = timestamp.now()
+        while not timestamp.expired(t_begin, int(1e6 * timeout_s)):
+            perf_sampler.begin()
+            scan()
+            if perf_sampler.end():
+                new_t_scan = perf_sampler.data.mean
+                if (t_scan is None) or (t_scan > new_t_scan):
+                    t_scan = new_t_scan
+        print('\tBest mean(t_scan) = {} us'.format(t_scan))
+        return t_scan
     
     if test_type == 'simple':
         testRunner('Running Simple Pushbutton Test', button.Button(19), simpleEventProcessor)       
@@ -97,12 +94,26 @@ if __name__ == '__main__':
     elif test_type == 'perf_all':
         results = {}
         timeout_s = 120
-        t_perf_offset = perfCorrectTiming()
-        print('t_perf_offset = {} us'.format(t_perf_offset))        
+        print('t_offset = {} us'.format(perf_sampler.t_offset))        
         results['simple'] = testRunner('Running Simple Pushbutton Test', button.Button(19), perfProcessor, timeout_s=timeout_s)        
         results['toggle'] = testRunner('Running Toggle Test', button.Toggle(19), perfProcessor, timeout_s=timeout_s)
         results['unbuffered'] = testRunner('Running Unbuffered Switch Test', button.Unbuffered(19), perfProcessor, timeout_s=timeout_s)
         
         for type_name, result in results.items():
             print('{} -> {}'.format(type_name, result))
-        
\ No newline at end of file
+        
+
+    elif test_type == 'perf_bank':
+        timeout_s = 15
+        print('t_offset = {} us'.format(perf_sampler.t_offset))
+        buttons = [button.Button(pin_num) for pin_num in bank_pins]
+        bank = button.ButtonBank(bank_pins)
+
+        def scanButtons():
+            for btn in buttons:
+                btn.update()
+
+        t_buttons = scanRunner('Running {} x Button.update() Scan'.format(len(buttons)), scanButtons, timeout_s)
+        t_bank = scanRunner('Running ButtonBank.update() Scan ({} channels)'.format(len(bank)), bank.update, timeout_s)
+        print('buttons -> {} us ({} us / channel)'.format(t_buttons, t_buttons / len(buttons)))
+        print('bank -> {} us ({} us / channel)'.format(t_bank, t_bank / len(bank)))
@@ -0,0 +1,266 @@
+import array
+import math
+import random
+import time
+
+import sim
+sim.install()
+
+import extended_statistics
+
+samples = 1000
+
+
+def close(a, b, rel=1e-6):
+    return abs(a - b) <= rel * max(1, abs(a), abs(b))
+
+
+def make_data(count, offset=1000.0, spread=5.0):
+    return [offset + random.uniform(-spread, spread) for _ in range(count)]
+
+
+def test_running_update_many():
+    data = make_data(samples)
+    reference = extended_statistics.RunningStatistics()
+    for x in data:
+        reference.update(x)
+    for buf in (data, array.array('d', data), memoryview(array.array('d', data))):
+        stats = extended_statistics.RunningStatistics()
+        stats.update_many(buf[:samples // 3])
+        stats.update_many(buf[samples // 3:])
+        assert stats.samples == reference.samples
+        assert close(stats.x, reference.x), 'Error: Mean {} differs from {}'.format(stats.x, reference.x)
+        assert close(stats.s2, reference.s2), 'Error: Variance {} differs from {}'.format(stats.s2, reference.s2)
+
+
+def test_exponential_update_many():
+    data = make_data(samples)
+    reference = extended_statistics.ExponentialStatistics(fs=80, tau=0.5)
+    for x in data:
+        reference.update(x)
+    stats = extended_statistics.ExponentialStatistics(fs=80, tau=0.5)
+    stats.update_many(array.array('d', data), samples // 2)
+    stats.update_many(data[samples // 2:])
+    assert stats.samples == reference.samples
+    assert close(stats.x, reference.x)
+    assert close(stats.s2, reference.s2)
+
+
+def test_running_merge():
+    data = make_data(samples, offset=1e5, spread=1.0)
+    reference = extended_statistics.RunningStatistics()
+    for x in data:
+        reference.update(x)
+    splits = (0, 1, 137, 500, 999, samples)
+    parts = []
+    for start, end in zip(splits[:-1], splits[1:]):
+        part = extended_statistics.RunningStatistics()
+        for x in data[start:end]:
+            part.update(x)
+        parts.append(part)
+    merged = extended_statistics.RunningStatistics()
+    for part in parts:
+        merged.merge(part)
+    summed = parts[0] + parts[1]
+    for part in parts[2:]:
+        summed += part
+    empty = extended_statistics.RunningStatistics()
+    for result in (merged, summed, merged + empty, empty + merged):
+        assert result.samples == reference.samples
+        assert close(result.x, reference.x), 'Error: Merged mean {} differs from {}'.format(result.x, reference.x)
+        assert close(result.s2, reference.s2, 1e-5), 'Error: Merged variance {} differs from {}'.format(result.s2, reference.s2)
+
+
+def test_running_bytes():
+    stats = extended_statistics.RunningStatistics()
+    stats.update_many(make_data(samples))
+    packed = stats.to_bytes()
+    assert len(packed) == 20
+    restored = extended_statistics.RunningStatistics.from_bytes(packed)
+    assert restored.samples == stats.samples
+    assert restored.x == stats.x
+    assert restored.s2 == stats.s2
+    empty = extended_statistics.RunningStatistics.from_bytes(extended_statistics.RunningStatistics().to_bytes())
+    assert (empty.samples, empty.valid) == (0, False)
+
+
+def test_windowed():
+    window = 50
+    stats = extended_statistics.WindowedStatistics(window)
+    stored = array.array('f', [0])
+    history = []
+    for idx in range(10 * window):
+        x = 100 * math.sin(idx / 17) + random.uniform(-3, 3)
+        stored[0] = x
+        history.append(stored[0])
+        stats.update(x)
+        recent = history[-window:]
+        mean = sum(recent) / len(recent)
+        assert stats.samples == len(recent)
+        assert close(stats.x, mean, 1e-4), 'Error: Window mean {} differs from {}'.format(stats.x, mean)
+        assert stats.minimum == min(recent)
+        assert stats.maximum == max(recent)
+        if len(recent) > 1:
+            s2 = sum((v - mean) ** 2 for v in recent) / (len(recent) - 1)
+            assert abs(stats.s2 - s2) <= 1e-3 * max(1, s2), 'Error: Window variance {} differs from {}'.format(stats.s2, s2)
+    assert stats.full
+
+
+def test_windowed_long_run():
+    # Large level changes followed by a quiet stretch expose any drift of the
+    # incremental mean and sum of squares
+    window = 32
+    stats = extended_statistics.WindowedStatistics(window)
+    for idx in range(100 * samples):
+        level = 1e5 if (idx // 500) % 2 == 0 else -1e5
+        stats.update(level + random.uniform(-1e3, 1e3))
+    stored = array.array('f', [0])
+    recent = []
+    for idx in range(window):
+        stored[0] = 12345 + 0.01 * (idx % 5)
+        stats.update(stored[0])
+        recent.append(stored[0])
+    mean = sum(recent) / window
+    s2 = sum((v - mean) ** 2 for v in recent) / (window - 1)
+    assert abs(stats.x - mean) <= 1e-6 * abs(mean), 'Error: Window mean {} drifted from {}'.format(stats.x, mean)
+    assert abs(stats.s2 - s2) <= 0.01 * s2, 'Error: Window variance {} drifted from {}'.format(stats.s2, s2)
+
+
+def exact_quantile(data, q):
+    ordered = sorted(data)
+    return ordered[int(q * (len(ordered) - 1))]
+
+
+def test_p2_quantile():
+    data = [random.expovariate(1 / 250) for _ in range(20 * samples)]
+    for p in (0.5, 0.95, 0.99):
+        estimator = extended_statistics.P2Quantile(p)
+        for x in data:
+            estimator.update(x)
+        exact = exact_quantile(data, p)
+        assert abs(estimator.value - exact) <= 0.05 * exact, 'Error: P2 p{} = {} (exact {})'.format(int(100 * p), estimator.value, exact)
+    small = extended_statistics.P2Quantile(0.5)
+    for x in (5, 1, 3):
+        small.update(x)
+    assert small.value == 3
+    # Desired marker positions are tracked in integers, so long runs stay on target
+    long_run = extended_statistics.P2Quantile(0.9)
+    for idx in range(200 * samples):
+        long_run.update((idx * 7919) % 1000)
+    assert long_run.samples == 200 * samples
+    assert abs(long_run.value - 900) <= 10, 'Error: Long-run P2 p90 = {}'.format(long_run.value)
+
+
+def test_quantile_sketch():
+    alpha = 0.02
+    data = [random.lognormvariate(5, 1.5) for _ in range(20 * samples)]
+    sketch = extended_statistics.QuantileSketch(alpha=alpha, bins=512)
+    halves = (extended_statistics.QuantileSketch(alpha=alpha, bins=512), extended_statistics.QuantileSketch(alpha=alpha, bins=512))
+    for idx, x in enumerate(data):
+        sketch.update(x)
+        halves[idx % 2].update(x)
+    merged = halves[0].merge(halves[1])
+    assert merged.samples == sketch.samples
+    for q in (0.5, 0.95, 0.99):
+        exact = exact_quantile(data, q)
+        for estimate in (sketch.quantile(q), merged.quantile(q)):
+            assert abs(estimate - exact) <= 2 * alpha * exact, 'Error: Sketch p{} = {} (exact {})'.format(int(100 * q), estimate, exact)
+    assert sketch.quantile(0) == sketch.minimum
+    assert sketch.quantile(1) == sketch.maximum
+
+    # A narrow sketch keeps the upper quantiles accurate by folding the low tail
+    narrow = extended_statistics.QuantileSketch(alpha=alpha, bins=128)
+    for x in data:
+        narrow.update(x)
+    exact = exact_quantile(data, 0.99)
+    assert abs(narrow.quantile(0.99) - exact) <= 2 * alpha * exact
+
+
+def make_counts(count, offset=20000, spread=400):
+    return [offset + int(spread * math.sin(idx / 25)) + random.randint(-spread // 4, spread // 4) for idx in range(count)]
+
+
+def test_fixed_exponential():
+    data = make_counts(5 * samples)
+    fixed = extended_statistics.FixedExponentialStatistics(fs=80, tau=0.5, q=8)
+    e = fixed.e  # The float reference uses the same quantized weight
+    x = None
+    s2 = 0
+    for x_new in data:
+        fixed.update(x_new)
+        if x is None:
+            x = x_new
+        else:
+            diff = x - x_new
+            x = (e * diff) + x_new
+            s2 = (e * (s2 - diff * diff)) + diff * diff
+        assert abs(fixed.x - x) <= 0.25, 'Error: Fixed EMA {} differs from {}'.format(fixed.x, x)
+    assert abs(fixed.s2 - s2) <= 0.01 * s2, 'Error: Fixed EMA variance {} differs from {}'.format(fixed.s2, s2)
+    assert abs(fixed.e - math.exp(-1 / 40)) < 1 / (1 << 8)
+
+
+def test_fixed_running():
+    data = make_counts(20 * samples)
+    reference = extended_statistics.RunningStatistics()
+    fixed = extended_statistics.FixedRunningStatistics(q=8)
+    for x in data:
+        reference.update(x)
+        fixed.update(x)
+    assert fixed.samples == reference.samples
+    assert abs(fixed.x - reference.x) <= 0.5, 'Error: Fixed mean {} differs from {}'.format(fixed.x, reference.x)
+    assert abs(fixed.s2 - reference.s2) <= 0.01 * reference.s2, 'Error: Fixed variance {} differs from {}'.format(fixed.s2, reference.s2)
+
+
+def test_fixed_running_long():
+    # Well past 2**31 / variance samples, where a single 32-bit sum of squares overflows
+    data = make_counts(60 * samples)
+    reference = extended_statistics.RunningStatistics()
+    fixed = extended_statistics.FixedRunningStatistics(q=8)
+    for x in data:
+        reference.update(x)
+        fixed.update(x)
+    assert fixed.samples * reference.s2 > (1 << 31)
+    assert abs(fixed.x - reference.x) <= 0.01, 'Error: Fixed mean {} differs from {}'.format(fixed.x, reference.x)
+    assert abs(fixed.s2 - reference.s2) <= 0.001 * reference.s2, 'Error: Fixed variance {} differs from {}'.format(fixed.s2, reference.s2)
+
+    # A step change long after the sample count passed the step size (in Q units)
+    fixed.reset()
+    for x in (1000, 1100):
+        for _ in range(40 * samples):
+            fixed.update(x)
+    assert abs(fixed.x - 1050) <= 0.01, 'Error: Fixed mean {} after a step change (expected 1050)'.format(fixed.x)
+    s2 = 2500 * fixed.samples / (fixed.samples - 1)
+    assert abs(fixed.s2 - s2) <= 0.001 * s2, 'Error: Fixed variance {} after a step change (expected {})'.format(fixed.s2, s2)
+
+
+def bench_updates(label, stats, data):
+    update = stats.update
+    t0 = time.ticks_us()
+    for x in data:
+        update(x)
+    dt = time.ticks_diff(time.ticks_us(), t0)
+    print('{}: {} updates/sec'.format(label, int(1e6 * len(data) / dt)))
+
+
+def bench_fixed():
+    data = make_counts(5 * samples)
+    bench_updates('ExponentialStatistics.update()', extended_statistics.ExponentialStatistics(fs=80, tau=0.5), data)
+    bench_updates('FixedExponentialStatistics.update()', extended_statistics.FixedExponentialStatistics(fs=80, tau=0.5), data)
+    bench_updates('RunningStatistics.update()', extended_statistics.RunningStatistics(), data)
+    bench_updates('FixedRunningStatistics.update()', extended_statistics.FixedRunningStatistics(), data)
+
+
+if __name__ == '__main__':
+    test_running_update_many()
+    test_exponential_update_many()
+    test_running_merge()
+    test_running_bytes()
+    test_windowed()
+    test_windowed_long_run()
+    test_p2_quantile()
+    test_quantile_sketch()
+    test_fixed_exponential()
+    test_fixed_running()
+    test_fixed_running_long()
+    print('All extended statistics tests passed')
+    bench_fixed()
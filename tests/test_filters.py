@@ -0,0 +1,86 @@
+import array
+import math
+import random
+import time
+
+import sim
+sim.install()
+
+import extended_statistics
+import filters
+
+block = 32
+blocks = 64
+fs = 80
+
+
+def make_pipeline():
+    return filters.Pipeline(
+        filters.OutlierReject(5000),
+        filters.Median(5),
+        filters.EMA(fs=fs, tau=0.5),
+        filters.Calibration(offset=8388, scale=0.001),
+        block=block
+    )
+
+
+def make_samples(count):
+    samples = array.array('i', [0] * count)
+    for idx in range(count):
+        value = 8388 + int(200 * math.sin(idx / 10)) + random.randint(-50, 50)
+        if idx % 37 == 5:
+            value += 100000
+        samples[idx] = value
+    return samples
+
+
+def test_batch_matches_per_sample(samples):
+    per_sample = make_pipeline()
+    expected = []
+    for x in samples:
+        y = per_sample.update(x)
+        if y is not None:
+            expected.append(y)
+    batched = make_pipeline()
+    results = []
+    for idx in range(0, len(samples), block):
+        n = batched.process(samples[idx:idx + block])
+        results.extend(batched.output[:n])
+    assert len(results) == len(expected), 'Error: Batch path kept {} samples, per-sample path {}'.format(len(results), len(expected))
+    for result, value in zip(results, expected):
+        assert abs(result - value) <= 1e-3 * max(1, abs(value)), 'Error: Batch result {} differs from {}'.format(result, value)
+
+
+def bench(label, func, samples):
+    t0 = time.ticks_us()
+    func(samples)
+    dt = time.ticks_diff(time.ticks_us(), t0)
+    print('{}: {} samples/sec'.format(label, int(1e6 * len(samples) / dt)))
+
+
+def run_statistics(samples):
+    stats = extended_statistics.ExponentialStatistics(fs=fs, tau=0.5)
+    for x in samples:
+        stats.update(x)
+
+
+def run_per_sample(samples):
+    pipeline = make_pipeline()
+    for x in samples:
+        pipeline.update(x)
+
+
+def run_batched(samples):
+    pipeline = make_pipeline()
+    src = memoryview(samples)
+    for idx in range(0, len(samples), block):
+        pipeline.process(src[idx:idx + block])
+
+
+if __name__ == '__main__':
+    samples = make_samples(block * blocks)
+    test_batch_matches_per_sample(samples)
+    print('Filter pipeline results match')
+    bench('ExponentialStatistics.update()', run_statistics, samples)
+    bench('Pipeline.update()', run_per_sample, samples)
+    bench('Pipeline.process()', run_batched, samples)
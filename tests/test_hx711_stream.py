@@ -0,0 +1,161 @@
+import array
+import sys
+
+import sim
+sim.install()
+
+import hx711
+
+# The streaming driver itself needs MicroPython's attribute semantics (unix port),
+# the conversion pass runs on CPython as well.
+full_test = sys.implementation.name == 'micropython'
+
+sm_id = 1
+ovf = 0xFFFFFFFF
+
+
+def reference(data, dt_data):
+    if data == ovf:
+        return None
+    if data >= 0x800000:
+        data -= 0x1000000
+    return data, (0xFFFFFFFF - dt_data + hx711.HX711.dt_counts_read) & 0xFFFFFFFF
+
+
+def synthetic(samples):
+    raw = array.array('I')
+    expected = []
+    for idx in range(samples):
+        if idx % 7 == 3:
+            data, dt_data = ovf, ovf
+        else:
+            data = (idx * 0x2F1D3) & 0xFFFFFF
+            dt_data = 0xFFFFFFFF - (1000 * idx + 17)
+        raw.append(data)
+        raw.append(dt_data)
+        result = reference(data, dt_data)
+        if result is not None:
+            expected.append(result)
+    return raw, expected
+
+
+def test_convert():
+    samples = 64
+    raw, expected = synthetic(samples)
+    values = array.array('i', [0] * samples)
+    dt_counts = array.array('i', [0] * samples)
+    valid = hx711.convert(raw, samples, values, dt_counts)
+    assert valid == len(expected), 'Error: Expected {} valid samples, got {}'.format(len(expected), valid)
+    for idx, (data, dt) in enumerate(expected):
+        assert values[idx] == data, 'Error: Sample {} converted to {} (expected {})'.format(idx, values[idx], data)
+        assert dt_counts[idx] == dt, 'Error: dt {} converted to {} (expected {})'.format(idx, dt_counts[idx], dt)
+
+
+def test_convert_extremes():
+    raw = array.array('I', [0x7FFFFF, 0xFFFFFF00, 0x800000, 0xFFFFFF00, 0xFFFFFF, 0xFFFFFF00, 0, 0xFFFFFF00])
+    values = array.array('i', [0] * 4)
+    dt_counts = array.array('i', [0] * 4)
+    assert hx711.convert(memoryview(raw), 4, values, dt_counts) == 4
+    assert list(values) == [0x7FFFFF, -0x800000, -1, 0]
+    assert list(dt_counts) == [0x1FF] * 4
+
+
+def pack_parallel(samples):
+    raw = array.array('I')
+    channels = len(samples[0])
+    for sample in samples:
+        groups = []
+        for bit in range(23, -1, -1):
+            group = 0
+            for channel, value in enumerate(sample):
+                group |= ((value >> bit) & 1) << channel
+            groups.append(group)
+        for word in range(3):
+            packed = 0
+            for group in groups[8 * word:8 * (word + 1)]:
+                packed = (packed << channels) | group
+            raw.append(packed)
+    return raw
+
+
+def test_unpack_parallel():
+    samples = [(0x123456, -5, 0x7FFFFF, -0x800000), (0, 1, -1, 0x0F0F0F), (-0x123456, 0x654321, 42, -42)]
+    channels = len(samples[0])
+    raw = pack_parallel(samples)
+    values = array.array('i', [0] * (channels * len(samples)))
+    assert hx711.unpack_parallel(raw, len(samples), channels, values) == len(samples)
+    for channel in range(channels):
+        expected = [sample[channel] for sample in samples]
+        unpacked = list(values[channel * len(samples):(channel + 1) * len(samples)])
+        assert unpacked == expected, 'Error: Channel {} unpacked to {} (expected {})'.format(channel, unpacked, expected)
+    for channels in (1, 2, 3):
+        subset = [sample[:channels] for sample in samples]
+        values = array.array('i', [0] * (channels * len(samples)))
+        hx711.unpack_parallel(pack_parallel(subset), len(samples), channels, values)
+        assert list(values[:len(samples)]) == [sample[0] for sample in samples]
+
+
+def test_stream_fallback():
+    block = 8
+    adc = hx711.HX711(22, 21, pio_idx=sm_id)
+    adc.start_stream(block=block, use_dma=False)
+    raw, expected = synthetic(2 * block)
+    values = array.array('i', [0] * block)
+    dt_counts = array.array('i', [0] * block)
+    converted = []
+    for idx in range(0, len(raw), 4):
+        sim.push_rx(sm_id, *raw[idx:idx + 4])
+        sim.fire_timers()
+        valid = adc.read_batch(values, dt_counts)
+        converted.extend(zip(values[:valid], dt_counts[:valid]))
+    adc.stop_stream()
+    assert converted == expected
+    assert adc.overruns == 0
+
+
+
+def test_fixed_gain():
+    for gain in (128, 64, 32):
+        adc = hx711.HX711(22, 21, pio_idx=sm_id, sequence=(gain,))
+        assert adc.gain == gain, 'Error: Single gain sequence runs at {} instead of {}'.format(adc.gain, gain)
+        assert adc.f_sample == 10
+        sim.push_rx(sm_id, 0x000010, 0xFFFFF000)
+        assert adc.get()[0] == 0x10
+        assert adc.gain == gain
+        assert len(sim.state_machines[sm_id].tx) == 0
+
+
+def test_round_robin():
+    pulses = {gain: count - 1 for gain, count in hx711.HX711.gain_pulses.items()}
+    for settle in (0, 1, 3):
+        adc = hx711.HX711(22, 21, pio_idx=sm_id, sequence=(128, 32), settle=settle)
+        sm = sim.state_machines[sm_id]
+        hold = settle + 1
+        assert adc.f_sample == 10 / (2 * hold)
+        expected_tags = [None]
+        for slot in range(3 * 2 * hold):
+            expected_tags.append(None if (slot % hold) < settle else (128, 32)[(slot // hold) % 2])
+        tags = []
+        samples = []
+        for idx, tag in enumerate(expected_tags):
+            sim.push_rx(sm_id, idx + 1, 0xFFFFF000)
+            data, dt = adc.get()
+            tags.append(adc.gain)
+            samples.append(data)
+            # Settling conversions carry no data; tagged ones pass through unchanged
+            assert (data is None) == ((idx > 0) and (tag is None)), 'Error: Conversion {} (settle {}) returned {}'.format(idx, settle, data)
+        assert tags == expected_tags, 'Error: Tags {} (expected {})'.format(tags, expected_tags)
+        # Two selections stay queued ahead of the conversions read
+        scheduled = [(128, 32)[(slot // hold) % 2] for slot in range(len(expected_tags) + 2)]
+        assert sm.tx == [pulses[gain] for gain in scheduled], 'Error: Scheduled pulses {}'.format(sm.tx)
+
+
+if __name__ == '__main__':
+    test_convert()
+    test_convert_extremes()
+    test_unpack_parallel()
+    if full_test:
+        test_stream_fallback()
+        test_fixed_gain()
+        test_round_robin()
+    print('All HX711 stream tests passed')
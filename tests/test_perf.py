@@ -0,0 +1,321 @@
+import gc
+import math
+import random
+import sys
+import time
+
+import sim
+sim.install()
+
+import perf
+
+full_test = sys.implementation.name == 'micropython'
+samples = 2000
+
+
+def make_data(t_min=0, t_max=1500, num_bins=10, t_sample=1 << 29):
+    return perf.HistogramSampler.HistogramData(t_min, t_max, 0, t_sample, num_bins)
+
+
+def test_summary_statistics():
+    data = make_data()
+    dts = [random.randint(20, 1400) for _ in range(samples)] + [300000, 1000000]  # Includes overflowing samples
+    t0 = 1000
+    for dt in dts:
+        data.add(t0, t0 + dt, use=True)
+    mean = sum(dts) / len(dts)
+    variance = sum((dt - mean)**2 for dt in dts) / len(dts)
+    assert data.samples == len(dts)
+    assert data.total == sum(dts)
+    assert data.minimum == min(dts)
+    assert data.maximum == max(dts)
+    assert abs(data.mean - mean) <= 1e-9 * mean, 'Error: Mean {} differs from {}'.format(data.mean, mean)
+    assert abs(data.variance - variance) <= 1e-9 * variance, 'Error: Variance {} differs from {}'.format(data.variance, variance)
+
+
+def test_bins():
+    t_min, t_max, num_bins = 100, 1600, 50
+    data = make_data(t_min, t_max, num_bins)
+    expected = [0] * num_bins
+    for _ in range(samples):
+        dt = random.randint(1, 2000)
+        data.add(1000, 1000 + dt, use=True)
+        idx = min(num_bins - 1, max(0, (dt - t_min) * num_bins // (t_max - t_min)))
+        expected[idx] += 1
+    bins = list(data.bins)
+    assert sum(bins) == samples
+    assert bins == expected, 'Error: Bins {} differ from exact division {}'.format(bins, expected)
+    assert data.histogram[0][0][0] == t_min
+
+
+def test_wide_bins():
+    # Uniform input over a wide span must fill every bin evenly, exactly unless the span needs scaling down
+    for t_max, num_bins, step in ((300000, 10, 7), (1 << 24, 1000, 9973)):
+        data = make_data(0, t_max, num_bins, t_sample=1 << 30)
+        expected = [0] * num_bins
+        for dt in range(0, t_max, step):
+            data.add(0, dt, use=True)
+            expected[dt * num_bins // t_max] += 1
+        bins = list(data.bins)
+        moved = sum(abs(a - b) for a, b in zip(bins, expected))
+        if t_max * num_bins < (1 << 31):
+            assert bins == expected, 'Error: Wide span bins {} differ from exact division {}'.format(bins, expected)
+        assert moved <= sum(expected) // 100, 'Error: {} samples binned differently from exact division'.format(moved)
+        assert max(bins) - min(bins) <= max(expected) - min(expected) + 1, 'Error: Uniform input binned unevenly: {}'.format(bins)
+
+
+def test_window():
+    data = make_data(t_sample=1000)
+    assert not data.add(0, 10, use=True)
+    assert data.add(990, 1001, use=True)
+    assert data.valid
+    assert data.samples == 2
+    assert data.add(1001, 1100, use=True)
+    assert data.samples == 2
+
+    t_mask = 0x3FFFFFFF
+    wrapped = make_data(t_sample=1000)
+    wrapped.reset(0, 1500, t_mask - 500)
+    assert not wrapped.add(t_mask - 500, t_mask, use=True)
+    assert wrapped.add(t_mask, 600, use=True), 'Error: Sampling window did not close across a timer wrap'
+    assert wrapped.samples == 2
+
+
+def exact_percentile(values, p):
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(len(ordered) * p / 100) - 1)]
+
+
+def test_log_bins():
+    for digits, sub_bits in ((1, 4), (2, 7)):
+        data = perf.HistogramSampler.HistogramData(0, 1 << 24, 0, 1 << 29, 0, sub_bits)
+        assert data.num_bins <= (22 << sub_bits), 'Error: {} bins for {} digits'.format(data.num_bins, digits)
+        for dt in [1, 2, 15, 16, 17, 127, 128, 129, 1000, 65535, 65536, 1 << 20, (1 << 24) - 1] + [random.randint(1, 1 << 24) for _ in range(500)]:
+            data.reset(0, 1 << 24, 0)
+            data.add(1000, 1000 + dt, use=True)
+            idx = perf.HistogramSampler.HistogramData.log_bin(dt, sub_bits)
+            assert data.bins[idx] == 1, 'Error: {} us not recorded in bin {}'.format(dt, idx)
+            low, high = data.bin_range(idx)
+            assert low <= dt < high
+            assert (high - low) <= max(1, dt / (1 << sub_bits))
+
+
+def test_log_percentiles():
+    data = perf.HistogramSampler.HistogramData(0, 1 << 24, 0, 1 << 29, 0, 7)
+    dts = [int(random.expovariate(1 / 200)) + 1 for _ in range(samples)] + [random.randint(100000, 3000000) for _ in range(20)]
+    for dt in dts:
+        data.add(1000, 1000 + dt, use=True)
+    for p in (1, 50, 90, 99, 99.9, 100):
+        expected = exact_percentile(dts, p)
+        result = data.percentile(p)
+        assert abs(result - expected) <= max(1, expected / 64), 'Error: p{} is {} instead of {}'.format(p, result, expected)
+
+
+def test_log_merge():
+    dts = [random.randint(1, 100000) for _ in range(samples)]
+    combined = perf.HistogramSampler.HistogramData(0, 1 << 24, 0, 1 << 29, 0, 4)
+    parts = [perf.HistogramSampler.HistogramData(0, 1 << 24, 0, 1 << 29, 0, 4) for _ in range(3)]
+    for idx, dt in enumerate(dts):
+        combined.add(1000, 1000 + dt, use=True)
+        parts[idx % 3].add(1000, 1000 + dt, use=True)
+    merged = perf.HistogramSampler.HistogramData(0, 1 << 24, 0, 1 << 29, 0, 4)
+    for part in parts:
+        merged.merge(part)
+    assert list(merged.bins) == list(combined.bins)
+    assert (merged.samples, merged.total, merged.minimum, merged.maximum) == (combined.samples, combined.total, combined.minimum, combined.maximum)
+    assert abs(merged.variance - combined.variance) <= 1e-9 * combined.variance
+
+
+def test_long_total():
+    # Well over 2**31 us of measured time, both recorded and merged
+    window = perf.HistogramSampler.HistogramData(0, 1 << 24, 0, 1 << 29, 0, 4)
+    for _ in range(800):
+        window.add(1000, 1000 + 3000000, use=True)
+    assert window.total == 800 * 3000000
+    total = perf.HistogramSampler.HistogramData(0, 1 << 24, 0, 1 << 29, 0, 4)
+    for _ in range(3):
+        total.merge(window)
+    assert total.total == 3 * 800 * 3000000
+    assert total.mean == 3000000
+    assert total.variance == 0
+
+
+def test_sampler_total():
+    sampler = perf.HistogramSampler(t_sample_us=20000, digits=1)
+    windows = 0
+    while windows < 3:
+        sampler.begin()
+        time.sleep_us(random.randint(50, 500))
+        if sampler.end():
+            windows += 1
+            assert sampler.data.valid
+    assert sampler.total.samples >= sampler.data.samples
+    assert sampler.total.maximum >= 50
+
+
+def test_calibration():
+    sampler = perf.HistogramSampler(t_sample_us=1 << 28)
+    t_offset = sampler.t_offset
+    assert 0 <= t_offset < 1000, 'Error: Implausible begin()/end() overhead of {} us'.format(t_offset)
+    for _ in range(200):
+        sampler.begin()
+        sampler.end()
+    data = sampler.current
+    assert data.samples == 200
+    assert data.minimum == 0, 'Error: Empty sections measured at least {} us after correction'.format(data.minimum)
+    assert sampler.calibrate(16) >= 0
+    uncorrected = perf.HistogramSampler(t_sample_us=1 << 28, calibrate=False)
+    assert uncorrected.t_offset == 0
+
+
+def test_periodic_monitor():
+    monitor = perf.PeriodicMonitor(1000, t_base=0)
+    assert not monitor.poll(500)
+    assert monitor.poll(1010)
+    assert monitor.late == 10
+    assert monitor.poll(2000)
+    assert monitor.late == 0
+    assert monitor.poll(6500)
+    assert monitor.late == 3500
+    assert (monitor.overruns, monitor.skipped, monitor.t_base) == (1, 3, 6000)
+    assert not monitor.poll(6900)
+    assert monitor.poll(7000)
+    assert monitor.stats.t_sample_us == 1000000, 'Error: Default lateness window is {} us'.format(monitor.stats.t_sample_us)
+    data = monitor.stats.current
+    assert data.samples == monitor.ticks == 4
+    assert (data.minimum, data.maximum) == (0, 3500)
+
+    catch_up = perf.PeriodicMonitor(1000, t_base=0, skip_missed=False)
+    ticks = 0
+    while catch_up.poll(4200):
+        ticks += 1
+    assert ticks == 4, 'Error: Expected four back to back ticks after a stall, got {}'.format(ticks)
+    assert (catch_up.overruns, catch_up.skipped) == (3, 0)
+
+    t_mask = 0x3FFFFFFF
+    wrapped = perf.PeriodicMonitor(1000, t_base=t_mask - 500)
+    assert not wrapped.poll(t_mask)
+    assert wrapped.poll(600)
+    assert wrapped.late == 101
+    assert wrapped.t_base == 499
+
+
+def test_registry():
+    perf.perf.clear()
+
+    @perf.perf.measure('work')
+    def work(us):
+        time.sleep_us(us)
+        return us
+
+    assert work(100) == 100
+    assert perf.perf.sampler('work') is work.stats
+    for _ in range(10):
+        with perf.perf.section('loop'):
+            work(50)
+    assert perf.perf.section('loop') is perf.perf.section('loop')
+    assert perf.perf.names() == ['loop', 'work']
+    assert perf.perf.sampler('work').current.samples == 11
+    assert perf.perf.sampler('loop').current.samples == 10
+    assert perf.perf.summary('loop')['minimum'] >= 50
+    perf.perf.enabled = False
+    try:
+        work(10)
+        with perf.perf.section('loop'):
+            pass
+        with perf.perf.section('unused'):
+            pass
+
+        @perf.perf.measure('unwrapped')
+        def unwrapped():
+            return 1
+    finally:
+        perf.perf.enabled = True
+    assert perf.perf.sampler('work').current.samples == 11
+    assert perf.perf.sampler('loop').current.samples == 10
+    assert perf.perf.names() == ['loop', 'work']
+    assert not isinstance(unwrapped, perf.perf)
+    try:
+        with perf.perf.section('loop'):
+            raise ValueError()
+    except ValueError:
+        pass
+    assert perf.perf.sampler('loop').current.samples == 10
+
+    @perf.perf.measure('fails')
+    def fails():
+        raise ValueError()
+
+    for _ in range(2):
+        try:
+            fails()
+        except ValueError:
+            pass
+    fails.stats.end()  # A stray end() records nothing because the sampler was not left running
+    assert fails.stats.current.samples == 0
+    perf.perf.report()
+    perf.perf.clear()
+
+
+def bench_disabled():
+    def work():
+        return 0
+    measured = perf.perf(work, name='bench')
+    calls = 2000
+    results = []
+    perf.perf.enabled = False
+    for func in (work, measured):
+        t0 = time.ticks_us()
+        for _ in range(calls):
+            func()
+        results.append(time.ticks_diff(time.ticks_us(), t0) / calls)
+    perf.perf.enabled = True
+    perf.perf.clear()
+    print('Disabled perf overhead: {:.2f} us per call ({:.2f} us bare)'.format(results[1] - results[0], results[0]))
+
+
+def test_no_allocation():
+    for data in (make_data(), perf.HistogramSampler.HistogramData(0, 1 << 24, 0, 1 << 29, 0, 7)):
+        check_no_allocation(data)
+
+
+def check_no_allocation(data):
+    dts = [random.randint(20, 1400) for _ in range(samples)]
+    data.add(0, 1, use=True)
+    gc.collect()
+    before = gc.mem_alloc()
+    for dt in dts:
+        data.add(0, dt, use=True)
+    allocated = gc.mem_alloc() - before
+    assert allocated == 0, 'Error: HistogramData.add() allocated {} bytes'.format(allocated)
+
+
+def bench_add():
+    data = make_data()
+    dts = [random.randint(20, 1400) for _ in range(samples)]
+    add = data.add
+    t0 = time.ticks_us()
+    for dt in dts:
+        add(0, dt, True)
+    dt = time.ticks_diff(time.ticks_us(), t0)
+    print('HistogramData.add(): {} us per call'.format(dt / samples))
+
+
+if __name__ == '__main__':
+    test_summary_statistics()
+    test_bins()
+    test_wide_bins()
+    test_window()
+    test_log_bins()
+    test_log_percentiles()
+    test_log_merge()
+    test_long_total()
+    test_sampler_total()
+    test_calibration()
+    test_periodic_monitor()
+    test_registry()
+    if full_test:
+        test_no_allocation()
+    print('All perf tests passed')
+    bench_add()
+    bench_disabled()
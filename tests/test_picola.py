@@ -0,0 +1,397 @@
+import gc
+import random
+import sys
+import time
+
+import sim
+sim.install()
+
+import picola
+
+full_test = sys.implementation.name == 'micropython'
+
+
+def make_values(rows, columns, offset=1):
+    return [[offset + row * columns + column for column in range(columns)] for row in range(rows)]
+
+
+def test_storage():
+    values = make_values(3, 3)
+    for typecode in ('f', 'd', 'i'):
+        m = picola.Matrix(data=values, typecode=typecode)
+        assert m.typecode == typecode
+        assert m.shape == (3, 3)
+        assert list(m.data) == [v for row in values for v in row]
+        view = m.memoryview()
+        assert len(view) == 9
+        view[4] = 10
+        assert m.data[4] == 10
+    m = picola.Matrix(data=values)
+    assert m.typecode is None
+    assert isinstance(m.data, list)
+    try:
+        m.memoryview()
+        assert False, 'Error: memoryview() on list storage should fail'
+    except Exception as e:
+        assert not isinstance(e, AssertionError)
+    z = picola.Matrix.zeros(2, 4, typecode='f')
+    assert z.shape == (2, 4)
+    assert list(z.data) == [0] * 8
+    eye = picola.Matrix.identity(3, typecode='i')
+    assert list(eye.data) == [1, 0, 0, 0, 1, 0, 0, 0, 1]
+    c = eye.copy()
+    c.data[0] = 5
+    assert eye.data[0] == 1
+
+
+def test_ops_preserve_typecode():
+    a = picola.Matrix(data=make_values(2, 3), typecode='i')
+    b = picola.Matrix(data=make_values(2, 3, offset=10), typecode='i')
+    for result in (-a, a + b, a - b, a.transpose()):
+        assert result.typecode == 'i'
+        assert not isinstance(result.data, list)
+    assert list((a + b).data) == [s + o for s, o in zip(a.data, b.data)]
+    assert list((a - b).data) == [-9] * 6
+    assert a.transpose().shape == (3, 2)
+    assert list(a.transpose().data) == [1, 4, 2, 5, 3, 6]
+    p = a * b.transpose()
+    assert p.typecode == 'i'
+    assert list(p.data) == [68, 86, 167, 212]
+    v = picola.Vector([1, 2, 3], typecode='f')
+    w = picola.Vector([4, 5, 6], typecode='f')
+    for result in (-v, v + w, v * 2):
+        assert result.typecode == 'f'
+    assert list((v + w).data) == [5, 7, 9]
+    assert v.dot(w) == 32
+    assert len(v.memoryview()) == 3
+    outer = v * w
+    assert outer.typecode == 'f'
+    assert outer.shape == (3, 3)
+
+
+def random_values(rows, columns, typecode):
+    if typecode == 'i':
+        return [[random.randint(-20, 20) for _ in range(columns)] for _ in range(rows)]
+    return [[random.uniform(-2, 2) for _ in range(columns)] for _ in range(rows)]
+
+
+def reference_matmul(a, b):
+    return [[sum(a[row][k] * b[k][column] for k in range(len(b))) for column in range(len(b[0]))] for row in range(len(a))]
+
+
+def assert_close(values, expected, tol=1e-4):
+    for value, target in zip(values, expected):
+        assert abs(value - target) <= tol * max(1, abs(target)), 'Error: {} differs from {}'.format(value, target)
+
+
+def test_matmul():
+    for rows, src_columns, columns in ((1, 1, 1), (2, 2, 2), (3, 3, 3), (4, 4, 4), (5, 5, 5), (9, 9, 9), (2, 3, 4), (4, 2, 3), (3, 1, 3), (1, 6, 1)):
+        for typecode in (None, 'f', 'd', 'i'):
+            a_values = random_values(rows, src_columns, typecode)
+            b_values = random_values(src_columns, columns, typecode)
+            a = picola.Matrix(data=a_values, typecode=typecode)
+            b = picola.Matrix(data=b_values, typecode=typecode)
+            m = a * b
+            assert m.shape == (rows, columns)
+            assert m.typecode == typecode
+            expected = [v for row in reference_matmul(a_values, b_values) for v in row]
+            assert_close(m.data, expected)
+    try:
+        picola.Matrix(data=make_values(2, 3)) * picola.Matrix(data=make_values(2, 3))
+        assert False, 'Error: Mismatched multiplication should fail'
+    except Exception as e:
+        assert not isinstance(e, AssertionError)
+
+
+def test_out_params():
+    a = picola.Matrix(data=random_values(3, 4, 'd'), typecode='d')
+    b = picola.Matrix(data=random_values(3, 4, 'd'), typecode='d')
+    c = picola.Matrix(data=random_values(4, 2, 'd'), typecode='d')
+    for func, args, expected, shape in (
+        (picola.add, (a, b), [x + y for x, y in zip(a.data, b.data)], (3, 4)),
+        (picola.sub, (a, b), [x - y for x, y in zip(a.data, b.data)], (3, 4)),
+        (picola.scale, (a, 3), [3 * x for x in a.data], (3, 4)),
+        (picola.matmul, (a, c), (a * c).data, (3, 2)),
+        (picola.transpose, (a,), a.transpose().data, (4, 3))
+    ):
+        out = picola.Matrix.zeros(shape[0], shape[1], typecode='d')
+        result = func(*(args + (out,)))
+        assert result is out
+        assert_close(out.data, expected)
+        assert_close(func(*args).data, expected)
+    assert_close((2 * a).data, (a * 2).data)
+    assert_close((-a).data, [-x for x in a.data])
+    for func, args in ((picola.add, (a, b, c)), (picola.matmul, (a, c, a)), (picola.transpose, (a, a)), (picola.matmul, (c.transpose(), c.transpose())), (picola.sub, (a, c))):
+        try:
+            func(*args)
+            assert False, 'Error: {} should reject these arguments'.format(func.__name__)
+        except Exception as e:
+            assert not isinstance(e, AssertionError)
+    square = picola.Matrix(data=random_values(3, 3, 'd'), typecode='d')
+    try:
+        picola.matmul(square, square, square)
+        assert False, 'Error: In-place product should be rejected'
+    except Exception as e:
+        assert not isinstance(e, AssertionError)
+
+
+def test_in_place():
+    a = picola.Matrix(data=make_values(3, 3), typecode='i')
+    b = picola.Matrix(data=make_values(3, 3, offset=10), typecode='i')
+    m = a.copy()
+    original = m
+    m += b
+    assert list(m.data) == [x + y for x, y in zip(a.data, b.data)]
+    m -= a
+    assert list(m.data) == list(b.data)
+    m *= 3
+    assert list(m.data) == [3 * x for x in b.data]
+    assert m is original
+    m *= a
+    assert m is not original
+    assert list(m.data) == list((original * a).data)
+
+
+def test_float_scale():
+    a = picola.Matrix(data=make_values(2, 3), typecode='i')
+    for result in (a * 0.5, 0.5 * a, a.scale(0.5)):
+        assert result.typecode == 'f'
+        assert list(result.data) == [0.5 * x for x in a.data]
+    assert (a * 2).typecode == 'i'
+    assert list(picola.Matrix(data=make_values(2, 3)).scale(0.5).data) == [0.5 * x for x in a.data]
+    out = picola.Matrix.zeros(2, 3, typecode='d')
+    assert a.scale(0.25, out) is out
+    assert list(out.data) == [0.25 * x for x in a.data]
+    m = a.copy()
+    original = m
+    m *= 0.5
+    assert m is not original
+    assert m.typecode == 'f'
+    assert list(original.data) == list(a.data)
+    try:
+        a.scale(0.5, picola.Matrix.zeros(2, 3, typecode='i'))
+        assert False, 'Error: An integer out should reject a float factor'
+    except Exception as e:
+        assert not isinstance(e, AssertionError)
+    v = picola.Vector([1, 2, 3], typecode='i')
+    scaled = v * 0.5
+    assert scaled.typecode == 'f'
+    assert list(scaled.data) == [0.5, 1.0, 1.5]
+    assert (v * 2).typecode == 'i'
+    outer = v * picola.Vector([0.5, 0.25], typecode='f')
+    assert outer.typecode == 'f'
+    assert list(outer.data) == [0.5, 0.25, 1.0, 0.5, 1.5, 0.75]
+
+
+def test_views():
+    for typecode in (None, 'f', 'i'):
+        values = make_values(4, 5)
+        m = picola.Matrix(data=values, typecode=typecode)
+        row = m.row(2)
+        column = m.column(3)
+        block = m.block(1, 1, 2, 3)
+        t = m.T
+        for view in (row, column, block, t):
+            assert view.is_view
+            assert view.data is m.data
+        assert not m.is_view
+        assert row.shape == (1, 5) and row.contiguous
+        assert column.shape == (4, 1) and not column.contiguous
+        assert block.shape == (2, 3) and not block.contiguous
+        assert t.shape == (5, 4)
+        assert [v for v in row[0]] == values[2]
+        assert [column[r][0] for r in range(4)] == [values[r][3] for r in range(4)]
+        assert [[v for v in r] for r in block] == [values[1][1:4], values[2][1:4]]
+        assert [[v for v in r] for r in t] == [list(c) for c in zip(*values)]
+        assert list(block.copy().data) == values[1][1:4] + values[2][1:4]
+        assert list(t.copy().data) == list(m.transpose().data)
+        assert list(t.T.copy().data) == list(m.data)
+        assert block.T.block(1, 0, 2, 2).copy().data[0] == values[1][2]
+        # Writes through a view land in the parent
+        block[1][2] = 100
+        t[0][3] = 200
+        assert m[2][3] == 100
+        assert m[3][0] == 200
+        m.column(1).scale(0, m.column(1))
+        assert [m[r][1] for r in range(4)] == [0] * 4
+        # A wrapped buffer is shared, not copied
+        buffer = m.copy().data
+        wrapped = picola.Matrix(typecode=typecode, buffer=buffer, shape=(5, 4))
+        assert wrapped.data is buffer and not wrapped.is_view and wrapped.contiguous
+        assert [v for v in wrapped[1]] == list(buffer[4:8])
+        wrapped[4][3] = 300
+        assert buffer[19] == 300
+
+
+def test_view_ops():
+    a = picola.Matrix(data=random_values(5, 6, 'd'), typecode='d')
+    b = picola.Matrix(data=random_values(6, 5, 'd'), typecode='d')
+    dense = lambda m: [[v for v in r] for r in m]
+    for x, y in ((a.block(1, 2, 3, 3), b.block(2, 1, 3, 3)), (a.T.block(0, 0, 4, 4), b.block(0, 0, 4, 4)), (a.row(1), b.T.row(3)), (a.column(0), b.row(0).T)):
+        xc, yc = x.copy(), y.copy()
+        assert not (xc.is_view or yc.is_view)
+        assert_close((x + y).data, (xc + yc).data)
+        assert_close((x - y).data, (xc - yc).data)
+        assert_close((2 * x).data, (2 * xc).data)
+        assert_close(x.transpose().data, xc.transpose().data)
+        assert_close((x * y.T).data, (xc * yc.transpose()).data)
+        assert_close((x.T * y).data, (xc.transpose() * yc).data)
+        assert dense(x + y) == dense(xc + yc)
+    # Views as outputs write into the parent's buffer and leave the rest alone
+    c = picola.Matrix.zeros(4, 4, typecode='d')
+    picola.matmul(a.block(0, 0, 2, 6), b.block(0, 0, 6, 2), c.block(1, 1, 2, 2))
+    expected = reference_matmul(dense(a.block(0, 0, 2, 6)), dense(b.block(0, 0, 6, 2)))
+    assert_close([c[1][1], c[1][2], c[2][1], c[2][2]], [v for r in expected for v in r])
+    assert c[0][0] == 0 and c[3][3] == 0 and c[1][0] == 0
+    picola.transpose(a.block(0, 0, 1, 4), c.column(0))
+    assert_close([c[r][0] for r in range(4)], [a[0][column] for column in range(4)])
+    expected = [c[3][column] + c[1][column] for column in range(4)]
+    c.row(3).add(c.row(1), c.row(3))
+    assert_close([c[3][column] for column in range(4)], expected)
+    assert len(a.row(2).memoryview()) == 6
+    assert a.row(2).memoryview()[0] == a[2][0]
+    for func, args in ((a.block(1, 1, 2, 3).memoryview, ()), (a.row(0).append_row, (1, 2, 3, 4, 5, 6)), (a.block, (4, 0, 2, 2)), (a.row, (5,)), (a.column, (-1,)), (picola.matmul, (a.block(0, 0, 2, 2), a.block(2, 2, 2, 2), a.block(0, 2, 2, 2))), (picola.transpose, (a.block(0, 0, 2, 2), a.block(2, 2, 2, 2)))):
+        try:
+            func(*args)
+            assert False, 'Error: {} should reject these arguments'.format(func.__name__)
+        except Exception as e:
+            assert not isinstance(e, AssertionError)
+
+
+def test_view_no_copy():
+    small = picola.Matrix(data=random_values(4, 4, 'i'), typecode='i')
+    large = picola.Matrix(data=random_values(24, 24, 'i'), typecode='i')
+    sizes = {}
+    for name, make in (('row', lambda m: m.row(1)), ('column', lambda m: m.column(1)), ('block', lambda m: m.block(1, 1, 3, 3)), ('T', lambda m: m.T)):
+        for m in (small, large):
+            gc.collect()
+            before = gc.mem_alloc()
+            view = make(m)
+            sizes[(name, m.shape[0])] = gc.mem_alloc() - before
+            del view
+        assert sizes[(name, 4)] == sizes[(name, 24)], 'Error: {} view size depends on the parent ({} vs {} bytes)'.format(name, sizes[(name, 4)], sizes[(name, 24)])
+    gc.collect()
+    before = gc.mem_alloc()
+    c = large.copy()
+    copied = gc.mem_alloc() - before
+    del c
+    print('Views: {} bytes each (24x24 copy: {} bytes)'.format(max(sizes.values()), copied))
+    assert max(sizes.values()) < copied
+
+
+def test_view_no_allocation():
+    a = picola.Matrix(data=random_values(8, 8, 'i'), typecode='i')
+    b = picola.Matrix(data=random_values(8, 8, 'i'), typecode='i')
+    c = picola.Matrix.zeros(8, 8, typecode='i')
+    a_block = a.block(2, 2, 4, 4)
+    b_t = b.T.block(0, 0, 4, 4)
+    c_block = c.block(4, 4, 4, 4)
+    a_row = a.row(3)
+    c_row = c.row(0)
+    a_column = a.column(5)
+    c_column = c.column(7)
+
+    def step():
+        picola.matmul(a_block, b_t, c_block)
+        c_block.add(a_block, c_block)
+        c_row.sub(a_row, c_row)
+        picola.scale(a_column, -1, c_column)
+        picola.transpose(a_block, c.block(0, 0, 4, 4))
+
+    step()
+    gc.collect()
+    before = gc.mem_alloc()
+    for _ in range(100):
+        step()
+    allocated = gc.mem_alloc() - before
+    assert allocated == 0, 'Error: Picola loop over views allocated {} bytes'.format(allocated)
+
+
+def test_no_allocation():
+    a = picola.Matrix(data=random_values(6, 6, 'i'), typecode='i')
+    b = picola.Matrix(data=random_values(6, 6, 'i'), typecode='i')
+    c = picola.Matrix.zeros(6, 6, typecode='i')
+    t = picola.Matrix.zeros(6, 6, typecode='i')
+    state = picola.Matrix.zeros(6, 6, typecode='i')
+
+    def step():
+        picola.matmul(a, b, c)
+        picola.transpose(c, t)
+        state.add(t, state)
+        state.__isub__(c)
+        picola.scale(state, 1, state)
+        state.__imul__(-1)
+
+    step()
+    gc.collect()
+    before = gc.mem_alloc()
+    for _ in range(100):
+        step()
+    allocated = gc.mem_alloc() - before
+    assert allocated == 0, 'Error: Steady-state picola loop allocated {} bytes'.format(allocated)
+
+
+# The element-wise algorithm picola used before the flat-buffer kernels
+def matmul_proxy(a, b):
+    m = picola.Matrix(typecode=a.typecode)
+    (rows, src_columns), columns = a.shape, b.shape[1]
+    for row in range(rows):
+        row_data = []
+        for column in range(columns):
+            dot = 0
+            for src_column in range(src_columns):
+                dot += (a[row][src_column] * b[src_column][column])
+            row_data.append(dot)
+        m.append_row(*row_data)
+    return m
+
+
+def time_us(func, a, b, repeats):
+    t0 = time.ticks_us()
+    for _ in range(repeats):
+        func(a, b)
+    return time.ticks_diff(time.ticks_us(), t0) / repeats
+
+
+def bench_matmul(repeats=50):
+    for size in (2, 3, 4, 6, 9):
+        a = picola.Matrix(data=random_values(size, size, 'f'), typecode='f')
+        b = picola.Matrix(data=random_values(size, size, 'f'), typecode='f')
+        t_new = time_us(lambda x, y: x * y, a, b, repeats)
+        if full_test:
+            assert_close(matmul_proxy(a, b).data, (a * b).data)
+            t_old = time_us(matmul_proxy, a, b, repeats)
+            print('{0}x{0} multiply: {1:.1f} us (AccessProxy: {2:.1f} us, {3:.1f}x)'.format(size, t_new, t_old, t_old / t_new))
+        else:
+            print('{0}x{0} multiply: {1:.1f} us'.format(size, t_new))
+
+
+def test_memory():
+    values = [[0.5 * (row + column) for column in range(9)] for row in range(9)]
+    sizes = {}
+    for typecode in (None, 'f'):
+        gc.collect()
+        before = gc.mem_alloc()
+        m = picola.Matrix(data=values, typecode=typecode)
+        sizes[typecode] = gc.mem_alloc() - before
+        del m
+    print('9x9 Matrix: {} bytes as a list, {} bytes as array(\'f\')'.format(sizes[None], sizes['f']))
+    assert sizes['f'] < sizes[None]
+
+
+if __name__ == '__main__':
+    test_storage()
+    test_ops_preserve_typecode()
+    test_matmul()
+    test_out_params()
+    test_in_place()
+    test_float_scale()
+    test_views()
+    test_view_ops()
+    if full_test:
+        test_memory()
+        test_no_allocation()
+        test_view_no_copy()
+        test_view_no_allocation()
+    print('All picola tests passed')
+    bench_matmul()
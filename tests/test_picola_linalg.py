@@ -0,0 +1,186 @@
+import random
+import time
+
+import sim
+sim.install()
+
+import picola
+
+try:
+    import numpy
+except ImportError:
+    numpy = None  # Without NumPy (e.g. on the board) results are checked through residuals
+
+tolerances = {None: 1e-9, 'd': 1e-9, 'f': 1e-3}
+
+
+def random_matrix(n, typecode, spd=False):
+    values = [[random.uniform(-1, 1) for _ in range(n)] for _ in range(n)]
+    if spd:
+        values = [[sum(values[row][k] * values[column][k] for k in range(n)) for column in range(n)] for row in range(n)]
+    for idx in range(n):
+        values[idx][idx] += n  # Keeps the test matrices well conditioned
+    return values, picola.Matrix(data=values, typecode=typecode)
+
+
+def random_rhs(n, columns, typecode):
+    values = [[random.uniform(-5, 5) for _ in range(columns)] for _ in range(n)]
+    return values, picola.Matrix(data=values, typecode=typecode)
+
+
+def flat(values):
+    return [v for row in values for v in row]
+
+
+def assert_close(values, expected, tol):
+    values = list(values)
+    expected = list(expected)
+    assert len(values) == len(expected)
+    for value, target in zip(values, expected):
+        assert abs(value - target) <= tol * max(1, abs(target)), 'Error: {} differs from {}'.format(value, target)
+
+
+def matmul_values(a, x, n, columns):
+    return [sum(a[row][k] * x[k * columns + column] for k in range(n)) for row in range(n) for column in range(columns)]
+
+
+def check_solution(a_values, x, b_values, n, columns, typecode):
+    if numpy is not None:
+        expected = numpy.linalg.solve(numpy.array(a_values), numpy.array(b_values)).flatten()
+        assert_close(x, expected, tolerances[typecode])
+    assert_close(matmul_values(a_values, list(x), n, columns), flat(b_values), tolerances[typecode])
+
+
+def test_lu():
+    for n in (1, 2, 3, 4, 6, 9):
+        for typecode in (None, 'd', 'f'):
+            a_values, a = random_matrix(n, typecode)
+            lu = picola.LU(a)
+            for columns in (1, 3):
+                b_values, b = random_rhs(n, columns, typecode)
+                x = lu.solve(b)
+                assert x.shape == (n, columns)
+                check_solution(a_values, x.data, b_values, n, columns, typecode)
+            inverse = lu.inv()
+            assert_close(matmul_values(a_values, list(inverse.data), n, n), list(picola.Matrix.identity(n).data), tolerances[typecode])
+            if numpy is not None:
+                assert_close(inverse.data, numpy.linalg.inv(numpy.array(a_values)).flatten(), tolerances[typecode])
+                assert_close([lu.det()], [numpy.linalg.det(numpy.array(a_values))], tolerances[typecode])
+                assert_close([picola.det(a)], [numpy.linalg.det(numpy.array(a_values))], tolerances[typecode])
+            assert list(a.data) == [picola.Matrix(data=a_values, typecode=typecode).data[idx] for idx in range(n * n)], 'Error: LU modified its input'
+
+
+def test_cholesky():
+    for n in (1, 2, 3, 6, 9):
+        for typecode in (None, 'd', 'f'):
+            a_values, a = random_matrix(n, typecode, spd=True)
+            chol = picola.Cholesky(a)
+            b_values, b = random_rhs(n, 2, typecode)
+            x = chol.solve(b)
+            check_solution(a_values, x.data, b_values, n, 2, typecode)
+            assert_close([chol.det()], [picola.LU(a).det()], tolerances[typecode])
+            inverse = chol.inv()
+            assert_close(matmul_values(a_values, list(inverse.data), n, n), list(picola.Matrix.identity(n).data), tolerances[typecode])
+            if numpy is not None:
+                expected = numpy.linalg.cholesky(numpy.array(a_values)).flatten()
+                assert_close(chol.matrix.data, expected, tolerances[typecode])
+
+
+def test_vectors_and_in_place():
+    a_values, a = random_matrix(4, 'd')
+    b = picola.Vector([1, 2, 3, 4], typecode='d')
+    x = picola.solve(a, b)
+    assert isinstance(x, picola.Vector)
+    check_solution(a_values, x.data, [[1], [2], [3], [4]], 4, 1, 'd')
+    lu = picola.LU(a, overwrite=True)
+    assert lu.matrix is a
+    out = picola.Vector([0, 0, 0, 0], typecode='d')
+    assert lu.solve(b, out) is out
+    assert_close(out.data, x.data, 1e-12)
+    a_int = picola.Matrix(data=[[4, 1], [2, 3]], typecode='i')
+    assert_close(picola.solve(a_int, picola.Vector([1, 2])).data, [0.1, 0.6], 1e-6)
+    assert_close(picola.inv(a_int).data, [0.3, -0.1, -0.2, 0.4], 1e-6)
+
+
+def test_views():
+    a_values, a = random_matrix(4, 'd')
+    b_values, b = random_rhs(4, 3, 'd')
+    # The system sits in a corner of a larger buffer and is solved from views
+    big = picola.Matrix.zeros(6, 6, 'd')
+    big.block(1, 2, 4, 4).add(a, big.block(1, 2, 4, 4))
+    lu = picola.LU(big.block(1, 2, 4, 4))
+    assert not lu.matrix.is_view
+    out = picola.Matrix.zeros(5, 4, 'd')
+    out_view = out.column(2).block(1, 0, 4, 1)
+    assert lu.solve(b.block(0, 1, 4, 1), out_view) is out_view
+    check_solution(a_values, [out[row][2] for row in range(1, 5)], [[row[1]] for row in b_values], 4, 1, 'd')
+    assert out[0][2] == 0 and out[1][0] == 0
+    x = lu.solve(b.T.T)
+    check_solution(a_values, x.data, b_values, 4, 3, 'd')
+    transposed = picola.LU(a.T)
+    x = transposed.solve(b)
+    check_solution([list(column) for column in zip(*a_values)], x.data, b_values, 4, 3, 'd')
+    # The tolerance only looks at the matrix, not the rest of its buffer
+    tall = picola.Matrix(data=[[2, 1], [1, 3], [1e6, 0], [0, 0]], typecode='d')
+    top = tall.block(0, 0, 2, 2)
+    lu = picola.LU(top, overwrite=True)
+    assert lu.matrix is top
+    assert lu.tol == 2 * 2.3e-16 * 3
+    try:
+        picola.LU(big.block(1, 2, 4, 4), overwrite=True)
+        assert False, 'Error: A strided view should not be factored in place'
+    except Exception as e:
+        assert not isinstance(e, AssertionError)
+
+
+def test_errors():
+    singular = picola.Matrix(data=[[1, 2, 3], [2, 4, 6], [1, 0, 1]], typecode='d')
+    not_spd = picola.Matrix(data=[[1, 2], [2, 1]], typecode='d')
+    for func, args in ((picola.LU, (singular,)), (picola.inv, (singular,)), (picola.Cholesky, (not_spd,)), (picola.LU, (picola.Matrix(data=[[1, 2, 3]]),))):
+        try:
+            func(*args)
+            assert False, 'Error: {} should have failed'.format(func.__name__)
+        except Exception as e:
+            assert not isinstance(e, AssertionError)
+    try:
+        picola.LU(singular)
+    except picola.SingularMatrixError:
+        pass
+    assert picola.det(singular) == 0
+    try:
+        picola.det(picola.Matrix(data=[[1, 'x'], [2, 3]]))
+        assert False, 'Error: det() should only turn a singular pivot into zero'
+    except Exception as e:
+        assert not isinstance(e, (AssertionError, picola.SingularMatrixError))
+    assert picola.det(not_spd) == -3
+    lu = picola.LU(not_spd)
+    try:
+        lu.solve(picola.Vector([1, 2, 3]))
+        assert False, 'Error: Mismatched right-hand side should fail'
+    except Exception as e:
+        assert not isinstance(e, AssertionError)
+
+
+def bench_solve(n=9, repeats=20):
+    _, a = random_matrix(n, 'f')
+    _, b = random_rhs(n, 1, 'f')
+    t0 = time.ticks_us()
+    for _ in range(repeats):
+        lu = picola.LU(a)
+    t_factor = time.ticks_diff(time.ticks_us(), t0) / repeats
+    x = picola.Matrix.zeros(n, 1, 'f')
+    t0 = time.ticks_us()
+    for _ in range(repeats):
+        lu.solve(b, x)
+    t_solve = time.ticks_diff(time.ticks_us(), t0) / repeats
+    print('{0}x{0} LU: factor {1:.1f} us, solve {2:.1f} us'.format(n, t_factor, t_solve))
+
+
+if __name__ == '__main__':
+    test_lu()
+    test_cholesky()
+    test_vectors_and_in_place()
+    test_views()
+    test_errors()
+    print('All picola linear algebra tests passed{}'.format('' if numpy is not None else ' (without NumPy)'))
+    bench_solve()
@@ -0,0 +1,197 @@
+import random
+import time
+
+import sim
+sim.install()
+
+import scheduler
+import timestamp
+
+t_mask = timestamp.ticks_mask
+
+
+def test_timestamp_wrap():
+    assert timestamp.diff(5, 5) == 0
+    assert timestamp.diff(0, t_mask) == 1
+    assert timestamp.diff(100, t_mask - 99) == 200
+    assert timestamp.signed_diff(100, t_mask - 99) == 200
+    assert timestamp.signed_diff(t_mask - 99, 100) == -200
+    assert timestamp.expired_at(t_mask - 10, 20, 9)
+    assert not timestamp.expired_at(t_mask - 10, 20, 8)
+    assert not timestamp.expired_at(5, 1, 5)
+
+
+def make_counter(counts, key, order=None):
+    def callback():
+        counts[key] = counts.get(key, 0) + 1
+        if order is not None:
+            order.append(key)
+    return callback
+
+
+def test_periodic_and_one_shot(t0=0):
+    sched = scheduler.Scheduler(capacity=8)
+    counts = {}
+    sched.every(1000, make_counter(counts, 'a'), t=t0)
+    sched.every(300, make_counter(counts, 'b'), t=t0)
+    sched.after(500, make_counter(counts, 'c'), t=t0)
+    assert len(sched) == 3
+    assert sched.next_deadline_us(t0) == 300
+    for step in range(31):
+        sched.run_pending(timestamp.advance(t0, 100 * step))
+    assert counts == {'a': 3, 'b': 10, 'c': 1}, 'Error: Unexpected run counts {}'.format(counts)
+    assert len(sched) == 2
+    assert sched.next_deadline_us(timestamp.advance(t0, 3000)) == 300
+
+
+def test_wrap():
+    test_periodic_and_one_shot(t_mask - 1234)
+
+
+def test_missed_periods():
+    counts = {}
+    skipping = scheduler.Scheduler(capacity=4)
+    handle = skipping.every(1000, make_counter(counts, 'skip'), t=0)
+    assert skipping.run_pending(5500) == 1
+    assert skipping.deadline(handle) == 6000
+    catch_up = scheduler.Scheduler(capacity=4, skip_missed=False)
+    catch_up.every(1000, make_counter(counts, 'burst'), t=0)
+    assert catch_up.run_pending(5500) == 5
+    assert counts == {'skip': 1, 'burst': 5}
+
+
+def test_cancel():
+    sched = scheduler.Scheduler(capacity=4)
+    counts = {}
+    handles = {}
+
+    def once():
+        counts['once'] = counts.get('once', 0) + 1
+        sched.cancel(handles['once'])
+
+    handles['once'] = sched.every(100, once, t=0)
+    handles['never'] = sched.every(100, make_counter(counts, 'never'), t=0)
+    assert sched.cancel(handles['never'])
+    assert not sched.cancel(handles['never'])
+    for t in range(0, 1000, 100):
+        sched.run_pending(t)
+    assert counts == {'once': 1}
+    assert len(sched) == 0
+    assert sched.next_deadline_us(1000) is None
+    # Cancelled slots are reclaimed even when they are still buried in the heap
+    for _ in range(10):
+        handle = sched.every(1000, make_counter(counts, 'x'), t=0)
+        sched.every(10, make_counter(counts, 'y'), t=0)
+        sched.cancel(handle)
+        sched.clear()
+    assert len(sched) == 0
+
+
+def test_raising_callback():
+    sched = scheduler.Scheduler(capacity=2)
+    counts = {}
+
+    def fail():
+        raise ValueError('callback failed')
+
+    sched.after(100, fail, t=0)
+    handle = sched.every(100, fail, t=0)
+    for t in (100, 200):
+        try:
+            sched.run_pending(t)
+            assert False, 'Error: Callback exception was swallowed'
+        except ValueError:
+            pass
+    assert sched.runs == 2
+    assert len(sched) == 1, 'Error: {} tasks active after the one-shot raised'.format(len(sched))
+    assert sched.deadline(handle) in (200, 300), 'Error: Periodic task was not rescheduled after raising'
+    # The one-shot's slot was released, so there is room for another task
+    sched.cancel(handle)
+    sched.after(100, make_counter(counts, 'ok'), t=200)
+    assert sched.run_pending(300) == 1
+    assert counts == {'ok': 1}
+    assert len(sched) == 0
+
+
+def test_period_range():
+    sched = scheduler.Scheduler(capacity=2)
+    for add in (sched.every, sched.after):
+        try:
+            add(t_mask // 2, lambda: None, t=0)
+            assert False, 'Error: Period of half the tick range was accepted'
+        except AssertionError as e:
+            assert 'tick range' in str(e)
+    assert len(sched) == 0
+
+
+def test_ordering():
+    sched = scheduler.Scheduler(capacity=200)
+    order = []
+    deadlines = {}
+    for key in range(200):
+        delay = random.randint(1, 100000)
+        deadlines[key] = delay
+        sched.after(delay, make_counter({}, key, order), t=t_mask - 50000)
+    sched.run_pending(timestamp.advance(t_mask - 50000, 100000))
+    assert len(order) == 200
+    assert [deadlines[key] for key in order] == sorted(deadlines.values())
+
+
+def make_tasks(count):
+    return [random.randint(2, 50) * 1000 for _ in range(count)]
+
+
+def bench_polling(periods, duration_us):
+    counts = [0]
+
+    def callback():
+        counts[0] += 1
+
+    t_start = timestamp.now()
+    tasks = [[t_start, period, callback] for period in periods]
+    loops = 0
+    while not timestamp.expired(t_start, duration_us):
+        for task in tasks:
+            expired, task[0] = timestamp.expired_and_advance(task[0], task[1])
+            if expired:
+                task[2]()
+        loops += 1
+    return loops, counts[0]
+
+
+def bench_scheduler(periods, duration_us):
+    counts = [0]
+
+    def callback():
+        counts[0] += 1
+
+    sched = scheduler.Scheduler(capacity=len(periods))
+    t_start = timestamp.now()
+    for period in periods:
+        sched.every(period, callback, t=t_start)
+    loops = 0
+    while not timestamp.expired(t_start, duration_us):
+        sched.run_pending()
+        loops += 1
+    return loops, counts[0]
+
+
+def bench(tasks=128, duration_us=500000):
+    periods = make_tasks(tasks)
+    expected = sum(duration_us // period for period in periods)
+    for label, func in (('Polling', bench_polling), ('Scheduler', bench_scheduler)):
+        loops, runs = func(periods, duration_us)
+        print('{} ({} tasks): {} loops/sec, {} callbacks (expected ~{})'.format(label, tasks, int(1e6 * loops / duration_us), runs, expected))
+
+
+if __name__ == '__main__':
+    test_timestamp_wrap()
+    test_periodic_and_one_shot()
+    test_wrap()
+    test_missed_periods()
+    test_cancel()
+    test_raising_callback()
+    test_period_range()
+    test_ordering()
+    print('All scheduler tests passed')
+    bench()
@@ -0,0 +1,104 @@
+import gc
+import io
+import sys
+import time
+
+import sim
+sim.install()
+
+import tracing
+
+full_test = sys.implementation.name == 'micropython'
+
+
+def test_ring():
+    recorder = tracing.TraceRecorder(capacity=8)
+    update = recorder.register('update')
+    sample = recorder.register('sample')
+    assert recorder.register('update') == update
+    explicit = recorder.register('explicit', event_id=sample + 10)
+    assert recorder.register('auto') == explicit + 1
+    try:
+        recorder.register('clash', event_id=update)
+        assert False, 'Error: A used event id should be rejected'
+    except AssertionError as e:
+        assert 'already used' in str(e)
+    for idx in range(5):
+        recorder.begin(update, idx)
+        recorder.end(update, idx)
+    recorder.instant(sample, 42)
+    assert len(recorder) == 8
+    assert recorder.overwritten == 3
+    assert sim.irq_disabled == 0, 'Error: Interrupts left disabled after record()'
+    events = list(recorder.events())
+    assert events[0][:2] == (tracing.TraceRecorder.End, update)
+    assert events[0][3] == 1
+    assert events[-1][0] == tracing.TraceRecorder.Instant
+    assert events[-1][1:2] == (sample,)
+    assert events[-1][3] == 42
+    times = [event[2] for event in events]
+    for t0, t1 in zip(times[:-1], times[1:]):
+        assert ((t1 - t0) & 0x3FFFFFFF) < 1000000
+    recorder.enabled = False
+    recorder.instant(sample)
+    assert len(recorder) == 8
+    recorder.clear()
+    assert len(recorder) == 0
+
+
+def test_export():
+    sys.path.append(__file__.rsplit('/', 1)[0] + '/../tools' if '/' in __file__ else '../tools')
+    import trace2chrome
+    recorder = tracing.TraceRecorder(capacity=16)
+    update = recorder.register('Button.update')
+    sample = recorder.register('HX711 sample')
+    for idx in range(20):
+        recorder.begin(update)
+        time.sleep_us(50)
+        recorder.end(update)
+        recorder.instant(sample, idx)
+    stream = io.BytesIO()
+    recorder.export(stream)
+    stream.seek(0)
+    names, ticks_mask, events = trace2chrome.parse(stream)
+    assert names == {update: 'Button.update', sample: 'HX711 sample'}
+    assert events == list(recorder.events())
+    chrome = trace2chrome.convert(names, ticks_mask, events)['traceEvents']
+    assert [entry['ph'] for entry in chrome[:3]] == ['i', 'B', 'E']
+    assert chrome[0]['args']['arg'] == 14
+    assert all(entry0['ts'] <= entry1['ts'] for entry0, entry1 in zip(chrome[:-1], chrome[1:]))
+    wrapped = [(1, 0, ticks_mask - 10, 0), (2, 0, 5, 0)]
+    assert [entry['ts'] for entry in trace2chrome.convert(names, ticks_mask, wrapped)['traceEvents']] == [0, 16]
+
+
+def test_no_allocation():
+    recorder = tracing.TraceRecorder(capacity=64)
+    event_id = recorder.register('update')
+    recorder.begin(event_id)
+    gc.collect()
+    before = gc.mem_alloc()
+    for idx in range(200):
+        recorder.begin(event_id, idx)
+        recorder.end(event_id, idx)
+    allocated = gc.mem_alloc() - before
+    assert allocated == 0, 'Error: TraceRecorder.record() allocated {} bytes'.format(allocated)
+
+
+def bench_record():
+    recorder = tracing.TraceRecorder(capacity=256)
+    event_id = recorder.register('update')
+    calls = 2000
+    t0 = time.ticks_us()
+    for idx in range(calls):
+        recorder.instant(event_id, idx)
+    dt = time.ticks_diff(time.ticks_us(), t0)
+    print('TraceRecorder.instant(): {} us per event'.format(dt / calls))
+
+
+if __name__ == '__main__':
+    test_ring()
+    test_export()
+    if full_test:
+        test_no_allocation()
+    print('All trace tests passed')
+    bench_record()
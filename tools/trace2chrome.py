@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# Converts a trace saved by tracing.TraceRecorder.export() into Chrome trace-event
+# JSON, which can be opened in Perfetto (ui.perfetto.dev) or chrome://tracing.
+#
+#   python3 trace2chrome.py trace.bin [trace.json]
+#
+import json
+import struct
+import sys
+
+magic = b'UTRC'
+version = 1
+header_format = '<4sBBHII'
+name_format = '<IH'
+phase_shift = 24
+id_mask = 0xFFFFFF
+phases = {0: 'i', 1: 'B', 2: 'E'}
+
+
+def parse(stream):
+    header = stream.read(struct.calcsize(header_format))
+    file_magic, file_version, _, name_count, ticks_mask, count = struct.unpack(header_format, header)
+    if not file_magic == magic:
+        raise Exception('Invalid trace file (bad magic {})'.format(file_magic))
+    if file_version > version:
+        raise Exception('Unsupported trace file version {}'.format(file_version))
+    names = {}
+    for _ in range(name_count):
+        event_id, length = struct.unpack(name_format, stream.read(struct.calcsize(name_format)))
+        names[event_id] = stream.read(length).decode()
+    data = stream.read(12 * count)
+    if len(data) < 12 * count:
+        raise Exception('Truncated trace file ({} of {} events)'.format(len(data) // 12, count))
+    words = struct.unpack('<{}I'.format(3 * count), data)
+    events = []
+    for idx in range(0, 3 * count, 3):
+        event = words[idx]
+        events.append((event >> phase_shift, event & id_mask, words[idx + 1], words[idx + 2]))
+    return names, ticks_mask, events
+
+
+# Timestamps are ticks_us() values that wrap at ticks_mask; consecutive events
+# are assumed to be less than one wrap period apart.
+def unwrap(events, ticks_mask):
+    t_abs = 0
+    t_last = None
+    for phase, event_id, t, arg in events:
+        if t_last is not None:
+            t_abs += (t - t_last) & ticks_mask
+        t_last = t
+        yield phase, event_id, t_abs, arg
+
+
+def convert(names, ticks_mask, events, pid=0, tid=0):
+    trace_events = []
+    for phase, event_id, t_us, arg in unwrap(events, ticks_mask):
+        entry = {
+            'name': names.get(event_id, 'event_{}'.format(event_id)),
+            'ph': phases.get(phase, 'i'),
+            'ts': t_us,
+            'pid': pid,
+            'tid': tid,
+            'args': {'arg': arg}
+        }
+        if entry['ph'] == 'i':
+            entry['s'] = 't'
+        trace_events.append(entry)
+    return {'traceEvents': trace_events, 'displayTimeUnit': 'ms'}
+
+
+def main(argv):
+    if len(argv) < 2:
+        print('Usage: {} trace.bin [trace.json]'.format(argv[0]))
+        return 1
+    src = argv[1]
+    dst = argv[2] if len(argv) > 2 else src.rsplit('.', 1)[0] + '.json'
+    with open(src, 'rb') as stream:
+        names, ticks_mask, events = parse(stream)
+    with open(dst, 'w') as stream:
+        json.dump(convert(names, ticks_mask, events), stream)
+    print('Wrote {} events to {}'.format(len(events), dst))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))